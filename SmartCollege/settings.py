@@ -12,6 +12,8 @@ https://docs.djangoproject.com/en/5.2/ref/settings/
 
 from pathlib import Path
 
+from django.core.exceptions import ImproperlyConfigured
+
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
@@ -147,11 +149,33 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 ASGI_APPLICATION = 'SmartCollege.asgi.application'
 
+# Channel layer used by chat. 'memory' only works when one process serves
+# every websocket. Run several Daphne workers with 'redis' (channels_redis'
+# core layer) or 'redis-pubsub' against CHANNEL_REDIS_URL. 'redis-pubsub'
+# also runs against the stand-in broker from `python manage.py
+# run_chat_broker` for trying multi-process chat on one machine.
+CHAT_CHANNEL_LAYER = os.environ.get('CHAT_CHANNEL_LAYER', 'memory')
+CHANNEL_REDIS_URL = os.environ.get('CHANNEL_REDIS_URL', 'redis://localhost:6379/1')
+CHANNEL_LAYER_BACKENDS = {
+    'memory': 'channels.layers.InMemoryChannelLayer',
+    'redis': 'channels_redis.core.RedisChannelLayer',
+    'redis-pubsub': 'channels_redis.pubsub.RedisPubSubChannelLayer',
+}
+if CHAT_CHANNEL_LAYER not in CHANNEL_LAYER_BACKENDS:
+    raise ImproperlyConfigured(f'CHAT_CHANNEL_LAYER must be one of {", ".join(CHANNEL_LAYER_BACKENDS)}')
+
 CHANNEL_LAYERS = {
     'default': {
-        'BACKEND': 'channels.layers.InMemoryChannelLayer',
+        'BACKEND': CHANNEL_LAYER_BACKENDS[CHAT_CHANNEL_LAYER],
     },
 }
+if CHAT_CHANNEL_LAYER != 'memory':
+    CHANNEL_LAYERS['default']['CONFIG'] = {'hosts': [CHANNEL_REDIS_URL]}
+
+# Chat messages are saved in batches: CHAT_FLUSH_INTERVAL seconds after the
+# first buffered message, or once CHAT_FLUSH_BATCH messages are waiting.
+CHAT_FLUSH_INTERVAL = 0.05
+CHAT_FLUSH_BATCH = 100
 
 STATIC_ROOT = BASE_DIR / 'staticfiles'
 STATICFILES_DIRS = [BASE_DIR / 'static']
@@ -159,6 +183,36 @@ STATICFILES_DIRS = [BASE_DIR / 'static']
 MEDIA_URL = '/media/'
 MEDIA_ROOT = BASE_DIR / 'media'
 
+FACE_GALLERY_DIR = BASE_DIR / 'face_gallery'
+FACE_PROJECTION_PATH = BASE_DIR / 'face_models' / 'face_projection.npz'
+# Euclidean distance cutoff for raw-pixel encodings. PCA/LDA galleries use
+# the threshold calibrated when the projection was fitted, when available.
+FACE_MATCH_THRESHOLD = 3000
+# How new encodings are stored and how the gallery is held in memory:
+# 'float32' (original format), 'float16' or per-vector scaled 'int8'.
+# Existing float32 rows stay readable under every setting.
+FACE_ENCODING_STORAGE = 'float32'
+# One of 'brute', 'balltree', 'kdtree' or 'ivf'; compare them for a given
+# gallery with `python manage.py face_index_report`.
+FACE_INDEX_BACKEND = 'brute'
+FACE_INDEX_OPTIONS = {}
+# Recognition API (attendance/api/recognize/): threads used to decode and
+# match uploaded images, and the most images accepted per request.
+FACE_API_WORKERS = 4
+FACE_API_MAX_IMAGES = 32
+
+# Months in which academic terms start; terms are keyed 'YEAR-N' (e.g.
+# '2025-2' for the second term starting in 2025) by the attendance bitmaps.
+ATTENDANCE_TERM_START_MONTHS = (1, 7)
+# Most queued events a capture device may send per request to
+# attendance/api/sync/.
+ATTENDANCE_SYNC_MAX_EVENTS = 500
+# Bearer tokens of gates, kiosks and recognizers allowed to mark attendance
+# for any date and status through the attendance APIs, comma-separated.
+ATTENDANCE_DEVICE_TOKENS = [
+    token for token in os.environ.get('ATTENDANCE_DEVICE_TOKENS', '').split(',') if token
+]
+
 LOGIN_URL = '/login/'
 LOGIN_REDIRECT_URL = '/dashboard/'
 LOGOUT_REDIRECT_URL = '/login/'
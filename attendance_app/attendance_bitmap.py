@@ -0,0 +1,213 @@
+from collections import defaultdict
+from datetime import date, timedelta
+
+import numpy as np
+from django.conf import settings
+
+from .models import Attendance, AttendanceTermBitmap
+
+BITMAP_STATUSES = ('present', 'absent', 'late', 'excused')
+# Set bits in every byte value, for counting days without unpacking.
+POPCOUNT = np.array([bin(value).count('1') for value in range(256)], dtype=np.uint16)
+
+
+def term_for(day):
+    """
+    Return (term key, start date, end date exclusive) for the academic term
+    containing `day`, using settings.ATTENDANCE_TERM_START_MONTHS.
+    """
+    if isinstance(day, str):
+        day = date.fromisoformat(day)
+    months = sorted(settings.ATTENDANCE_TERM_START_MONTHS)
+    year = day.year
+    starts = [m for m in months if m <= day.month]
+    if starts:
+        number, month = len(starts), starts[-1]
+    else:
+        year -= 1
+        number, month = len(months), months[-1]
+    following = months.index(month) + 1
+    if following < len(months):
+        end = date(year, months[following], 1)
+    else:
+        end = date(year + 1, months[0], 1)
+    return f'{year}-{number}', date(year, month, 1), end
+
+
+def _term_bounds(term):
+    year, number = (int(part) for part in term.split('-'))
+    start = date(year, sorted(settings.ATTENDANCE_TERM_START_MONTHS)[number - 1], 1)
+    return term_for(start)
+
+
+def _build_bitmaps(term, student_ids):
+    """
+    Read the term's attendance for `student_ids` once and pack it into
+    {student_id: AttendanceTermBitmap}.
+    """
+    term, start, end = _term_bounds(term)
+    days = (end - start).days
+    student_ids = sorted(student_ids)
+    rows = np.array(
+        list(
+            Attendance.objects.filter(student_id__in=student_ids, date__gte=start, date__lt=end)
+            .values_list('student_id', 'date', 'status')
+        ),
+        dtype=object,
+    ).reshape(-1, 3)
+
+    position = {student_id: n for n, student_id in enumerate(student_ids)}
+    bits = np.zeros((len(student_ids), len(BITMAP_STATUSES), days), dtype=bool)
+    if len(rows):
+        status_index = {status: n for n, status in enumerate(BITMAP_STATUSES)}
+        known = np.array([status in status_index for status in rows[:, 2]])
+        rows = rows[known]
+        bits[
+            [position[student_id] for student_id in rows[:, 0]],
+            [status_index[status] for status in rows[:, 2]],
+            [(day - start).days for day in rows[:, 1]],
+        ] = True
+    packed = np.packbits(bits, axis=-1, bitorder='little')
+
+    return {
+        student_id: AttendanceTermBitmap(
+            student_id=student_id, term=term, start_date=start, days=days,
+            **{status: packed[n, s].tobytes() for s, status in enumerate(BITMAP_STATUSES)},
+        )
+        for student_id, n in position.items()
+        if bits[n].any()
+    }
+
+
+def refresh_bitmaps(keys):
+    """
+    Rebuild the term bitmaps of the given (student_id, date) pairs from
+    Attendance, one query per affected term.
+    """
+    by_term = defaultdict(set)
+    for student_id, day in keys:
+        by_term[term_for(day)[0]].add(student_id)
+
+    for term, student_ids in by_term.items():
+        bitmaps = _build_bitmaps(term, student_ids)
+        AttendanceTermBitmap.objects.bulk_create(
+            list(bitmaps.values()),
+            update_conflicts=True,
+            unique_fields=['student', 'term'],
+            update_fields=['start_date', 'days', *BITMAP_STATUSES],
+        )
+        AttendanceTermBitmap.objects.filter(
+            term=term, student_id__in=student_ids - set(bitmaps)
+        ).delete()
+
+
+def rebuild_bitmaps(batch_size=500):
+    """
+    Replace every term bitmap with one rebuilt from Attendance. Returns the
+    number of student-terms written.
+    """
+    first = Attendance.objects.order_by('date').values_list('date', flat=True).first()
+    last = Attendance.objects.order_by('-date').values_list('date', flat=True).first()
+    AttendanceTermBitmap.objects.all().delete()
+    if first is None:
+        return 0
+
+    written = 0
+    term, start, end = term_for(first)
+    while start <= last:
+        student_ids = set(
+            Attendance.objects.filter(date__gte=start, date__lt=end)
+            .values_list('student_id', flat=True).distinct()
+        )
+        bitmaps = _build_bitmaps(term, student_ids)
+        AttendanceTermBitmap.objects.bulk_create(list(bitmaps.values()), batch_size=batch_size)
+        written += len(bitmaps)
+        term, start, end = term_for(end)
+    return written
+
+
+class CohortAttendance:
+    """
+    Term bitmaps for a cohort loaded into (students x bytes) uint8 matrices,
+    one per status, for vectorized queries across every student at once.
+    """
+
+    def __init__(self, term, student_ids, start_date, days, matrices):
+        self.term = term
+        self.student_ids = np.asarray(student_ids)
+        self.start_date = start_date
+        self.days = days
+        self.matrices = matrices
+
+    @classmethod
+    def load(cls, term, student_ids=None):
+        term, start, end = _term_bounds(term)
+        days = (end - start).days
+        width = (days + 7) // 8
+        bitmaps = AttendanceTermBitmap.objects.filter(term=term).order_by('student_id')
+        if student_ids is not None:
+            bitmaps = bitmaps.filter(student_id__in=student_ids)
+        rows = list(bitmaps.values_list('student_id', *BITMAP_STATUSES))
+
+        matrices = {status: np.zeros((len(rows), width), dtype=np.uint8) for status in BITMAP_STATUSES}
+        for n, (_, *fields) in enumerate(rows):
+            for status, data in zip(BITMAP_STATUSES, fields):
+                data = np.frombuffer(bytes(data), dtype=np.uint8)[:width]
+                matrices[status][n, :len(data)] = data
+        return cls(term, [row[0] for row in rows], start, days, matrices)
+
+    def __len__(self):
+        return len(self.student_ids)
+
+    def counts(self, status):
+        return POPCOUNT[self.matrices[status]].sum(axis=1)
+
+    def marked_days(self):
+        marked = np.bitwise_or.reduce([self.matrices[status] for status in BITMAP_STATUSES])
+        return POPCOUNT[marked].sum(axis=1)
+
+    def percentages(self, statuses=('present',)):
+        """
+        Share of marked days (per student) with one of `statuses`, in percent.
+        """
+        attended = np.bitwise_or.reduce([self.matrices[status] for status in statuses])
+        marked = self.marked_days()
+        with np.errstate(divide='ignore', invalid='ignore'):
+            return np.where(marked > 0, POPCOUNT[attended].sum(axis=1) * 100.0 / marked, 0.0)
+
+    def below(self, threshold, statuses=('present',)):
+        """
+        Student ids whose percentage is below `threshold`, with the
+        percentages, lowest first.
+        """
+        percentages = self.percentages(statuses)
+        selected = np.flatnonzero((percentages < threshold) & (self.marked_days() > 0))
+        selected = selected[np.argsort(percentages[selected], kind='stable')]
+        return self.student_ids[selected], percentages[selected]
+
+    def _bits(self, status):
+        return np.unpackbits(self.matrices[status], axis=1, bitorder='little')[:, :self.days].astype(bool)
+
+    def streaks(self, status='absent', until=None):
+        """
+        Return (longest, current) runs of consecutive marked days with
+        `status` per student. Unmarked days (weekends, holidays) neither
+        extend nor break a run. `current` is the run ending at `until`
+        (default: the last day of the term or today, whichever is earlier).
+        """
+        hits = self._bits(status)
+        breaks = np.zeros_like(hits)
+        for other in BITMAP_STATUSES:
+            if other != status:
+                breaks |= self._bits(other)
+
+        running = np.cumsum(hits, axis=1, dtype=np.int32)
+        last_break = np.maximum.accumulate(np.where(breaks, running, 0), axis=1)
+        runs = running - last_break
+
+        until = until or min(date.today(), self.start_date + timedelta(days=self.days - 1))
+        day = min(max((until - self.start_date).days, 0), self.days - 1)
+        if runs.shape[1] == 0:
+            empty = np.zeros(len(self), dtype=np.int32)
+            return empty, empty
+        return runs.max(axis=1), runs[:, day]
@@ -0,0 +1,197 @@
+from datetime import date
+from urllib.parse import urlencode
+
+from django.contrib.auth.models import User
+from django.db.models import Q, Sum
+
+from .models import Attendance, AttendanceMonthly
+from .rollup import month_start
+
+FILTER_FIELDS = ('date_from', 'date_to', 'status', 'course', 'semester')
+
+
+def parse_filters(params):
+    """
+    Clean staff attendance filters from request parameters, dropping values
+    that do not parse.
+    """
+    filters = {}
+    for field in ('date_from', 'date_to'):
+        try:
+            filters[field] = date.fromisoformat(params.get(field, ''))
+        except ValueError:
+            pass
+    if params.get('status') in dict(Attendance.STATUS_CHOICES):
+        filters['status'] = params['status']
+    if params.get('course', '').strip():
+        filters['course'] = params['course'].strip()
+    if params.get('semester', '').isdigit():
+        filters['semester'] = int(params['semester'])
+    return filters
+
+
+def filter_attendance(queryset, filters):
+    if 'date_from' in filters:
+        queryset = queryset.filter(date__gte=filters['date_from'])
+    if 'date_to' in filters:
+        queryset = queryset.filter(date__lte=filters['date_to'])
+    if 'status' in filters:
+        queryset = queryset.filter(status=filters['status'])
+    if 'course' in filters:
+        queryset = queryset.filter(student__profile__course=filters['course'])
+    if 'semester' in filters:
+        queryset = queryset.filter(student__profile__semester=filters['semester'])
+    return queryset
+
+
+def approximate_count(filters):
+    """
+    Number of matching records estimated from the monthly rollup, without
+    counting Attendance rows. Date bounds are rounded out to whole months.
+    """
+    months = AttendanceMonthly.objects.all()
+    if 'date_from' in filters:
+        months = months.filter(month__gte=month_start(filters['date_from']))
+    if 'date_to' in filters:
+        months = months.filter(month__lte=month_start(filters['date_to']))
+    if 'course' in filters:
+        months = months.filter(student__profile__course=filters['course'])
+    if 'semester' in filters:
+        months = months.filter(student__profile__semester=filters['semester'])
+    return months.aggregate(count=Sum(filters.get('status', 'total')))['count'] or 0
+
+
+def make_cursor(record):
+    return f'{record.date.isoformat()}.{record.pk}'
+
+
+def parse_cursor(value):
+    try:
+        day, pk = value.split('.')
+        return date.fromisoformat(day), int(pk)
+    except (AttributeError, ValueError):
+        return None
+
+
+def keyset_page(queryset, after=None, before=None, page_size=50):
+    """
+    One page of `queryset` in (-date, -id) order, starting after the `after`
+    cursor (older records) or ending before the `before` cursor (newer
+    records). Returns (records, older_cursor, newer_cursor); a cursor is None
+    when there is no page in that direction. Seeks on (date, id) instead of
+    OFFSET, so deep pages cost the same as the first.
+    """
+    after = parse_cursor(after)
+    before = parse_cursor(before)
+    if before:
+        day, pk = before
+        records = list(
+            queryset.filter(date__gte=day)
+            .filter(Q(date__gt=day) | Q(date=day, pk__gt=pk))
+            .order_by('date', 'pk')[:page_size + 1]
+        )
+        has_newer = len(records) > page_size
+        records = records[:page_size][::-1]
+        has_older = True
+    else:
+        if after:
+            day, pk = after
+            # The plain date bound lets the (date, id) index seek; the OR
+            # alone would be scanned from the newest row.
+            queryset = queryset.filter(date__lte=day).filter(Q(date__lt=day) | Q(date=day, pk__lt=pk))
+        records = list(queryset.order_by('-date', '-pk')[:page_size + 1])
+        has_older = len(records) > page_size
+        records = records[:page_size]
+        has_newer = after is not None
+
+    older = make_cursor(records[-1]) if records and has_older else None
+    newer = make_cursor(records[0]) if records and has_newer else None
+    return records, older, newer
+
+
+EXPORT_COLUMNS = (
+    ('Username', 'student__username'),
+    ('Roll Number', 'student__profile__roll_number'),
+    ('First Name', 'student__first_name'),
+    ('Last Name', 'student__last_name'),
+    ('Course', 'student__profile__course'),
+    ('Semester', 'student__profile__semester'),
+    ('Date', 'date'),
+    ('Time', 'time'),
+    ('Status', 'status'),
+    ('Marked By', 'marked_by__username'),
+    ('Source', 'source'),
+    ('Notes', 'notes'),
+)
+
+
+def export_rows(filters, chunk_size=2000):
+    """
+    Yield one tuple per matching record (see EXPORT_COLUMNS), streamed from
+    the database in chunks so memory stays flat however many rows match.
+    """
+    queryset = filter_attendance(Attendance.objects.all(), filters)
+    return (
+        queryset.order_by('date', 'pk')
+        .values_list(*(field for _, field in EXPORT_COLUMNS))
+        .iterator(chunk_size=chunk_size)
+    )
+
+
+def timetable_entries_for(user):
+    """
+    Active timetable entries a user can take attendance for: their own for
+    teachers, every active entry for admins.
+    """
+    from advanced_features.models import TimetableEntry
+
+    entries = TimetableEntry.objects.filter(is_active=True).select_related('course', 'time_slot')
+    if user.profile.role != 'admin':
+        entries = entries.filter(teacher=user)
+    return entries.order_by('course__code', 'time_slot__day_of_week', 'time_slot__start_time')
+
+
+def parse_roster_scope(params, user):
+    """
+    Section to mark attendance for: a timetable entry the user may access
+    and/or Profile course and semester. Returns an empty dict when no
+    section was chosen.
+    """
+    scope = {}
+    if params.get('timetable', '').isdigit():
+        entry = timetable_entries_for(user).filter(pk=int(params['timetable'])).first()
+        if entry is not None:
+            scope['timetable'] = entry
+    if params.get('course', '').strip():
+        scope['course'] = params['course'].strip()
+    if params.get('semester', '').isdigit():
+        scope['semester'] = int(params['semester'])
+    return scope
+
+
+def roster_students(scope):
+    """
+    Students in a section, ordered by username. A timetable entry selects
+    the students of its semester whose Profile.course names the entry's
+    course by code, name or department.
+    """
+    students = User.objects.filter(profile__role='student')
+    entry = scope.get('timetable')
+    if entry is not None:
+        students = students.filter(
+            profile__semester=entry.semester,
+            profile__course__in=[entry.course.code, entry.course.name, entry.course.department],
+        )
+    if 'course' in scope:
+        students = students.filter(profile__course=scope['course'])
+    if 'semester' in scope:
+        students = students.filter(profile__semester=scope['semester'])
+    return students.order_by('username')
+
+
+def roster_query(scope, **extra):
+    query = dict(extra)
+    query.update((key, value) for key, value in scope.items() if key != 'timetable')
+    if 'timetable' in scope:
+        query['timetable'] = scope['timetable'].pk
+    return urlencode(query)
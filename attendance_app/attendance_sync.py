@@ -0,0 +1,122 @@
+from datetime import date
+
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+
+from .models import Attendance, AttendanceReceipt
+from .rollup import refresh_attendance_summaries
+
+
+def _parse_event(event):
+    """
+    Return (key, fields, error) for one queued event.
+    """
+    if not isinstance(event, dict):
+        return None, None, 'event must be an object'
+    key = event.get('key')
+    if not isinstance(key, str) or not key or len(key) > 64:
+        return None, None, 'key must be a string of at most 64 characters'
+    if not event.get('username') and not event.get('roll_number'):
+        return key, None, 'username or roll_number is required'
+    status = event.get('status') or 'present'
+    if status not in dict(Attendance.STATUS_CHOICES):
+        return key, None, f'Invalid status: {status}'
+    try:
+        attendance_date = date.fromisoformat(event['date']) if event.get('date') else date.today()
+        captured_at = parse_datetime(event['captured_at']) if event.get('captured_at') else None
+    except (TypeError, ValueError):
+        return key, None, 'date must be YYYY-MM-DD and captured_at an ISO timestamp'
+    return key, {
+        'username': event.get('username'),
+        'roll_number': event.get('roll_number'),
+        'date': attendance_date,
+        'status': status,
+        'source': str(event.get('source') or '')[:100],
+        'captured_at': captured_at,
+    }, None
+
+
+def apply_events(events, device=''):
+    """
+    Mark attendance for a batch of queued events and return one result per
+    event, in order: 'created', 'already' (marked earlier for that date),
+    'unknown' (no such student) or 'invalid' (with an 'error').
+
+    Every event carries an idempotency key. Keys already seen are answered
+    from their AttendanceReceipt, so a device that re-sends a batch after a
+    lost response does not mark anyone twice. Students, existing
+    attendance and receipts are each read with one query, and the new rows
+    are written with bulk_create in one transaction.
+    """
+    parsed = [_parse_event(event) for event in events]
+    keys = {key for key, fields, _ in parsed if fields is not None}
+    replayed = {
+        key: {'result': result, 'username': username}
+        for key, result, username in AttendanceReceipt.objects.filter(key__in=keys)
+        .values_list('key', 'result', 'student__username')
+    }
+    new = {}
+    for key, fields, _ in parsed:
+        if fields is not None and key not in replayed:
+            new.setdefault(key, fields)
+
+    outcome = {}
+    if new:
+        usernames = [fields['username'] for fields in new.values() if fields['username']]
+        roll_numbers = [fields['roll_number'] for fields in new.values() if fields['roll_number']]
+        by_username = {}
+        by_roll_number = {}
+        students = (
+            User.objects.filter(profile__role='student')
+            .filter(Q(username__in=usernames) | Q(profile__roll_number__in=roll_numbers))
+            .values_list('id', 'username', 'profile__roll_number')
+        )
+        for student_id, username, roll_number in students:
+            by_username[username] = (student_id, username)
+            if roll_number:
+                by_roll_number[roll_number] = (student_id, username)
+
+        with transaction.atomic():
+            resolved = {
+                key: by_username.get(fields['username']) or by_roll_number.get(fields['roll_number'])
+                for key, fields in new.items()
+            }
+            marked = set(
+                Attendance.objects.filter(
+                    student_id__in={student[0] for student in resolved.values() if student},
+                    date__in={fields['date'] for fields in new.values()},
+                ).values_list('student_id', 'date')
+            )
+            records = []
+            receipts = []
+            for key, fields in new.items():
+                student = resolved[key]
+                if student is None:
+                    result = 'unknown'
+                elif (student[0], fields['date']) in marked:
+                    result = 'already'
+                else:
+                    result = 'created'
+                    marked.add((student[0], fields['date']))
+                    records.append(Attendance(
+                        student_id=student[0], date=fields['date'], status=fields['status'],
+                        source=fields['source'] or device,
+                    ))
+                outcome[key] = {'result': result, 'username': student[1] if student else None}
+                receipts.append(AttendanceReceipt(
+                    key=key, device=device, student_id=student[0] if student else None,
+                    date=fields['date'], result=result, captured_at=fields['captured_at'],
+                ))
+            Attendance.objects.bulk_create(records, ignore_conflicts=True)
+            AttendanceReceipt.objects.bulk_create(receipts, ignore_conflicts=True)
+            refresh_attendance_summaries((record.student_id, record.date) for record in records)
+
+    results = []
+    for key, fields, error in parsed:
+        if fields is None:
+            results.append({'key': key, 'result': 'invalid', 'error': error})
+        else:
+            results.append({'key': key, **(replayed.get(key) or outcome[key])})
+    return results
@@ -0,0 +1,117 @@
+import threading
+from datetime import date
+
+from django.db import connection, transaction
+
+from .models import Attendance
+from .rollup import refresh_attendance_summaries
+
+
+class AttendanceWriter:
+    """
+    Write-behind buffer for recognized students. add() only records the
+    student id in memory; a background thread flushes the buffer every
+    `flush_interval` seconds with a single bulk_create that relies on the
+    (student, date) unique constraint to skip students already marked.
+    Student ids come from the face gallery index, so no User lookups are
+    needed. Attendance is recorded for `attendance_date`, or the day of the
+    add() when it is None, and tagged with the camera or recording it came
+    from (`source` per add(), falling back to the writer's default).
+    Students are deduplicated per day, so a writer left running past
+    midnight marks them again the next day.
+    """
+
+    def __init__(self, flush_interval=3.0, status='present', marked_by=None, on_created=None,
+                 attendance_date=None, source=''):
+        self.flush_interval = flush_interval
+        self.attendance_date = attendance_date
+        self.source = source
+        self.status = status
+        self.marked_by = marked_by
+        self.on_created = on_created
+        self.pending = {}  # (student_id, date) -> (username, source)
+        self.flushed = set()
+        self._day = None
+        self.created = set()
+        self._lock = threading.Lock()
+        self._stop_event = threading.Event()
+        self._thread = None
+
+    def add(self, student_id, username=None, source=None):
+        day = self.attendance_date or date.today()
+        key = (student_id, day)
+        with self._lock:
+            if day != self._day:
+                # A new day: earlier days' students no longer block marking.
+                self._day = day
+                self.flushed = {flushed for flushed in self.flushed if flushed[1] == day}
+            if key not in self.flushed and key not in self.pending:
+                self.pending[key] = (username or str(student_id), self.source if source is None else source)
+
+    def flush(self):
+        """
+        Write every buffered student and return the usernames whose
+        attendance was newly created.
+        """
+        with self._lock:
+            batch, self.pending = self.pending, {}
+        if not batch:
+            return []
+
+        try:
+            existing = set(
+                Attendance.objects.filter(
+                    date__in={day for _, day in batch}, student_id__in={student_id for student_id, _ in batch},
+                ).values_list('student_id', 'date')
+            )
+            with transaction.atomic():
+                Attendance.objects.bulk_create(
+                    [
+                        Attendance(
+                            student_id=student_id, date=day, status=self.status,
+                            marked_by=self.marked_by, source=source,
+                        )
+                        for (student_id, day), (_, source) in batch.items()
+                    ],
+                    ignore_conflicts=True,
+                )
+                refresh_attendance_summaries(batch)
+        except Exception:
+            # Keep the batch for the next flush rather than losing marks
+            # while the database is locked or unreachable.
+            with self._lock:
+                self.pending = {**batch, **self.pending}
+            raise
+
+        created = [username for key, (username, _) in batch.items() if key not in existing]
+        with self._lock:
+            self.flushed.update(batch)
+            self.created.update(created)
+        if created and self.on_created:
+            self.on_created(created)
+        return created
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name='attendance-writer', daemon=True)
+        self._thread.start()
+        return self
+
+    def close(self):
+        """
+        Stop the background thread (if any) and flush what is left.
+        """
+        if self._thread is not None:
+            self._stop_event.set()
+            self._thread.join()
+            self._thread = None
+        self.flush()
+
+    def _run(self):
+        try:
+            while not self._stop_event.wait(self.flush_interval):
+                try:
+                    self.flush()
+                except Exception as e:
+                    print(f"Could not flush attendance: {e}")
+        finally:
+            connection.close()
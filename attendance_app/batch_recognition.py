@@ -0,0 +1,165 @@
+import multiprocessing
+import time
+from pathlib import Path
+
+import cv2
+
+from .face_embedding import encode_faces
+from .face_tracking import detect_faces
+
+IMAGE_SUFFIXES = {'.jpg', '.jpeg', '.png', '.bmp'}
+
+# Per-process state set up by _init_worker.
+_worker = {}
+
+
+def list_frames(source):
+    """
+    Return ('video', frame_count) for a video file or ('images', paths) for
+    a directory of frames.
+    """
+    source = Path(source)
+    if source.is_dir():
+        frames = sorted(p for p in source.iterdir() if p.suffix.lower() in IMAGE_SUFFIXES)
+        return 'images', frames
+
+    cap = cv2.VideoCapture(str(source))
+    if not cap.isOpened():
+        raise ValueError(f'Could not open video {source}')
+    frame_count = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+    cap.release()
+    return 'video', frame_count
+
+
+def split_ranges(total, chunks):
+    """
+    Split [0, total) into at most `chunks` contiguous (start, end) ranges.
+    """
+    chunks = max(1, min(chunks, total))
+    bounds = [round(i * total / chunks) for i in range(chunks + 1)]
+    return [(start, end) for start, end in zip(bounds, bounds[1:]) if end > start]
+
+
+def _init_worker(gallery_dir, threshold, detect_scale):
+    # Workers may be spawned rather than forked, so Django is set up here and
+    # the gallery (which touches models) is imported after it.
+    import django
+    django.setup()
+    from .face_embedding import projection_for_gallery
+    from .face_gallery import load_gallery
+
+    gallery = load_gallery(gallery_dir, rebuild=False)
+    _worker.update(
+        gallery=gallery,
+        matcher=gallery.matcher(),
+        projection=projection_for_gallery(gallery),
+        threshold=threshold,
+        detect_scale=detect_scale,
+        face_cascade=cv2.CascadeClassifier(cv2.data.haarcascades + 'haarcascade_frontalface_default.xml'),
+    )
+
+
+def _read_frames(source, kind, paths, start, end, stride):
+    if kind == 'images':
+        for offset in range(0, end - start, stride):
+            yield start + offset, cv2.imread(str(paths[offset]))
+        return
+
+    cap = cv2.VideoCapture(str(source))
+    cap.set(cv2.CAP_PROP_POS_FRAMES, start)
+    try:
+        for frame_number in range(start, end):
+            if (frame_number - start) % stride:
+                if not cap.grab():
+                    break
+                continue
+            ret, frame = cap.read()
+            if not ret:
+                break
+            yield frame_number, frame
+    finally:
+        cap.release()
+
+
+def process_chunk(task):
+    """
+    Detect and match faces in one frame range. Returns the recognized
+    students as {student_id: (username, best_distance, first_frame)} plus
+    the number of frames processed and the time taken.
+    """
+    source, kind, paths, start, end, stride = task
+    gallery = _worker['gallery']
+    started = time.perf_counter()
+    recognized = {}
+    processed = 0
+
+    for frame_number, frame in _read_frames(source, kind, paths, start, end, stride):
+        if frame is None:
+            continue
+        processed += 1
+        gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+        faces = detect_faces(_worker['face_cascade'], gray, _worker['detect_scale'])
+        if len(faces) == 0:
+            continue
+
+        encodings = encode_faces(gray, faces)
+        if _worker['projection'] is not None:
+            encodings = _worker['projection'].project(encodings)
+        for match in _worker['matcher'].match(encodings):
+            if match.distance >= _worker['threshold']:
+                continue
+            student_id = gallery.student_ids[match.index]
+            previous = recognized.get(student_id)
+            if previous is None:
+                recognized[student_id] = (match.label, match.distance, frame_number)
+            elif match.distance < previous[1]:
+                recognized[student_id] = (match.label, match.distance, previous[2])
+
+    return recognized, processed, time.perf_counter() - started
+
+
+def merge_recognitions(results):
+    merged = {}
+    for recognized, _, _ in results:
+        for student_id, (username, distance, first_frame) in recognized.items():
+            previous = merged.get(student_id)
+            if previous is None:
+                merged[student_id] = (username, distance, first_frame)
+            else:
+                merged[student_id] = (username, min(distance, previous[1]), min(first_frame, previous[2]))
+    return merged
+
+
+def recognize_recording(source, gallery_dir, threshold, workers=None, chunks=None, stride=1, detect_scale=1.0):
+    """
+    Run detection and matching over a recorded video or frame directory in
+    a process pool. Each worker memory-maps the same precompiled gallery
+    read-only. Returns (recognitions, report).
+    """
+    workers = workers or multiprocessing.cpu_count()
+    kind, frames = list_frames(source)
+    total = len(frames) if kind == 'images' else frames
+    ranges = split_ranges(total, chunks or workers * 4)
+    tasks = [
+        (str(source), kind, frames[start:end] if kind == 'images' else None, start, end, stride)
+        for start, end in ranges
+    ]
+
+    started = time.perf_counter()
+    with multiprocessing.Pool(
+        workers, initializer=_init_worker, initargs=(str(gallery_dir), threshold, detect_scale)
+    ) as pool:
+        results = pool.map(process_chunk, tasks)
+    elapsed = time.perf_counter() - started
+
+    processed = sum(result[1] for result in results)
+    report = {
+        'frames': total,
+        'frames_processed': processed,
+        'chunks': len(tasks),
+        'workers': workers,
+        'seconds': round(elapsed, 3),
+        'fps': processed / elapsed if elapsed > 0 else 0.0,
+        'worker_fps': processed / sum(result[2] for result in results) if processed else 0.0,
+    }
+    return merge_recognitions(results), report
@@ -0,0 +1,248 @@
+import platform
+import time
+import uuid
+from datetime import date
+
+import cv2
+import numpy as np
+from django.contrib.auth.models import User
+from django.db import transaction
+
+from .face_codec import encode_encoding, quantize
+from .face_embedding import FACE_SIZE, FaceProjection, encode_faces
+from .face_enrollment import fingerprint_images
+from .face_gallery import FaceGallery, _gallery_rows
+from .models import Attendance
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+RAW_DIMS = FACE_SIZE[0] * FACE_SIZE[1]
+
+
+def _array_bytes(obj):
+    """
+    Bytes held by the numpy arrays directly referenced by an index object.
+    """
+    return sum(value.nbytes for value in vars(obj).values() if isinstance(value, np.ndarray))
+
+
+def _max_rss_mb():
+    if resource is None:
+        return None
+    # ru_maxrss is KiB on Linux and bytes on macOS.
+    scale = 1 if platform.system() == 'Darwin' else 1024
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * scale / 2 ** 20
+
+
+def _percentiles(values):
+    values = np.asarray(values, dtype=np.float64)
+    if len(values) == 0:
+        return {'mean': 0.0, 'p50': 0.0, 'p99': 0.0}
+    return {
+        'mean': float(values.mean()),
+        'p50': float(np.percentile(values, 50)),
+        'p99': float(np.percentile(values, 99)),
+    }
+
+
+def synthetic_gallery(n_students, dims, storage='float32', seed=0):
+    """
+    FaceGallery of random encodings for students 1..n_students, quantized
+    the same way build_gallery would.
+    """
+    rng = np.random.default_rng(seed)
+    vectors = rng.normal(0, 50, (n_students, dims)).astype(np.float32)
+    codes, scales = quantize(vectors, storage)
+    student_ids = range(1, n_students + 1)
+    return FaceGallery(codes, student_ids, [f'student{i}' for i in student_ids], None, scales=scales), vectors
+
+
+def synthetic_projection(dims, seed=0):
+    rng = np.random.default_rng(seed)
+    components = rng.normal(0, 1 / np.sqrt(RAW_DIMS), (RAW_DIMS, dims)).astype(np.float32)
+    return FaceProjection(components, np.zeros(dims, dtype=np.float32), method='pca')
+
+
+def synthetic_frames(n_frames, faces_per_frame, frame_size=(480, 640), seed=0):
+    """
+    Yield (BGR frame, face boxes) with textured squares pasted at random
+    positions. The squares are not real faces, so the Haar cascade is timed
+    on the frame but later stages use the planted boxes.
+    """
+    rng = np.random.default_rng(seed)
+    height, width = frame_size
+    for _ in range(n_frames):
+        frame = rng.integers(0, 60, (height, width, 3), dtype=np.uint8)
+        boxes = []
+        for _ in range(faces_per_frame):
+            size = int(rng.integers(60, 140))
+            x = int(rng.integers(0, width - size))
+            y = int(rng.integers(0, height - size))
+            frame[y:y + size, x:x + size] = rng.integers(0, 255, (size, size, 3), dtype=np.uint8)
+            boxes.append((x, y, size, size))
+        yield frame, np.array(boxes, dtype=int).reshape(-1, 4)
+
+
+def _write_students(existing, count):
+    """
+    Ids of `count` real users to write attendance for: existing students,
+    topped up with throwaway users. Call inside the transaction that is
+    rolled back, so the writes are timed with foreign keys enforced.
+    """
+    missing = count - len(existing)
+    if missing <= 0:
+        return existing[:count]
+    prefix = uuid.uuid4().hex[:8]
+    users = User.objects.bulk_create(
+        [User(username=f'benchmark-{prefix}-{n}') for n in range(missing)]
+    )
+    return existing + [user.id for user in users]
+
+
+def time_recognition(gallery, vectors, projection=None, frames=100, faces_per_frame=4,
+                     backend='brute', index_options=None, write_batch=0, seed=0):
+    """
+    Run the recognizer's per-frame stages on synthetic frames and return
+    per-stage and per-frame latencies in ms, fps and gallery memory.
+    Probes are gallery vectors plus noise substituted for the encodings of
+    the planted boxes, so matching does realistic work. With write_batch > 0
+    attendance for that many students (existing students, topped up with
+    throwaway users) is bulk-created per frame inside a transaction that is
+    rolled back.
+    """
+    face_cascade = cv2.CascadeClassifier(cv2.data.haarcascades + 'haarcascade_frontalface_default.xml')
+    started = time.perf_counter()
+    matcher = gallery.matcher(backend, **(index_options or {}))
+    build_seconds = time.perf_counter() - started
+
+    rng = np.random.default_rng(seed)
+    stages = {name: [] for name in ('cvtColor', 'detectMultiScale', 'resize_flatten', 'project', 'match', 'db_write')}
+    frame_ms = []
+    correct = 0
+    probes = 0
+    today = date.today()
+    existing_students = []
+    if write_batch:
+        existing_students = list(
+            User.objects.filter(profile__role='student').values_list('id', flat=True)[:write_batch]
+        )
+
+    for frame, boxes in synthetic_frames(frames, faces_per_frame, seed=seed):
+        timings = {}
+
+        t = time.perf_counter()
+        gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+        timings['cvtColor'] = time.perf_counter() - t
+
+        t = time.perf_counter()
+        face_cascade.detectMultiScale(gray, 1.3, 5)
+        timings['detectMultiScale'] = time.perf_counter() - t
+
+        t = time.perf_counter()
+        encodings = encode_faces(gray, boxes)
+        timings['resize_flatten'] = time.perf_counter() - t
+
+        if projection is not None:
+            t = time.perf_counter()
+            encodings = projection.project(encodings)
+            timings['project'] = time.perf_counter() - t
+
+        rows = rng.integers(0, len(gallery), len(boxes))
+        encodings = vectors[rows] + rng.normal(0, 5, (len(rows), vectors.shape[1])).astype(np.float32)
+        t = time.perf_counter()
+        matches = matcher.match(encodings)
+        timings['match'] = time.perf_counter() - t
+        correct += sum(match.index == row for match, row in zip(matches, rows))
+        probes += len(rows)
+
+        if write_batch:
+            with transaction.atomic():
+                student_ids = _write_students(existing_students, write_batch)
+                t = time.perf_counter()
+                Attendance.objects.bulk_create(
+                    [Attendance(student_id=student_id, date=today) for student_id in student_ids],
+                    ignore_conflicts=True,
+                )
+                timings['db_write'] = time.perf_counter() - t
+                transaction.set_rollback(True)
+
+        for name, seconds in timings.items():
+            stages[name].append(seconds * 1000)
+        frame_ms.append(sum(timings.values()) * 1000)
+
+    total_seconds = sum(frame_ms) / 1000
+    return {
+        'students': len(gallery),
+        'dims': int(vectors.shape[1]),
+        'storage': str(gallery.encodings.dtype),
+        'backend': backend,
+        'frames': frames,
+        'faces_per_frame': faces_per_frame,
+        'index_build_seconds': build_seconds,
+        'fps': frames / total_seconds if total_seconds else 0.0,
+        'frame_ms': _percentiles(frame_ms),
+        'stages_ms': {name: _percentiles(values) for name, values in stages.items() if values},
+        'top1_accuracy': correct / probes if probes else 0.0,
+        'gallery_bytes': int(gallery.encodings.nbytes + gallery.scales.nbytes),
+        'index_bytes': _array_bytes(matcher.index),
+        'max_rss_mb': _max_rss_mb(),
+    }
+
+
+def time_enrollment(n_images, storage='float32', seed=0):
+    """
+    Time train_faces' per-image work (hash, decode, detect, encode) and the
+    gallery build's decode/stack step on synthetic JPEG crops.
+    """
+    face_cascade = cv2.CascadeClassifier(cv2.data.haarcascades + 'haarcascade_frontalface_default.xml')
+    rng = np.random.default_rng(seed)
+    images = [
+        cv2.imencode('.jpg', rng.integers(0, 255, (160, 160), dtype=np.uint8))[1].tobytes()
+        for _ in range(n_images)
+    ]
+    stages = {name: [] for name in ('hash', 'imdecode', 'detectMultiScale', 'resize_flatten')}
+    vectors = []
+    for n, data in enumerate(images):
+        t = time.perf_counter()
+        fingerprint_images([(f'{n}.jpg', data)], storage)
+        stages['hash'].append(time.perf_counter() - t)
+
+        t = time.perf_counter()
+        gray = cv2.imdecode(np.frombuffer(data, dtype=np.uint8), cv2.IMREAD_GRAYSCALE)
+        stages['imdecode'].append(time.perf_counter() - t)
+
+        t = time.perf_counter()
+        face_cascade.detectMultiScale(gray, 1.3, 5)
+        stages['detectMultiScale'].append(time.perf_counter() - t)
+
+        t = time.perf_counter()
+        vectors.append(encode_faces(gray, [(20, 20, 120, 120)])[0])
+        stages['resize_flatten'].append(time.perf_counter() - t)
+
+    blobs = [encode_encoding(vector, storage) for vector in vectors]
+    t = time.perf_counter()
+    _gallery_rows(blobs, storage)
+    gallery_rows_seconds = time.perf_counter() - t
+
+    per_image = np.sum([stages[name] for name in stages], axis=0)
+    return {
+        'images': n_images,
+        'storage': storage,
+        'images_per_second': n_images / per_image.sum() if n_images else 0.0,
+        'stages_ms': {name: _percentiles(np.array(values) * 1000) for name, values in stages.items()},
+        'gallery_build_seconds': gallery_rows_seconds,
+    }
+
+
+def environment():
+    return {
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'opencv': cv2.__version__,
+        'machine': platform.machine(),
+        'system': platform.system(),
+        'cpu_threads': cv2.getNumberOfCPUs(),
+    }
@@ -0,0 +1,74 @@
+import struct
+
+import numpy as np
+
+# Quantized encodings start with a 12 byte header: magic, dtype code, three
+# padding bytes and a float32 scale. Rows without the magic are the original
+# headerless float32 bytes and are still read as such.
+MAGIC = b'FEQ1'
+HEADER = struct.Struct('<4sB3xf')
+
+STORAGE_DTYPES = {
+    'float32': (0, np.float32),
+    'float16': (1, np.float16),
+    'int8': (2, np.int8),
+}
+_CODES = {code: (name, dtype) for name, (code, dtype) in STORAGE_DTYPES.items()}
+
+
+def quantize(vectors, storage):
+    """
+    Convert float vectors to `storage` codes plus a per-vector scale so that
+    vector ~= codes * scale. Only int8 uses a scale other than 1.
+    """
+    vectors = np.atleast_2d(np.asarray(vectors, dtype=np.float32))
+    if storage not in STORAGE_DTYPES:
+        raise ValueError(f"Unknown encoding storage '{storage}'. Choose from: {', '.join(STORAGE_DTYPES)}")
+
+    if storage == 'int8':
+        scales = np.abs(vectors).max(axis=1) / 127
+        scales[scales == 0] = 1
+        codes = np.clip(np.rint(vectors / scales[:, None]), -127, 127).astype(np.int8)
+        return codes, scales.astype(np.float32)
+
+    dtype = STORAGE_DTYPES[storage][1]
+    return vectors.astype(dtype), np.ones(len(vectors), dtype=np.float32)
+
+
+def dequantize(codes, scales=None):
+    vectors = np.asarray(codes, dtype=np.float32)
+    if scales is not None and codes.dtype == np.int8:
+        vectors = vectors * np.asarray(scales, dtype=np.float32)[:, None]
+    return vectors
+
+
+def encode_encoding(vector, storage='float32'):
+    """
+    Serialize one encoding for FaceEncoding.encoding. float32 keeps the
+    original headerless layout so existing readers are unaffected.
+    """
+    if storage == 'float32':
+        return np.asarray(vector, dtype=np.float32).tobytes()
+    codes, scales = quantize(vector, storage)
+    return HEADER.pack(MAGIC, STORAGE_DTYPES[storage][0], float(scales[0])) + codes.tobytes()
+
+
+def decode_encoding(blob):
+    """
+    Return (storage, codes, scale) for a stored encoding without converting
+    the codes to float32.
+    """
+    blob = bytes(blob)
+    if blob[:len(MAGIC)] == MAGIC and len(blob) >= HEADER.size:
+        _, code, scale = HEADER.unpack_from(blob)
+        storage, dtype = _CODES[code]
+        return storage, np.frombuffer(blob, dtype=dtype, offset=HEADER.size), scale
+    return 'float32', np.frombuffer(blob, dtype=np.float32), 1.0
+
+
+def decode_to_float32(blob):
+    storage, codes, scale = decode_encoding(blob)
+    vector = codes.astype(np.float32)
+    if storage == 'int8':
+        vector *= scale
+    return vector
@@ -0,0 +1,197 @@
+import hashlib
+from pathlib import Path
+
+import cv2
+import numpy as np
+from django.conf import settings
+
+FACE_SIZE = (100, 100)
+
+
+def encode_faces(gray, faces):
+    """
+    Crop each (x, y, w, h) box out of a grayscale frame and return the
+    raw-pixel encodings as one (faces x 10000) float32 matrix.
+    """
+    if len(faces) == 0:
+        return np.empty((0, FACE_SIZE[0] * FACE_SIZE[1]), dtype=np.float32)
+    return np.stack([
+        cv2.resize(gray[y:y+h, x:x+w], FACE_SIZE).flatten()
+        for (x, y, w, h) in faces
+    ]).astype(np.float32)
+
+
+def collect_student_images(student_images_dir):
+    """
+    Map each username to its enrollment images: student_images/username.jpg
+    and, for several images per student, student_images/username/*.jpg
+    """
+    images = {}
+    for image_file in sorted(student_images_dir.glob('*.jpg')):
+        images.setdefault(image_file.stem, []).append(image_file)
+    for student_dir in sorted(p for p in student_images_dir.iterdir() if p.is_dir()):
+        images.setdefault(student_dir.name, []).extend(sorted(student_dir.glob('*.jpg')))
+    return images
+
+
+class FaceProjection:
+    """
+    Linear projection from raw-pixel encodings to a low-dimensional
+    embedding (PCA eigenfaces, optionally followed by LDA).
+    project(x) = x @ components - offset, so live faces cost one matmul.
+    """
+
+    def __init__(self, components, offset, method='pca', threshold=None):
+        self.components = np.ascontiguousarray(components, dtype=np.float32)
+        self.offset = np.ascontiguousarray(offset, dtype=np.float32)
+        self.method = method
+        self.threshold = threshold
+
+    @property
+    def dims(self):
+        return self.components.shape[1]
+
+    @property
+    def version(self):
+        digest = hashlib.sha1(self.components.tobytes())
+        digest.update(self.offset.tobytes())
+        return f'{self.method}-{self.dims}-{digest.hexdigest()[:12]}'
+
+    def project(self, vectors):
+        embeddings = np.atleast_2d(vectors).astype(np.float32, copy=False) @ self.components
+        embeddings -= self.offset
+        return embeddings
+
+    def save(self, path=None):
+        path = Path(path or settings.FACE_PROJECTION_PATH)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with open(path, 'wb') as f:
+            np.savez(
+                f,
+                components=self.components,
+                offset=self.offset,
+                method=self.method,
+                threshold=np.nan if self.threshold is None else self.threshold,
+            )
+        return path
+
+    @classmethod
+    def load(cls, path=None):
+        with np.load(Path(path or settings.FACE_PROJECTION_PATH)) as data:
+            threshold = float(data['threshold'])
+            return cls(
+                data['components'],
+                data['offset'],
+                method=str(data['method']),
+                threshold=None if np.isnan(threshold) else threshold,
+            )
+
+
+def fit_projection(vectors, labels, n_components=128, lda=False):
+    """
+    Fit PCA over every enrolled face vector, optionally followed by LDA on
+    the PCA space when students have more than one image each. Raises
+    ValueError when no match threshold can be calibrated (see
+    calibrate_threshold).
+    """
+    vectors = np.asarray(vectors, dtype=np.float32)
+    labels = np.asarray(labels)
+    mean = vectors.mean(axis=0)
+
+    n_components = max(1, min(n_components, vectors.shape[0], vectors.shape[1]))
+    _, _, vt = np.linalg.svd(vectors - mean, full_matrices=False)
+    components = vt[:n_components].T
+    offset = mean @ components
+    method = 'pca'
+
+    if lda:
+        n_classes = len(np.unique(labels))
+        if n_classes < 3 or n_classes == len(labels):
+            print("LDA needs at least 3 students and several images per student; using PCA only")
+        else:
+            from sklearn.discriminant_analysis import LinearDiscriminantAnalysis
+
+            pca_embeddings = vectors @ components - offset
+            lda_components = min(n_components, n_classes - 1)
+            lda_model = LinearDiscriminantAnalysis(n_components=lda_components).fit(pca_embeddings, labels)
+            scalings = lda_model.scalings_[:, :lda_components]
+            components = components @ scalings
+            offset = (offset + lda_model.xbar_) @ scalings
+            method = 'lda'
+
+    projection = FaceProjection(components, offset, method=method)
+    projection.threshold = calibrate_threshold(projection.project(vectors), labels)
+    if projection.threshold is None:
+        raise ValueError(f"A {method.upper()} match threshold needs at least two students or several images of one")
+    return projection
+
+
+def calibrate_threshold(embeddings, labels, percentile=99, separation_percentile=5):
+    """
+    Match threshold for the embedding space. With several images for some
+    students it is the given percentile of the distance between each of
+    their images and their mean embedding. With one image per student it is
+    half the `separation_percentile` of the distance from each student to
+    the nearest other student: a face that close to a student is farther
+    from every other student, whatever the distance scale of the
+    projection. Returns None for a single student with a single image.
+    """
+    distances = []
+    centres = []
+    for label in np.unique(labels):
+        member_embeddings = embeddings[labels == label]
+        centre = member_embeddings.mean(axis=0)
+        centres.append(centre)
+        if len(member_embeddings) > 1:
+            distances.extend(np.linalg.norm(member_embeddings - centre, axis=1))
+    if distances:
+        return float(np.percentile(distances, percentile))
+    if len(centres) < 2:
+        return None
+    centres = np.stack(centres)
+    squared = (centres ** 2).sum(axis=1)
+    between = squared[:, None] + squared[None, :] - 2 * centres @ centres.T
+    np.fill_diagonal(between, np.inf)
+    nearest = np.sqrt(np.maximum(between.min(axis=1), 0))
+    return float(np.percentile(nearest, separation_percentile) / 2)
+
+
+def projection_for_gallery(gallery):
+    """
+    Load the projection the gallery's encodings were trained with, or None
+    for a raw-pixel gallery.
+    """
+    return load_projection(gallery.projection)
+
+
+def load_projection(version):
+    """
+    Load the saved projection, checking that it is `version`; None for raw
+    pixels ('').
+    """
+    if not version:
+        return None
+    projection = FaceProjection.load()
+    if projection.version != version:
+        raise ValueError(
+            f"Face gallery was trained with projection {version} but "
+            f"{settings.FACE_PROJECTION_PATH} holds {projection.version}. Re-run train_faces.py."
+        )
+    return projection
+
+
+def match_threshold(projection):
+    """
+    Distance below which a face matches: FACE_MATCH_THRESHOLD for raw
+    pixels, or the threshold calibrated with the projection. The raw-pixel
+    cutoff means nothing in an embedding space, so a projection without
+    one is refused.
+    """
+    if projection is None:
+        return settings.FACE_MATCH_THRESHOLD
+    if projection.threshold is None:
+        raise ValueError(
+            f"Projection {projection.version} has no calibrated match threshold. "
+            f"Re-run train_faces.py with at least two students."
+        )
+    return projection.threshold
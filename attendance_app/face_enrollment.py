@@ -0,0 +1,73 @@
+import hashlib
+import multiprocessing
+
+import cv2
+import numpy as np
+
+from .face_embedding import encode_faces
+
+# Per-process state set up by _init_encoder.
+_encoder = {}
+
+
+def fingerprint_images(image_blobs, storage):
+    """
+    SHA-256 over a student's enrollment images (in order) and the storage
+    format, so an unchanged student can be skipped without decoding.
+    """
+    digest = hashlib.sha256(storage.encode())
+    for name, data in image_blobs:
+        digest.update(name.encode())
+        digest.update(len(data).to_bytes(8, 'little'))
+        digest.update(data)
+    return digest.hexdigest()
+
+
+def _init_encoder():
+    cv2.setNumThreads(1)
+    _encoder['face_cascade'] = cv2.CascadeClassifier(
+        cv2.data.haarcascades + 'haarcascade_frontalface_default.xml'
+    )
+
+
+def encode_student(task):
+    """
+    Hash and encode one student's images. Returns
+    (username, content_hash, vectors, messages); vectors is None when the
+    hash equals `known_hash`, otherwise a (faces x 10000) float32 matrix
+    with one row per image in which a face was found.
+    """
+    username, image_files, known_hash, storage = task
+    image_blobs = [(image_file.name, image_file.read_bytes()) for image_file in image_files]
+    content_hash = fingerprint_images(image_blobs, storage)
+    if content_hash == known_hash:
+        return username, content_hash, None, []
+
+    vectors = []
+    messages = []
+    for image_file, (_, data) in zip(image_files, image_blobs):
+        img = cv2.imdecode(np.frombuffer(data, dtype=np.uint8), cv2.IMREAD_GRAYSCALE)
+        if img is None:
+            messages.append(f"Could not read image: {image_file}")
+            continue
+        faces = _encoder['face_cascade'].detectMultiScale(img, 1.3, 5)
+        if len(faces) == 0:
+            messages.append(f"No face detected in {image_file}")
+            continue
+        vectors.append(encode_faces(img, faces[:1])[0])
+
+    if not vectors:
+        return username, content_hash, np.empty((0, 0), dtype=np.float32), messages
+    return username, content_hash, np.stack(vectors), messages
+
+
+def encode_students(tasks, workers=None):
+    """
+    Run encode_student over a process pool, yielding results as they finish.
+    """
+    if not tasks:
+        return
+    workers = max(1, min(workers or multiprocessing.cpu_count(), len(tasks)))
+    chunksize = max(1, len(tasks) // (workers * 8))
+    with multiprocessing.Pool(workers, initializer=_init_encoder) as pool:
+        yield from pool.imap_unordered(encode_student, tasks, chunksize=chunksize)
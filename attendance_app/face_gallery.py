@@ -0,0 +1,421 @@
+import json
+import os
+import tempfile
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from pathlib import Path
+
+import numpy as np
+from django.conf import settings
+from django.db import connection
+from django.db.models import Count, Max
+
+from .face_codec import STORAGE_DTYPES, decode_encoding, quantize
+from .face_matching import DeltaMatcher, FaceMatcher
+from .models import FaceEncoding
+
+ENCODINGS_FILE = 'encodings.npy'
+SCALES_FILE = 'scales.npy'
+INDEX_FILE = 'index.json'
+VERSION_FILE = 'version'
+LOAD_ATTEMPTS = 5
+
+
+class FaceGallery:
+    """
+    Precompiled face gallery: a (students x dims) matrix plus the student
+    id / username of every row, the stamp it was built from and the
+    projection version its encodings live in ('' for raw pixels).
+    The matrix is float32, float16 or int8 codes with per-row `scales`
+    depending on settings.FACE_ENCODING_STORAGE.
+    """
+
+    def __init__(self, encodings, student_ids, usernames, stamp, projection='', scales=None):
+        self.encodings = encodings
+        self.scales = scales
+        self.student_ids = list(student_ids)
+        self.usernames = list(usernames)
+        self.stamp = stamp
+        self.projection = projection
+
+    def __len__(self):
+        return len(self.student_ids)
+
+    def matcher(self, backend=None, **index_options):
+        if backend is None:
+            backend = settings.FACE_INDEX_BACKEND
+            index_options = {**settings.FACE_INDEX_OPTIONS, **index_options}
+        return FaceMatcher(
+            self.encodings, self.usernames, backend, scales=self.scales, ids=self.student_ids, **index_options
+        )
+
+
+def get_gallery_dir(gallery_dir=None):
+    return Path(gallery_dir or settings.FACE_GALLERY_DIR)
+
+
+def current_stamp():
+    """
+    Version stamp of the FaceEncoding table. The row count is included so
+    that deleted encodings also invalidate the gallery.
+    """
+    stats = FaceEncoding.objects.aggregate(latest=Max('updated_at'), total=Count('id'))
+    latest = stats['latest']
+    return {
+        'updated_at': latest.isoformat() if latest else None,
+        'count': stats['total'],
+    }
+
+
+@contextmanager
+def _temp_file(gallery_dir, name, mode='wb'):
+    """
+    Open a uniquely named temporary file next to `name` and yield (file,
+    path), so processes rebuilding the gallery at the same time never write
+    to each other's files. The file is removed if writing fails.
+    """
+    fd, path = tempfile.mkstemp(dir=gallery_dir, prefix=name + '.', suffix='.tmp')
+    try:
+        with os.fdopen(fd, mode) as f:
+            yield f, path
+    except BaseException:
+        os.unlink(path)
+        raise
+
+
+def bump_version(gallery_dir=None):
+    """
+    Write a fresh random token to the gallery's version file so running
+    recognizers notice a FaceEncoding change without querying the database.
+    """
+    gallery_dir = get_gallery_dir(gallery_dir)
+    gallery_dir.mkdir(parents=True, exist_ok=True)
+    with _temp_file(gallery_dir, VERSION_FILE, 'w') as (f, version_tmp):
+        f.write(uuid.uuid4().hex)
+    os.replace(version_tmp, gallery_dir / VERSION_FILE)
+
+
+def read_version(gallery_dir=None):
+    try:
+        return (get_gallery_dir(gallery_dir) / VERSION_FILE).read_text()
+    except OSError:
+        return None
+
+
+def _read_index(gallery_dir):
+    try:
+        with open(gallery_dir / INDEX_FILE) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def read_stamp(gallery_dir=None):
+    return _read_index(get_gallery_dir(gallery_dir)).get('stamp')
+
+
+def is_current(gallery_dir=None):
+    """
+    True when the gallery on disk matches the FaceEncoding stamp and the
+    configured storage format.
+    """
+    index = _read_index(get_gallery_dir(gallery_dir))
+    return (index.get('stamp') == current_stamp()
+            and index.get('storage') == settings.FACE_ENCODING_STORAGE)
+
+
+def _gallery_rows(blobs, storage):
+    """
+    Stack stored encodings into `storage` codes and per-row scales, copying
+    codes straight through when a row is already in that format.
+    """
+    if storage not in STORAGE_DTYPES:
+        raise ValueError(f"Unknown encoding storage '{storage}'. Choose from: {', '.join(STORAGE_DTYPES)}")
+    decoded = [decode_encoding(blob) for blob in blobs]
+    codes = np.empty((len(decoded), len(decoded[0][1])), dtype=STORAGE_DTYPES[storage][1])
+    scales = np.ones(len(decoded), dtype=np.float32)
+    for row, (row_storage, row_codes, row_scale) in enumerate(decoded):
+        if row_storage == storage:
+            codes[row] = row_codes
+            scales[row] = row_scale
+        else:
+            vector = row_codes.astype(np.float32) * row_scale
+            row_codes, row_scales = quantize(vector, storage)
+            codes[row] = row_codes[0]
+            scales[row] = row_scales[0]
+    return codes, scales
+
+
+def build_gallery(gallery_dir=None, storage=None):
+    """
+    Write every FaceEncoding to an .npy file with a JSON index of student ids
+    and usernames, in one query. Returns the stamp that was written.
+    """
+    gallery_dir = get_gallery_dir(gallery_dir)
+    storage = storage or settings.FACE_ENCODING_STORAGE
+    gallery_dir.mkdir(parents=True, exist_ok=True)
+
+    stamp = current_stamp()
+    rows = list(
+        FaceEncoding.objects.order_by('student_id')
+        .values_list('student_id', 'student__username', 'encoding', 'projection')
+    )
+
+    if rows:
+        student_ids, usernames, blobs, projections = zip(*rows)
+        if len(set(projections)) > 1:
+            raise ValueError(
+                'Face encodings were made with different projections '
+                f'({", ".join(sorted(set(p or "raw" for p in projections)))}). Re-run train_faces.py for every student.'
+            )
+        projection = projections[0]
+        encodings, scales = _gallery_rows(blobs, storage)
+    else:
+        student_ids, usernames, projection = (), (), ''
+        encodings = np.empty((0, 0), dtype=np.float32)
+        scales = np.empty(0, dtype=np.float32)
+
+    with _temp_file(gallery_dir, ENCODINGS_FILE) as (f, encodings_tmp):
+        np.save(f, encodings)
+    with _temp_file(gallery_dir, SCALES_FILE) as (f, scales_tmp):
+        np.save(f, scales)
+    with _temp_file(gallery_dir, INDEX_FILE, 'w') as (f, index_tmp):
+        json.dump({
+            'stamp': stamp,
+            'student_ids': list(student_ids),
+            'usernames': list(usernames),
+            'projection': projection,
+            'storage': storage,
+        }, f)
+
+    # The index is swapped in last so a reader never sees a new stamp next to
+    # an old matrix.
+    os.replace(encodings_tmp, gallery_dir / ENCODINGS_FILE)
+    os.replace(scales_tmp, gallery_dir / SCALES_FILE)
+    os.replace(index_tmp, gallery_dir / INDEX_FILE)
+    return stamp
+
+
+def load_gallery(gallery_dir=None, rebuild=True):
+    """
+    Memory-map the precompiled gallery, rebuilding it first when the
+    FaceEncoding stamp or the configured storage format no longer match
+    the ones on disk.
+    """
+    gallery_dir = get_gallery_dir(gallery_dir)
+    if rebuild and not is_current(gallery_dir):
+        build_gallery(gallery_dir)
+
+    # The index and the two arrays are separate files, so a rebuild in
+    # another process can land between reading them. Retry until all three
+    # come from the same build.
+    for attempt in range(LOAD_ATTEMPTS):
+        index = _read_index(gallery_dir)
+        encodings = np.load(gallery_dir / ENCODINGS_FILE, mmap_mode='r')
+        scales = np.load(gallery_dir / SCALES_FILE)
+        if 'student_ids' in index and len(index['student_ids']) == encodings.shape[0] == scales.shape[0]:
+            return FaceGallery(
+                encodings, index['student_ids'], index['usernames'], index['stamp'],
+                projection=index.get('projection', ''), scales=scales,
+            )
+        time.sleep(0.05 * (attempt + 1))
+    raise ValueError(f'The face gallery in {gallery_dir} is incomplete. Run build_face_gallery.')
+
+
+class LiveGallery:
+    """
+    Gallery and matcher for a long-running recognizer that follow
+    FaceEncoding changes. The version file bumped by the FaceEncoding
+    signals is checked every `check_interval` seconds and the table stamp
+    is polled every `poll_interval` seconds to catch bulk writes, which
+    send no signals.
+
+    On a change only the rows updated since the last stamp are fetched and
+    decoded. The base gallery and its index are left as they are: rows that
+    were removed or replaced are masked out, and new or replaced rows go to
+    a small delta searched by brute force next to the base (see
+    DeltaMatcher). Once the changes exceed `max_delta` rows they are folded
+    into a new base and its index is built once. Frames keep being matched
+    against the previous matcher until the swap, and matches carry student
+    ids, so a result never points at the wrong row.
+
+    With rebuild=False the gallery on disk is used as is, without checking
+    it against the database first.
+    """
+
+    def __init__(self, gallery_dir=None, poll_interval=30.0, check_interval=1.0, backend=None, rebuild=True,
+                 max_delta=256, **index_options):
+        self.gallery_dir = get_gallery_dir(gallery_dir)
+        self.poll_interval = poll_interval
+        self.check_interval = check_interval
+        self.backend = backend
+        self.index_options = index_options
+        self.max_delta = max_delta
+        self.version = read_version(self.gallery_dir)
+        self.reloads = 0
+        self.merges = 0
+        self._swap_lock = threading.Lock()
+        self._set_base(load_gallery(self.gallery_dir, rebuild=rebuild))
+        self._polled_at = time.monotonic()
+        self._stop_event = threading.Event()
+        self._thread = None
+
+    def _set_base(self, gallery):
+        base_matcher = gallery.matcher(self.backend, **self.index_options)
+        with self._swap_lock:
+            self._base = gallery
+            self._base_matcher = base_matcher
+            self._base_rows = {student_id: row for row, student_id in enumerate(gallery.student_ids)}
+            self._removed = frozenset()
+            self._delta = {}
+            self._merged = gallery
+            self.stamp = gallery.stamp
+            self.projection = gallery.projection
+            self.matcher = base_matcher
+
+    def __len__(self):
+        return len(self.matcher)
+
+    @property
+    def gallery(self):
+        """
+        The current gallery as one FaceGallery; base and delta are only
+        copied into a new matrix when this is asked for after a change.
+        """
+        with self._swap_lock:
+            if self._merged is None:
+                self._merged = self._merge()
+            return self._merged
+
+    def _merge(self):
+        base, delta = self._base, self._delta
+        keep = np.ones(len(base), dtype=bool)
+        keep[list(self._removed)] = False
+        rows = list(delta.values())
+        encodings = np.asarray(base.encodings)[keep]
+        scales = np.asarray(base.scales)[keep]
+        if rows:
+            codes = np.stack([code for code, _, _ in rows])
+            row_scales = np.array([scale for _, scale, _ in rows], dtype=np.float32)
+            # An emptied base may be in another projection's dimensions.
+            encodings = np.concatenate([encodings, codes]) if keep.any() else codes
+            scales = np.concatenate([scales, row_scales]) if keep.any() else row_scales
+        return FaceGallery(
+            encodings,
+            [student_id for student_id, keep_row in zip(base.student_ids, keep) if keep_row] + list(delta),
+            [username for username, keep_row in zip(base.usernames, keep) if keep_row]
+            + [username for _, _, username in rows],
+            self.stamp, projection=self.projection, scales=scales,
+        )
+
+    def match(self, faces):
+        return self.matcher.match(faces)
+
+    def current(self):
+        """
+        The (projection version, matcher) pair in use, taken together so a
+        caller never projects faces for one gallery and matches them against
+        another.
+        """
+        with self._swap_lock:
+            return self.projection, self.matcher
+
+    def check(self):
+        """
+        Refresh when the version token changed or a poll is due. Returns True
+        when a new gallery was swapped in.
+        """
+        version = read_version(self.gallery_dir)
+        poll_due = time.monotonic() - self._polled_at >= self.poll_interval
+        if version == self.version and not poll_due:
+            return False
+        self.version = version
+        self._polled_at = time.monotonic()
+        return self.refresh()
+
+    def refresh(self):
+        stamp = current_stamp()
+        if stamp == self.stamp:
+            return False
+
+        rows = FaceEncoding.objects.values_list('student_id', 'student__username', 'encoding', 'projection')
+        if self.stamp['updated_at'] is not None:
+            # >= rather than > so a row saved in the same tick as the last
+            # stamp is not missed; re-applying a row is harmless.
+            rows = rows.filter(updated_at__gte=self.stamp['updated_at'])
+        rows = list(rows)
+
+        if any(projection != self.projection for *_, projection in rows) and len(self):
+            print("Face encodings now use a different projection; restart the recognizer to load them.")
+            return False
+
+        live_ids = set(FaceEncoding.objects.values_list('student_id', flat=True))
+        self._apply(rows, live_ids, stamp)
+        self.reloads += 1
+        return True
+
+    def _apply(self, rows, live_ids, stamp):
+        projection = rows[0][3] if rows and not len(self) else self.projection
+        removed = set(self._removed)
+        removed.update(self._base_rows[student_id] for student_id in self._base_rows.keys() - live_ids)
+        delta = {student_id: row for student_id, row in self._delta.items() if student_id in live_ids}
+        if rows:
+            codes, row_scales = _gallery_rows([blob for _, _, blob, _ in rows], settings.FACE_ENCODING_STORAGE)
+            for row, (student_id, username, _, _) in enumerate(rows):
+                if student_id not in live_ids:
+                    continue
+                if student_id in self._base_rows:
+                    removed.add(self._base_rows[student_id])
+                delta.pop(student_id, None)
+                delta[student_id] = (codes[row], row_scales[row], username)
+
+        if len(removed) + len(delta) > self.max_delta or len(removed) == len(self._base):
+            # Fold the changes into a new base. Also done when nothing of the
+            # base is left, so a gallery that changed projection while empty
+            # gets an index in its new dimensions.
+            with self._swap_lock:
+                self._removed, self._delta = frozenset(removed), delta
+                self.stamp, self.projection = stamp, projection
+                gallery = self._merge()
+            self._set_base(gallery)
+            self.merges += 1
+            return
+
+        ids = list(delta)
+        values = list(delta.values())
+        matcher = DeltaMatcher(
+            self._base_matcher, removed,
+            np.stack([code for code, _, _ in values]) if values else None,
+            [username for _, _, username in values],
+            scales=np.array([scale for _, scale, _ in values], dtype=np.float32) if values else None,
+            ids=ids,
+        )
+        with self._swap_lock:
+            self._removed, self._delta = frozenset(removed), delta
+            self._merged = None
+            self.stamp, self.projection = stamp, projection
+            self.matcher = matcher
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name='face-gallery-watcher', daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        if self._thread is not None:
+            self._stop_event.set()
+            self._thread.join()
+            self._thread = None
+
+    def _run(self):
+        try:
+            while not self._stop_event.wait(self.check_interval):
+                try:
+                    if self.check():
+                        print(f"Face gallery updated: {len(self.gallery)} known faces")
+                except Exception as e:
+                    print(f"Could not refresh face gallery: {e}")
+        finally:
+            connection.close()
@@ -0,0 +1,224 @@
+import time
+
+import numpy as np
+
+from .face_codec import dequantize
+
+
+def _pad_results(distances, indices, k):
+    """
+    Pad (n, m) search results out to k columns with inf / -1 when the index
+    holds fewer than k candidates for a query.
+    """
+    n, m = distances.shape
+    if m >= k:
+        return distances[:, :k], indices[:, :k]
+    padded_distances = np.full((n, k), np.inf, dtype=np.float32)
+    padded_indices = np.full((n, k), -1, dtype=np.intp)
+    padded_distances[:, :m] = distances
+    padded_indices[:, :m] = indices
+    return padded_distances, padded_indices
+
+
+def _smallest_k(sq_distances, k):
+    """
+    Indices and euclidean distances of the k smallest entries per row,
+    sorted ascending.
+    """
+    k = min(k, sq_distances.shape[1])
+    if k == 0:
+        empty = np.empty((sq_distances.shape[0], 0))
+        return empty.astype(np.float32), empty.astype(np.intp)
+    if k < sq_distances.shape[1]:
+        candidates = np.argpartition(sq_distances, k - 1, axis=1)[:, :k]
+    else:
+        candidates = np.broadcast_to(np.arange(k), sq_distances.shape).copy()
+    candidate_distances = np.take_along_axis(sq_distances, candidates, axis=1)
+    order = np.argsort(candidate_distances, axis=1)
+    indices = np.take_along_axis(candidates, order, axis=1)
+    distances = np.sqrt(np.take_along_axis(candidate_distances, order, axis=1))
+    return distances.astype(np.float32), indices
+
+
+class BruteForceIndex:
+    """
+    Exact search: every query is scored against the whole gallery with one
+    matmul using |q - g|^2 = |q|^2 - 2 q.g + |g|^2.
+    A float16 or int8 gallery (see face_codec) is searched on its codes
+    directly, upcasting one block of rows at a time so the full matrix is
+    never held in float32.
+    """
+    name = 'brute'
+    block_elements = 1 << 23
+
+    def __init__(self, encodings, scales=None):
+        self.gallery = np.ascontiguousarray(encodings)
+        if self.gallery.dtype not in (np.float16, np.int8):
+            self.gallery = self.gallery.astype(np.float32, copy=False)
+        self.scales = None
+        if scales is not None and self.gallery.dtype == np.int8:
+            self.scales = np.asarray(scales, dtype=np.float32)
+
+        self.gallery_sq_norms = np.empty(self.gallery.shape[0], dtype=np.float32)
+        for start, block in self._blocks():
+            self.gallery_sq_norms[start:start + len(block)] = np.einsum('ij,ij->i', block, block)
+        if self.scales is not None:
+            self.gallery_sq_norms *= self.scales ** 2
+
+    def __len__(self):
+        return self.gallery.shape[0]
+
+    def _blocks(self):
+        if self.gallery.dtype == np.float32:
+            yield 0, self.gallery
+            return
+        rows = max(1, self.block_elements // max(1, self.gallery.shape[1]))
+        for start in range(0, self.gallery.shape[0], rows):
+            yield start, self.gallery[start:start + rows].astype(np.float32)
+
+    def squared_distances(self, queries):
+        queries = np.ascontiguousarray(queries, dtype=np.float32)
+        query_sq_norms = np.einsum('ij,ij->i', queries, queries)
+        distances = np.empty((queries.shape[0], self.gallery.shape[0]), dtype=np.float32)
+        for start, block in self._blocks():
+            distances[:, start:start + len(block)] = queries @ block.T
+        if self.scales is not None:
+            distances *= self.scales[None, :]
+        distances *= -2
+        distances += query_sq_norms[:, None]
+        distances += self.gallery_sq_norms[None, :]
+        np.maximum(distances, 0, out=distances)
+        return distances
+
+    def search(self, queries, k=2):
+        distances, indices = _smallest_k(self.squared_distances(queries), k)
+        return _pad_results(distances, indices, k)
+
+
+class TreeIndex:
+    """
+    Exact search through a scikit-learn ball tree or k-d tree. Worth it for
+    low-dimensional embeddings; on raw 10k-dim pixels it degrades to a scan.
+    """
+
+    def __init__(self, encodings, algorithm='ball_tree', leaf_size=40):
+        from sklearn.neighbors import BallTree, KDTree
+
+        tree_class = BallTree if algorithm == 'ball_tree' else KDTree
+        self.name = 'balltree' if algorithm == 'ball_tree' else 'kdtree'
+        self.size = len(encodings)
+        self.tree = tree_class(np.asarray(encodings, dtype=np.float32), leaf_size=leaf_size) if self.size else None
+
+    def __len__(self):
+        return self.size
+
+    def search(self, queries, k=2):
+        queries = np.atleast_2d(np.asarray(queries, dtype=np.float32))
+        if self.tree is None:
+            return _pad_results(np.empty((len(queries), 0)), np.empty((len(queries), 0), dtype=np.intp), k)
+        distances, indices = self.tree.query(queries, k=min(k, self.size))
+        return _pad_results(distances.astype(np.float32), indices.astype(np.intp), k)
+
+
+class InvertedListIndex:
+    """
+    Approximate search: a k-means coarse quantizer splits the gallery into
+    inverted lists and each query only scans the `n_probe` nearest lists.
+    """
+    name = 'ivf'
+
+    def __init__(self, encodings, n_lists=None, n_probe=8, seed=0):
+        self.gallery = np.ascontiguousarray(encodings, dtype=np.float32)
+        self.gallery_sq_norms = np.einsum('ij,ij->i', self.gallery, self.gallery)
+        size = self.gallery.shape[0]
+        self.n_lists = max(1, min(n_lists or int(np.sqrt(size)), size))
+        self.n_probe = min(n_probe, self.n_lists)
+
+        if size:
+            from sklearn.cluster import KMeans
+
+            kmeans = KMeans(n_clusters=self.n_lists, n_init=1, random_state=seed).fit(self.gallery)
+            self.centroids = BruteForceIndex(kmeans.cluster_centers_)
+            assignments = kmeans.labels_
+        else:
+            self.centroids = None
+            assignments = np.empty(0, dtype=np.intp)
+
+        # Inverted lists in CSR form: members of list i are
+        # list_members[list_offsets[i]:list_offsets[i + 1]].
+        self.list_members = np.argsort(assignments, kind='stable')
+        self.list_offsets = np.searchsorted(assignments[self.list_members], np.arange(self.n_lists + 1))
+
+    def __len__(self):
+        return self.gallery.shape[0]
+
+    def search(self, queries, k=2):
+        queries = np.atleast_2d(np.asarray(queries, dtype=np.float32))
+        distances = np.full((len(queries), k), np.inf, dtype=np.float32)
+        indices = np.full((len(queries), k), -1, dtype=np.intp)
+        if self.centroids is None:
+            return distances, indices
+
+        _, probes = self.centroids.search(queries, self.n_probe)
+        for row, (query, lists) in enumerate(zip(queries, probes)):
+            candidates = np.concatenate([
+                self.list_members[self.list_offsets[i]:self.list_offsets[i + 1]] for i in lists
+            ])
+            sq_distances = (
+                self.gallery_sq_norms[candidates]
+                - 2 * (self.gallery[candidates] @ query)
+                + query @ query
+            )
+            found_distances, found = _smallest_k(np.maximum(sq_distances, 0)[None, :], k)
+            distances[row, :found.shape[1]] = found_distances[0]
+            indices[row, :found.shape[1]] = candidates[found[0]]
+        return distances, indices
+
+
+INDEX_BACKENDS = {
+    'brute': BruteForceIndex,
+    'balltree': lambda encodings, **options: TreeIndex(encodings, algorithm='ball_tree', **options),
+    'kdtree': lambda encodings, **options: TreeIndex(encodings, algorithm='kd_tree', **options),
+    'ivf': InvertedListIndex,
+}
+
+
+def build_index(encodings, backend='brute', scales=None, **options):
+    """
+    Build the named index backend. Quantized galleries are searched as-is by
+    brute force and dequantized to float32 for the other backends.
+    """
+    try:
+        index_class = INDEX_BACKENDS[backend]
+    except KeyError:
+        raise ValueError(f"Unknown face index backend '{backend}'. Choose from: {', '.join(INDEX_BACKENDS)}")
+    if backend == 'brute':
+        return index_class(encodings, scales=scales, **options)
+    return index_class(dequantize(encodings, scales), **options)
+
+
+def evaluate_index(index, reference, queries, k=1):
+    """
+    Compare an index against exact brute-force search on the same queries.
+    Returns recall@k versus the exact top-1 and per-query latency in ms.
+    """
+    queries = np.atleast_2d(np.asarray(queries, dtype=np.float32))
+    _, expected = reference.search(queries, 1)
+
+    latencies = []
+    found = np.empty((len(queries), k), dtype=np.intp)
+    for row, query in enumerate(queries):
+        started = time.perf_counter()
+        _, indices = index.search(query[None, :], k)
+        latencies.append((time.perf_counter() - started) * 1000)
+        found[row] = indices[0]
+
+    hits = (found == expected[:, :1]).any(axis=1)
+    latencies = np.array(latencies)
+    return {
+        'backend': index.name,
+        'queries': len(queries),
+        'recall': float(hits.mean()) if len(queries) else 0.0,
+        'latency_ms_mean': float(latencies.mean()) if len(latencies) else 0.0,
+        'latency_ms_p99': float(np.percentile(latencies, 99)) if len(latencies) else 0.0,
+    }
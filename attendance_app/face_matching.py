@@ -0,0 +1,92 @@
+import numpy as np
+from collections import namedtuple
+
+from .face_index import build_index
+
+FaceMatch = namedtuple('FaceMatch', ['index', 'label', 'distance', 'margin', 'student_id'], defaults=[None])
+
+
+class FaceMatcher:
+    """
+    Scores detected faces against every known encoding in one batched
+    search instead of a Python loop per student. The search itself is
+    delegated to a pluggable index backend (see face_index.INDEX_BACKENDS).
+    When `ids` are given each FaceMatch carries the student id of its row,
+    which stays valid after the gallery is swapped for a newer one.
+    """
+
+    def __init__(self, encodings, labels, backend='brute', scales=None, ids=None, **index_options):
+        if np.ndim(encodings) != 2:
+            raise ValueError('Gallery encodings must be a 2-D array')
+        self.labels = list(labels)
+        if len(self.labels) != len(encodings):
+            raise ValueError('Expected one label per gallery encoding')
+        self.ids = list(ids) if ids is not None else None
+        if self.ids is not None and len(self.ids) != len(self.labels):
+            raise ValueError('Expected one id per gallery encoding')
+        self.index = build_index(encodings, backend, scales=scales, **index_options)
+
+    def __len__(self):
+        return len(self.labels)
+
+    def match(self, faces):
+        """
+        Return a FaceMatch per row of `faces` with the closest gallery entry,
+        its euclidean distance and the margin to the runner-up.
+        """
+        faces = np.atleast_2d(faces)
+        if faces.shape[0] == 0 or len(self) == 0:
+            return []
+
+        distances, indices = self.index.search(faces, k=2)
+        margins = distances[:, 1] - distances[:, 0]
+
+        return [
+            FaceMatch(int(i), self.labels[i], float(d), float(m), self.ids[i] if self.ids is not None else None)
+            for i, d, m in zip(indices[:, 0], distances[:, 0], margins)
+        ]
+
+
+class DeltaMatcher:
+    """
+    A FaceMatcher over a base gallery plus the changes made since: base rows
+    that were removed or replaced are masked out of its results, and added
+    or replaced rows are searched by brute force alongside it. A change then
+    costs a search over the changed rows only, instead of rebuilding (or, for
+    'ivf', refitting) the base index. Indices past the base rows refer to
+    the changed rows, in order.
+    """
+
+    def __init__(self, base, removed=(), encodings=None, labels=(), scales=None, ids=()):
+        self.base = base
+        self.removed = np.array(sorted(removed), dtype=np.intp)
+        self.delta = FaceMatcher(encodings, labels, 'brute', scales=scales, ids=ids) if len(labels) else None
+
+    def __len__(self):
+        return len(self.base) - len(self.removed) + (len(self.delta) if self.delta is not None else 0)
+
+    def match(self, faces):
+        faces = np.atleast_2d(faces)
+        if faces.shape[0] == 0 or len(self) == 0:
+            return []
+
+        # Ask the base for enough neighbours that two survive the mask.
+        distances, indices = self.base.index.search(faces, k=2 + len(self.removed))
+        distances = np.where(np.isin(indices, self.removed) | (indices < 0), np.inf, distances)
+        if self.delta is not None:
+            delta_distances, delta_indices = self.delta.index.search(faces, k=2)
+            distances = np.concatenate([distances, delta_distances], axis=1)
+            indices = np.concatenate([indices, np.where(delta_indices < 0, -1, delta_indices + len(self.base))], axis=1)
+        order = np.argsort(distances, axis=1, kind='stable')[:, :2]
+        distances = np.take_along_axis(distances, order, axis=1)
+        indices = np.take_along_axis(indices, order, axis=1)
+
+        return [
+            self._match(int(i), float(d), float(runner_up - d))
+            for i, d, runner_up in zip(indices[:, 0], distances[:, 0], distances[:, 1])
+        ]
+
+    def _match(self, index, distance, margin):
+        matcher, row = (self.base, index) if index < len(self.base) else (self.delta, index - len(self.base))
+        student_id = matcher.ids[row] if matcher.ids is not None else None
+        return FaceMatch(index, matcher.labels[row], distance, margin, student_id)
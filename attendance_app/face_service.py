@@ -0,0 +1,88 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import cv2
+import numpy as np
+from django.conf import settings
+
+from .face_embedding import encode_faces, load_projection, match_threshold
+from .face_gallery import LiveGallery
+from .face_tracking import detect_faces
+
+_service = None
+_service_lock = threading.Lock()
+
+
+class FaceRecognitionService:
+    """
+    Gallery, projection and thread pool kept resident in the web server
+    process for the recognition API. The gallery follows FaceEncoding
+    changes on its own thread (see LiveGallery), and the projection and
+    threshold are reloaded whenever the gallery's projection changes, e.g.
+    after the first PCA/LDA training. Haar cascades are not thread-safe, so
+    each pool thread keeps its own.
+    """
+
+    def __init__(self, workers=None):
+        self.gallery = LiveGallery()
+        # Load the projection before starting the watcher thread, so a
+        # failure here does not leave a thread behind.
+        self._models = self._load_models(self.gallery.projection)
+        self.gallery.start()
+        self.executor = ThreadPoolExecutor(
+            max_workers=workers or settings.FACE_API_WORKERS, thread_name_prefix='face-api'
+        )
+        self._models_lock = threading.Lock()
+        self._local = threading.local()
+
+    @staticmethod
+    def _load_models(version):
+        projection = load_projection(version)
+        return version, projection, match_threshold(projection)
+
+    def _cascade(self):
+        if not hasattr(self._local, 'face_cascade'):
+            self._local.face_cascade = cv2.CascadeClassifier(
+                cv2.data.haarcascades + 'haarcascade_frontalface_default.xml'
+            )
+        return self._local.face_cascade
+
+    def encode_image(self, data, is_face):
+        """
+        Decode one JPEG and return (boxes, encodings). A face crop is used
+        whole; a frame goes through the face detector. Returns None when the
+        image cannot be decoded.
+        """
+        gray = cv2.imdecode(np.frombuffer(data, dtype=np.uint8), cv2.IMREAD_GRAYSCALE)
+        if gray is None:
+            return None
+        if is_face:
+            faces = np.array([[0, 0, gray.shape[1], gray.shape[0]]])
+        else:
+            faces = detect_faces(self._cascade(), gray)
+        return faces, encode_faces(gray, faces)
+
+    def match(self, encodings):
+        """
+        Return (matches, threshold) for raw face encodings. Raises
+        ValueError when the projection on disk does not match the gallery.
+        """
+        current, matcher = self.gallery.current()
+        version, projection, threshold = self._models
+        if current != version:
+            with self._models_lock:
+                if self._models[0] != current:
+                    self._models = self._load_models(current)
+                version, projection, threshold = self._models
+        if projection is not None and len(encodings):
+            encodings = projection.project(encodings)
+        return matcher.match(encodings), threshold
+
+
+def get_face_service():
+    global _service
+    if _service is None:
+        with _service_lock:
+            if _service is None:
+                _service = FaceRecognitionService()
+    return _service
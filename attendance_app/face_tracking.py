@@ -0,0 +1,131 @@
+import itertools
+
+import cv2
+import numpy as np
+
+
+def detect_faces(face_cascade, gray, scale=1.0):
+    """
+    Run the Haar cascade, optionally on a downscaled copy of the frame, and
+    return boxes in full-resolution coordinates.
+    """
+    if scale >= 1.0:
+        return face_cascade.detectMultiScale(gray, 1.3, 5)
+    small = cv2.resize(gray, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+    faces = face_cascade.detectMultiScale(small, 1.3, 5)
+    if len(faces) == 0:
+        return faces
+    return np.round(np.asarray(faces) / scale).astype(int)
+
+
+def box_iou(a, b):
+    ax, ay, aw, ah = a
+    bx, by, bw, bh = b
+    overlap_w = max(0, min(ax + aw, bx + bw) - max(ax, bx))
+    overlap_h = max(0, min(ay + ah, by + bh) - max(ay, by))
+    overlap = overlap_w * overlap_h
+    union = aw * ah + bw * bh - overlap
+    return overlap / union if union else 0.0
+
+
+class Track:
+    def __init__(self, track_id, box, template, frame_index):
+        self.track_id = track_id
+        self.box = tuple(int(v) for v in box)
+        self.template = template
+        self.match = None
+        self.label = None
+        self.misses = 0
+        self.matched_at = None
+        self.created_at = frame_index
+
+
+class FaceTracker:
+    """
+    Detect-then-track: the Haar cascade runs every `detect_every` frames
+    (optionally on a frame downscaled by `detect_scale`) and faces are
+    followed in between by template matching in a window around their last
+    position. Match results are cached per track, so a seated student is
+    identified once instead of on every frame; unrecognized tracks are
+    retried every `rematch_every` frames.
+    """
+
+    def __init__(self, face_cascade, detect_every=5, detect_scale=1.0, search_margin=0.5,
+                 min_score=0.6, max_misses=2, rematch_every=15):
+        self.face_cascade = face_cascade
+        self.detect_every = max(1, detect_every)
+        self.detect_scale = detect_scale
+        self.search_margin = search_margin
+        self.min_score = min_score
+        self.max_misses = max_misses
+        self.rematch_every = rematch_every
+        self.tracks = []
+        self.frame_index = -1
+        self._ids = itertools.count(1)
+
+    def update(self, gray):
+        """
+        Advance one frame and return the active tracks.
+        """
+        self.frame_index += 1
+        if self.frame_index % self.detect_every == 0:
+            self._associate(gray, detect_faces(self.face_cascade, gray, self.detect_scale))
+        else:
+            for track in self.tracks:
+                self._follow(gray, track)
+        self.tracks = [t for t in self.tracks if t.misses <= self.max_misses]
+        return list(self.tracks)
+
+    def pending(self):
+        """
+        Tracks whose identity still has to be matched.
+        """
+        return [
+            t for t in self.tracks
+            if t.matched_at is None
+            or (t.label is None and self.frame_index - t.matched_at >= self.rematch_every)
+        ]
+
+    def assign(self, track, match, threshold):
+        track.match = match
+        track.label = match.label if match.distance < threshold else None
+        track.matched_at = self.frame_index
+
+    def _crop(self, gray, box):
+        x, y, w, h = box
+        return gray[y:y+h, x:x+w].copy()
+
+    def _associate(self, gray, faces):
+        unmatched = list(self.tracks)
+        for box in faces:
+            best = max(unmatched, key=lambda t: box_iou(t.box, box), default=None)
+            if best is not None and box_iou(best.box, box) >= 0.3:
+                unmatched.remove(best)
+                best.box = tuple(int(v) for v in box)
+                best.template = self._crop(gray, best.box)
+                best.misses = 0
+            else:
+                self.tracks.append(Track(next(self._ids), box, self._crop(gray, box), self.frame_index))
+        for track in unmatched:
+            track.misses += 1
+
+    def _follow(self, gray, track):
+        x, y, w, h = track.box
+        margin_x = int(w * self.search_margin)
+        margin_y = int(h * self.search_margin)
+        left, top = max(0, x - margin_x), max(0, y - margin_y)
+        right = min(gray.shape[1], x + w + margin_x)
+        bottom = min(gray.shape[0], y + h + margin_y)
+        window = gray[top:bottom, left:right]
+
+        template = track.template
+        if window.shape[0] < template.shape[0] or window.shape[1] < template.shape[1] or template.size == 0:
+            track.misses += 1
+            return
+
+        scores = cv2.matchTemplate(window, template, cv2.TM_CCOEFF_NORMED)
+        _, score, _, (dx, dy) = cv2.minMaxLoc(scores)
+        if score < self.min_score:
+            track.misses += 1
+            return
+        track.box = (left + dx, top + dy, w, h)
@@ -0,0 +1,43 @@
+import time
+from datetime import date
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+
+from attendance_app.attendance_bitmap import CohortAttendance, term_for
+
+
+class Command(BaseCommand):
+    help = 'List students below an attendance threshold for a term, with absence streaks'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--term', help='Term key such as 2025-1 (defaults to the current term)')
+        parser.add_argument('--below', type=float, default=75.0, help='Attendance percentage threshold')
+        parser.add_argument('--count-late', action='store_true', help='Count late days as attended')
+        parser.add_argument('--limit', type=int, default=50, help='Students to list')
+
+    def handle(self, *args, **options):
+        term = options['term'] or term_for(date.today())[0]
+        started = time.perf_counter()
+        try:
+            cohort = CohortAttendance.load(term)
+        except (ValueError, IndexError):
+            raise CommandError(f"Unknown term '{term}'")
+        statuses = ('present', 'late') if options['count_late'] else ('present',)
+        student_ids, percentages = cohort.below(options['below'], statuses)
+        longest, current = cohort.streaks('absent')
+        elapsed = (time.perf_counter() - started) * 1000
+
+        self.stdout.write(
+            f"Term {cohort.term} from {cohort.start_date}: {len(cohort)} students, "
+            f"{len(student_ids)} below {options['below']:g}% ({elapsed:.1f} ms)"
+        )
+        position = {student_id: n for n, student_id in enumerate(cohort.student_ids)}
+        shown = [int(student_id) for student_id in student_ids[:options['limit']]]
+        usernames = dict(User.objects.filter(id__in=shown).values_list('id', 'username'))
+        for student_id, percentage in zip(shown, percentages):
+            n = position[student_id]
+            self.stdout.write(
+                f"  {usernames.get(student_id, student_id):<20} {percentage:>6.1f}%  "
+                f"longest absence {longest[n]:>3} days  current {current[n]:>3}"
+            )
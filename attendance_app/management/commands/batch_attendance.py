@@ -0,0 +1,60 @@
+from datetime import date
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+
+from attendance_app.attendance_writer import AttendanceWriter
+from attendance_app.batch_recognition import recognize_recording
+from attendance_app.face_embedding import match_threshold, projection_for_gallery
+from attendance_app.face_gallery import get_gallery_dir, load_gallery
+
+
+class Command(BaseCommand):
+    help = 'Mark attendance from a recorded lecture video or a directory of frames using a process pool'
+
+    def add_arguments(self, parser):
+        parser.add_argument('source', help='Video file or directory of frame images')
+        parser.add_argument('--workers', type=int, help='Worker processes (defaults to the CPU count)')
+        parser.add_argument('--chunks', type=int, help='Frame ranges to split the recording into (defaults to 4 per worker)')
+        parser.add_argument('--stride', type=int, default=1, help='Process every Nth frame')
+        parser.add_argument('--detect-scale', type=float, default=1.0, help='Downscale factor for face detection')
+        parser.add_argument('--date', type=date.fromisoformat, help='Attendance date (YYYY-MM-DD), defaults to today')
+        parser.add_argument('--dry-run', action='store_true', help='Report recognitions without writing attendance')
+
+    def handle(self, *args, **options):
+        if not Path(options['source']).exists():
+            raise CommandError(f"{options['source']} does not exist")
+
+        gallery = load_gallery()
+        if len(gallery) == 0:
+            raise CommandError('No face encodings found. Run train_faces.py first.')
+        threshold = match_threshold(projection_for_gallery(gallery))
+
+        try:
+            recognized, report = recognize_recording(
+                options['source'], get_gallery_dir(), threshold,
+                workers=options['workers'], chunks=options['chunks'],
+                stride=max(1, options['stride']), detect_scale=options['detect_scale'],
+            )
+        except ValueError as e:
+            raise CommandError(str(e))
+
+        for student_id, (username, distance, first_frame) in sorted(recognized.items(), key=lambda item: item[1][2]):
+            self.stdout.write(f'{username:<20} first seen at frame {first_frame:>7}  best distance {distance:.1f}')
+
+        self.stdout.write(
+            f"Processed {report['frames_processed']} of {report['frames']} frames in {report['chunks']} chunks "
+            f"on {report['workers']} workers: {report['seconds']}s, {report['fps']:.1f} fps "
+            f"({report['worker_fps']:.1f} fps per worker)"
+        )
+
+        if options['dry_run'] or not recognized:
+            return
+
+        writer = AttendanceWriter(attendance_date=options['date'], source=Path(options['source']).name)
+        for student_id, (username, _, _) in recognized.items():
+            writer.add(student_id, username)
+        created = writer.flush()
+        self.stdout.write(self.style.SUCCESS(
+            f'Attendance marked for {len(created)} students ({len(recognized) - len(created)} already marked)'
+        ))
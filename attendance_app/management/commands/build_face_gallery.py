@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand
+
+from attendance_app.face_gallery import build_gallery, get_gallery_dir, is_current
+
+
+class Command(BaseCommand):
+    help = 'Precompile FaceEncoding rows into a memory-mappable face gallery'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--gallery-dir', help='Output directory (defaults to settings.FACE_GALLERY_DIR)')
+        parser.add_argument('--force', action='store_true', help='Rebuild even if the stamp is unchanged')
+
+    def handle(self, *args, **options):
+        gallery_dir = get_gallery_dir(options['gallery_dir'])
+
+        if not options['force'] and is_current(gallery_dir):
+            self.stdout.write(f'Face gallery in {gallery_dir} is up to date')
+            return
+
+        stamp = build_gallery(gallery_dir)
+        self.stdout.write(self.style.SUCCESS(
+            f"Built face gallery with {stamp['count']} encodings in {gallery_dir}"
+        ))
@@ -0,0 +1,29 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from attendance_app.rollup import check_rollup, refresh_rollup
+
+
+class Command(BaseCommand):
+    help = 'Compare the monthly attendance rollup with Attendance and optionally repair it'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--fix', action='store_true', help='Recompute the student-months that differ')
+        parser.add_argument('--limit', type=int, default=20, help='Mismatches to list')
+
+    def handle(self, *args, **options):
+        mismatches = check_rollup()
+        if not mismatches:
+            self.stdout.write(self.style.SUCCESS('Attendance rollup is consistent'))
+            return
+
+        for student_id, month, expected, stored in mismatches[:options['limit']]:
+            self.stdout.write(f'student {student_id} {month:%Y-%m}: expected {expected}, stored {stored}')
+        if len(mismatches) > options['limit']:
+            self.stdout.write(f'... and {len(mismatches) - options["limit"]} more')
+
+        if not options['fix']:
+            raise CommandError(f'{len(mismatches)} student-months are out of date; run with --fix or rebuild_attendance_rollup')
+        with transaction.atomic():
+            refresh_rollup((student_id, month) for student_id, month, _, _ in mismatches)
+        self.stdout.write(self.style.SUCCESS(f'Repaired {len(mismatches)} student-months'))
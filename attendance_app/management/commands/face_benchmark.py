@@ -0,0 +1,80 @@
+import json
+from datetime import datetime
+
+from django.core.management.base import BaseCommand, CommandError
+
+from attendance_app.face_benchmark import (
+    RAW_DIMS, environment, synthetic_gallery, synthetic_projection, time_enrollment, time_recognition,
+)
+from attendance_app.face_codec import STORAGE_DTYPES
+from attendance_app.face_index import INDEX_BACKENDS
+
+
+class Command(BaseCommand):
+    help = 'Benchmark face recognition and enrollment stages on synthetic galleries and write a JSON report'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--students', type=int, nargs='+', default=[100, 1000, 10000, 50000],
+                            help='Gallery sizes to benchmark')
+        parser.add_argument('--dims', type=int, default=128,
+                            help=f'Encoding size; {RAW_DIMS} benchmarks raw pixels without a projection')
+        parser.add_argument('--storage', choices=list(STORAGE_DTYPES), default='float32')
+        parser.add_argument('--backend', choices=list(INDEX_BACKENDS), default='brute')
+        parser.add_argument('--frames', type=int, default=100, help='Synthetic frames per gallery size')
+        parser.add_argument('--faces-per-frame', type=int, default=4)
+        parser.add_argument('--write-batch', type=int, default=20,
+                            help='Attendance rows bulk-created (and rolled back) per frame; 0 skips the DB stage')
+        parser.add_argument('--enroll-images', type=int, default=200,
+                            help='Synthetic images for the enrollment benchmark; 0 skips it')
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--output', help='Write the JSON report to this file')
+
+    def handle(self, *args, **options):
+        if options['dims'] > RAW_DIMS:
+            raise CommandError(f'--dims cannot exceed {RAW_DIMS}')
+        projection = None
+        if options['dims'] < RAW_DIMS:
+            projection = synthetic_projection(options['dims'], seed=options['seed'])
+
+        report = {
+            'created_at': datetime.now().isoformat(timespec='seconds'),
+            'environment': environment(),
+            'options': {key: options[key] for key in (
+                'dims', 'storage', 'backend', 'frames', 'faces_per_frame', 'write_batch', 'seed',
+            )},
+            'recognition': [],
+        }
+
+        self.stdout.write(
+            f"{'students':>9} {'fps':>7} {'p50 ms':>8} {'p99 ms':>8} {'match p50':>10} "
+            f"{'detect p50':>11} {'db p50':>8} {'gallery MB':>11} {'top1':>6}"
+        )
+        for n_students in options['students']:
+            gallery, vectors = synthetic_gallery(n_students, options['dims'], options['storage'], seed=options['seed'])
+            result = time_recognition(
+                gallery, vectors, projection=projection,
+                frames=options['frames'], faces_per_frame=options['faces_per_frame'],
+                backend=options['backend'], write_batch=options['write_batch'], seed=options['seed'],
+            )
+            report['recognition'].append(result)
+            stages = result['stages_ms']
+            self.stdout.write(
+                f"{n_students:>9} {result['fps']:>7.1f} {result['frame_ms']['p50']:>8.2f} "
+                f"{result['frame_ms']['p99']:>8.2f} {stages['match']['p50']:>10.3f} "
+                f"{stages['detectMultiScale']['p50']:>11.2f} "
+                f"{stages.get('db_write', {}).get('p50', 0.0):>8.2f} "
+                f"{result['gallery_bytes'] / 2 ** 20:>11.1f} {result['top1_accuracy']:>6.3f}"
+            )
+
+        if options['enroll_images']:
+            enrollment = time_enrollment(options['enroll_images'], options['storage'], seed=options['seed'])
+            report['enrollment'] = enrollment
+            self.stdout.write(
+                f"Enrollment: {enrollment['images_per_second']:.1f} images/s per process, "
+                f"gallery build from {enrollment['images']} blobs in {enrollment['gallery_build_seconds']:.3f}s"
+            )
+
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                json.dump(report, f, indent=2)
+            self.stdout.write(self.style.SUCCESS(f"Report written to {options['output']}"))
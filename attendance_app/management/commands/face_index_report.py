@@ -0,0 +1,49 @@
+import time
+
+import numpy as np
+from django.core.management.base import BaseCommand, CommandError
+
+from attendance_app.face_codec import dequantize
+from attendance_app.face_gallery import load_gallery
+from attendance_app.face_index import INDEX_BACKENDS, BruteForceIndex, build_index, evaluate_index
+
+
+class Command(BaseCommand):
+    help = 'Report recall against brute force and query latency for each face index backend'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--backends', nargs='+', default=list(INDEX_BACKENDS), choices=list(INDEX_BACKENDS))
+        parser.add_argument('--queries', type=int, default=200, help='Number of probe queries')
+        parser.add_argument('--noise', type=float, default=10.0, help='Std-dev of noise added to gallery rows to form probes')
+        parser.add_argument('--n-lists', type=int, help='Inverted lists for the ivf backend')
+        parser.add_argument('--n-probe', type=int, default=8, help='Lists scanned per query by the ivf backend')
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        gallery = load_gallery()
+        if len(gallery) == 0:
+            raise CommandError('No face encodings found. Run train_faces.py first.')
+
+        encodings = dequantize(gallery.encodings, gallery.scales)
+        rng = np.random.default_rng(options['seed'])
+        rows = rng.integers(0, len(encodings), options['queries'])
+        queries = encodings[rows] + rng.normal(0, options['noise'], (len(rows), encodings.shape[1])).astype(np.float32)
+
+        reference = BruteForceIndex(encodings)
+        self.stdout.write(f'Gallery: {encodings.shape[0]} encodings x {encodings.shape[1]} dims, {len(rows)} queries')
+        self.stdout.write(f"{'backend':<10} {'build s':>8} {'recall':>7} {'mean ms':>8} {'p99 ms':>8}")
+
+        for backend in options['backends']:
+            index_options = {}
+            if backend == 'ivf':
+                index_options = {'n_lists': options['n_lists'], 'n_probe': options['n_probe']}
+
+            started = time.perf_counter()
+            index = build_index(encodings, backend, **index_options)
+            build_seconds = time.perf_counter() - started
+
+            report = evaluate_index(index, reference, queries)
+            self.stdout.write(
+                f"{backend:<10} {build_seconds:>8.2f} {report['recall']:>7.3f} "
+                f"{report['latency_ms_mean']:>8.2f} {report['latency_ms_p99']:>8.2f}"
+            )
@@ -0,0 +1,93 @@
+from pathlib import Path
+
+import cv2
+import numpy as np
+from django.core.management.base import BaseCommand, CommandError
+
+from attendance_app.face_codec import STORAGE_DTYPES, dequantize, quantize
+from attendance_app.face_embedding import collect_student_images, encode_faces, projection_for_gallery
+from attendance_app.face_gallery import load_gallery
+from attendance_app.face_index import BruteForceIndex
+
+
+class Command(BaseCommand):
+    help = 'Measure the accuracy delta of float16/int8 face encodings against float32 on a held-out set'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--holdout-dir', default='student_images_holdout',
+                            help='Held-out images laid out like student_images/ (username.jpg or username/*.jpg)')
+        parser.add_argument('--synthetic', type=int, metavar='N',
+                            help='Instead of images, probe with N noisy copies of gallery encodings')
+        parser.add_argument('--noise', type=float, default=10.0, help='Std-dev of noise for --synthetic probes')
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        gallery = load_gallery()
+        if len(gallery) == 0:
+            raise CommandError('No face encodings found. Run train_faces.py first.')
+
+        reference = dequantize(gallery.encodings, gallery.scales)
+        if options['synthetic']:
+            probes, expected = self._synthetic_probes(reference, options)
+        else:
+            probes, expected = self._holdout_probes(gallery, Path(options['holdout_dir']))
+        if len(probes) == 0:
+            raise CommandError('No held-out faces matched an enrolled student.')
+
+        self.stdout.write(f'Gallery: {reference.shape[0]} encodings x {reference.shape[1]} dims, {len(probes)} held-out probes')
+        self.stdout.write(f"{'storage':<8} {'MB':>8} {'top-1 acc':>10} {'delta':>8} {'agree':>7} {'mean |dd|':>10}")
+
+        baseline_indices = None
+        baseline_distances = None
+        baseline_accuracy = None
+        for storage in STORAGE_DTYPES:
+            codes, scales = quantize(reference, storage)
+            distances, indices = BruteForceIndex(codes, scales=scales).search(probes, 1)
+            accuracy = float((indices[:, 0] == expected).mean())
+            if baseline_indices is None:
+                baseline_indices, baseline_distances, baseline_accuracy = indices[:, 0], distances[:, 0], accuracy
+
+            megabytes = (codes.nbytes + (scales.nbytes if storage == 'int8' else 0)) / 2**20
+            agreement = float((indices[:, 0] == baseline_indices).mean())
+            distance_error = float(np.abs(distances[:, 0] - baseline_distances).mean())
+            self.stdout.write(
+                f'{storage:<8} {megabytes:>8.2f} {accuracy:>10.4f} {accuracy - baseline_accuracy:>+8.4f} '
+                f'{agreement:>7.4f} {distance_error:>10.3f}'
+            )
+
+    def _synthetic_probes(self, reference, options):
+        rng = np.random.default_rng(options['seed'])
+        expected = rng.integers(0, len(reference), options['synthetic'])
+        noise = rng.normal(0, options['noise'], (len(expected), reference.shape[1])).astype(np.float32)
+        return reference[expected] + noise, expected
+
+    def _holdout_probes(self, gallery, holdout_dir):
+        if not holdout_dir.exists():
+            raise CommandError(f'{holdout_dir} does not exist. Pass --holdout-dir or --synthetic N.')
+
+        projection = projection_for_gallery(gallery)
+        face_cascade = cv2.CascadeClassifier(cv2.data.haarcascades + 'haarcascade_frontalface_default.xml')
+        rows = {username: row for row, username in enumerate(gallery.usernames)}
+
+        probes = []
+        expected = []
+        for username, image_files in collect_student_images(holdout_dir).items():
+            if username not in rows:
+                continue
+            for image_file in image_files:
+                img = cv2.imread(str(image_file))
+                if img is None:
+                    continue
+                gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
+                faces = face_cascade.detectMultiScale(gray, 1.3, 5)
+                if len(faces) == 0:
+                    continue
+                probes.append(encode_faces(gray, faces[:1])[0])
+                expected.append(rows[username])
+
+        if not probes:
+            return np.empty((0, 0), dtype=np.float32), np.empty(0, dtype=np.intp)
+        probes = np.stack(probes)
+        if projection is not None:
+            probes = projection.project(probes)
+        return probes, np.array(expected)
@@ -0,0 +1,66 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from attendance_app.offline_queue import OfflineQueue, QueueFlusher
+
+
+class Command(BaseCommand):
+    help = "Send a capture device's offline attendance queue to the server"
+
+    def add_arguments(self, parser):
+        parser.add_argument('queue', help='SQLite file of the offline queue')
+        parser.add_argument('--server', required=True, help='URL of attendance/api/sync/ on the server')
+        parser.add_argument('--device', default='', help='Name recorded on the server for this device')
+        parser.add_argument('--token', default='', help="Device token for --server (one of its ATTENDANCE_DEVICE_TOKENS)")
+        parser.add_argument('--batch-size', type=int, default=200, help='Events sent per request')
+        parser.add_argument('--interval', type=float, default=1.0, help='Seconds between drains when watching')
+        parser.add_argument('--once', action='store_true', help='Drain the queue once and exit instead of watching it')
+        parser.add_argument('--unpark', action='store_true',
+                            help='Queue events the server refused earlier again, e.g. after adding --token')
+
+    def handle(self, *args, **options):
+        queue = OfflineQueue(options['queue'])
+        if options['unpark']:
+            self.stdout.write(f'Queued {queue.unpark()} parked events again')
+        flusher = QueueFlusher(
+            queue, options['server'],
+            device=options['device'],
+            token=options['token'],
+            batch_size=options['batch_size'],
+            interval=options['interval'],
+        )
+        if options['once']:
+            started = time.perf_counter()
+            try:
+                sent = flusher.drain()
+            except (OSError, ValueError) as e:
+                raise CommandError(f"Could not reach {options['server']}: {e}; {len(queue)} events left queued")
+            finally:
+                queue.close()
+            elapsed = time.perf_counter() - started
+            self.stdout.write(self.style.SUCCESS(f'Sent {sent} events in {elapsed:.2f}s'))
+            self._report_parked(flusher)
+            return
+
+        self.stdout.write(f"Sending {len(queue)} queued events and watching {options['queue']}. Press Ctrl+C to stop.")
+        flusher.start()
+        try:
+            # The flusher stops by itself when the server refuses the
+            # requests outright (e.g. a bad token).
+            while flusher.running():
+                time.sleep(1)
+        except KeyboardInterrupt:
+            pass
+        finally:
+            flusher.close()
+            self.stdout.write(self.style.SUCCESS(f'Sent {flusher.sent} events; {len(queue)} left queued'))
+            self._report_parked(flusher)
+            queue.close()
+
+    def _report_parked(self, flusher):
+        if flusher.parked:
+            self.stdout.write(self.style.WARNING(
+                f'The server refused {flusher.parked} events for other days or statuses without a device token; '
+                f'they are parked. Re-run with --token and --unpark to send them.'
+            ))
@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from attendance_app.attendance_bitmap import rebuild_bitmaps
+
+
+class Command(BaseCommand):
+    help = 'Recompute the per-student term attendance bitmaps from Attendance'
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            written = rebuild_bitmaps()
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt attendance bitmaps: {written} student-terms'))
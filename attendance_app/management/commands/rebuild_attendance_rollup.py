@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from attendance_app.rollup import rebuild_rollup
+
+
+class Command(BaseCommand):
+    help = 'Recompute the per-student monthly attendance rollup from Attendance'
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            written = rebuild_rollup()
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt attendance rollup: {written} student-months'))
@@ -0,0 +1,114 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import OperationalError
+
+from attendance_app.attendance_writer import AttendanceWriter
+from attendance_app.face_embedding import match_threshold, projection_for_gallery
+from attendance_app.face_gallery import LiveGallery
+from attendance_app.offline_queue import OfflineQueue, QueuedAttendanceWriter
+from attendance_app.recognizer_service import RecognizerService
+
+
+def parse_source(value):
+    """
+    'room101=rtsp://...' names a source; a bare camera index, file or URL is
+    named after itself.
+    """
+    name, sep, source = value.partition('=')
+    if not sep:
+        name, source = value, value
+    return name, int(source) if source.isdigit() else source
+
+
+class Command(BaseCommand):
+    help = 'Recognize faces from several cameras or video files with one shared gallery and worker pool'
+
+    def add_arguments(self, parser):
+        parser.add_argument('sources', nargs='+', help='Sources as name=source or a camera index, video file or URL')
+        parser.add_argument('--workers', type=int, help='Recognizer processes (defaults to the CPU count)')
+        parser.add_argument('--queue-size', type=int, default=16, help='Frames buffered between cameras and workers')
+        parser.add_argument('--detect-scale', type=float, default=1.0, help='Downscale factor for face detection')
+        parser.add_argument('--duration', type=float, help='Stop after this many seconds')
+        parser.add_argument('--flush-interval', type=float, default=3.0, help='Seconds between attendance writes')
+        parser.add_argument('--offline-queue', help='Queue attendance in this local SQLite file and send it to --server '
+                                                    'instead of writing to the database')
+        parser.add_argument('--server', help='URL of attendance/api/sync/ on the server, with --offline-queue')
+        parser.add_argument('--device', default='', help='Name recorded on the server for this device, with --offline-queue')
+        parser.add_argument('--token', default='', help='Device token for --server (one of its ATTENDANCE_DEVICE_TOKENS)')
+
+    def handle(self, *args, **options):
+        sources = dict(parse_source(value) for value in options['sources'])
+        if len(sources) != len(options['sources']):
+            raise CommandError('Source names must be unique')
+        if bool(options['offline_queue']) != bool(options['server']):
+            raise CommandError('--offline-queue and --server must be given together')
+
+        # New enrollments are picked up while running; the workers switch to
+        # the updated gallery without a restart.
+        try:
+            gallery = LiveGallery(backend=settings.FACE_INDEX_BACKEND, **settings.FACE_INDEX_OPTIONS)
+        except OperationalError as e:
+            if not options['offline_queue']:
+                raise
+            # Capture devices must start without the database; use the
+            # gallery on disk and pick up changes once it is reachable.
+            self.stdout.write(f'Database unavailable ({e}); using the face gallery on disk')
+            try:
+                gallery = LiveGallery(backend=settings.FACE_INDEX_BACKEND, rebuild=False, **settings.FACE_INDEX_OPTIONS)
+            except (OSError, ValueError) as e:
+                raise CommandError(f'No usable face gallery on disk: {e}')
+        if len(gallery) == 0:
+            raise CommandError('No face encodings found. Run train_faces.py first.')
+        projection = projection_for_gallery(gallery.gallery)
+
+        def print_marked(usernames):
+            for username in usernames:
+                self.stdout.write(f'Attendance marked for {username}')
+
+        queue = None
+        if options['offline_queue']:
+            queue = OfflineQueue(options['offline_queue'])
+            writer = QueuedAttendanceWriter(
+                queue, options['server'], device=options['device'], token=options['token'],
+                on_created=print_marked, interval=options['flush_interval'],
+            ).start()
+        else:
+            writer = AttendanceWriter(flush_interval=options['flush_interval'], on_created=print_marked).start()
+        service = RecognizerService(
+            sources, gallery, writer,
+            projection=projection,
+            threshold=match_threshold(projection),
+            workers=options['workers'],
+            queue_size=options['queue_size'],
+            detect_scale=options['detect_scale'],
+            backend=settings.FACE_INDEX_BACKEND,
+            index_options=settings.FACE_INDEX_OPTIONS,
+        )
+        self.stdout.write(f'Recognizing {len(gallery)} known faces from {len(sources)} sources. Press Ctrl+C to stop.')
+        try:
+            stats = service.run(duration=options['duration'])
+        except KeyboardInterrupt:
+            stats = service.stats
+        finally:
+            writer.close()
+            if queue is not None:
+                if len(queue):
+                    self.stdout.write(f"{len(queue)} events left in {options['offline_queue']}; "
+                                      f"send them later with flush_attendance_queue")
+                if queue.parked():
+                    self.stdout.write(f"{queue.parked()} events were refused without a device token and are parked; "
+                                      f"send them with flush_attendance_queue --token ... --unpark")
+                queue.close()
+
+        for name, counts in stats.items():
+            self.stdout.write(
+                f"  {name:<20} {counts['frames']:>7} frames {counts['dropped']:>6} dropped "
+                f"{counts['recognized']:>5} recognized"
+            )
+        if service.summary:
+            summary = service.summary
+            self.stdout.write(
+                f"Processed {summary['frames_processed']} frames in {summary['seconds']}s: "
+                f"{summary['fps']:.1f} fps ({summary['worker_fps']:.1f} fps per worker)"
+            )
+        self.stdout.write(self.style.SUCCESS(f'Attendance marked for {len(writer.created)} students'))
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 11:41
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('attendance_app', '0002_alter_attendance_options_attendance_marked_by_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='faceencoding',
+            name='projection',
+            field=models.CharField(blank=True, help_text='Version of the PCA/LDA projection the encoding was made with; blank for raw pixels', max_length=64),
+        ),
+    ]
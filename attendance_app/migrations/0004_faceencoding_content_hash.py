@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 11:51
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('attendance_app', '0003_faceencoding_projection'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='faceencoding',
+            name='content_hash',
+            field=models.CharField(blank=True, help_text='SHA-256 of the enrollment images the encoding was computed from', max_length=64),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 11:53
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('attendance_app', '0004_faceencoding_content_hash'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='attendance',
+            name='source',
+            field=models.CharField(blank=True, help_text='Camera or recording the attendance was recognized from', max_length=100),
+        ),
+    ]
@@ -0,0 +1,60 @@
+# Generated by Django 5.2.18 on 2026-10-18 11:59
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, Q
+from django.db.models.functions import TruncMonth
+
+
+def fill_rollup(apps, schema_editor):
+    # Count the attendance recorded before the rollup existed, one row per
+    # student and month (see attendance_app.rollup).
+    Attendance = apps.get_model('attendance_app', 'Attendance')
+    AttendanceMonthly = apps.get_model('attendance_app', 'AttendanceMonthly')
+    statuses = ('present', 'absent', 'late', 'excused')
+    rows = (
+        Attendance.objects.annotate(month=TruncMonth('date'))
+        .values('student_id', 'month')
+        .annotate(total=Count('id'), **{status: Count('id', filter=Q(status=status)) for status in statuses})
+        .order_by()
+    )
+    AttendanceMonthly.objects.bulk_create(
+        [
+            AttendanceMonthly(
+                student_id=row['student_id'], month=row['month'],
+                total=row['total'], **{status: row[status] for status in statuses},
+            )
+            for row in rows
+        ],
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('attendance_app', '0005_attendance_source'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AttendanceMonthly',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('month', models.DateField(help_text='First day of the month')),
+                ('present', models.PositiveIntegerField(default=0)),
+                ('absent', models.PositiveIntegerField(default=0)),
+                ('late', models.PositiveIntegerField(default=0)),
+                ('excused', models.PositiveIntegerField(default=0)),
+                ('total', models.PositiveIntegerField(default=0)),
+                ('student', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='attendance_months', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'ordering': ['-month'],
+                'unique_together': {('student', 'month')},
+            },
+        ),
+        migrations.RunPython(fill_rollup, migrations.RunPython.noop),
+    ]
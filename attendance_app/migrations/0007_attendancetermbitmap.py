@@ -0,0 +1,67 @@
+# Generated by Django 5.2.18 on 2026-10-18 12:02
+
+import django.db.models.deletion
+import numpy as np
+from django.conf import settings
+from django.db import migrations, models
+
+from attendance_app.attendance_bitmap import BITMAP_STATUSES, term_for
+
+
+def fill_bitmaps(apps, schema_editor):
+    # Pack the attendance recorded before the bitmaps existed, one row per
+    # student and term (see attendance_app.attendance_bitmap).
+    Attendance = apps.get_model('attendance_app', 'Attendance')
+    AttendanceTermBitmap = apps.get_model('attendance_app', 'AttendanceTermBitmap')
+    bitmaps = {}
+    rows = Attendance.objects.filter(status__in=BITMAP_STATUSES).values_list('student_id', 'date', 'status')
+    for student_id, day, status in rows.iterator():
+        term, start, end = term_for(day)
+        if (student_id, term) not in bitmaps:
+            bitmaps[(student_id, term)] = start, np.zeros((len(BITMAP_STATUSES), (end - start).days), dtype=bool)
+        bits = bitmaps[(student_id, term)][1]
+        bits[BITMAP_STATUSES.index(status), (day - start).days] = True
+
+    AttendanceTermBitmap.objects.bulk_create(
+        [
+            AttendanceTermBitmap(
+                student_id=student_id, term=term, start_date=start, days=bits.shape[1],
+                **{
+                    status: np.packbits(bits[n], bitorder='little').tobytes()
+                    for n, status in enumerate(BITMAP_STATUSES)
+                },
+            )
+            for (student_id, term), (start, bits) in bitmaps.items()
+        ],
+        batch_size=500,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('attendance_app', '0006_attendancemonthly'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AttendanceTermBitmap',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('term', models.CharField(help_text='Term key such as 2025-1, see ATTENDANCE_TERM_START_MONTHS', max_length=20)),
+                ('start_date', models.DateField()),
+                ('days', models.PositiveSmallIntegerField()),
+                ('present', models.BinaryField()),
+                ('absent', models.BinaryField()),
+                ('late', models.BinaryField()),
+                ('excused', models.BinaryField()),
+                ('student', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='attendance_bitmaps', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['term'], name='attendance__term_6e19c8_idx')],
+                'unique_together': {('student', 'term')},
+            },
+        ),
+        migrations.RunPython(fill_bitmaps, migrations.RunPython.noop),
+    ]
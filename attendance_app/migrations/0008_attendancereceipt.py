@@ -0,0 +1,29 @@
+# Generated by Django 5.2.18 on 2026-10-18 12:05
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('attendance_app', '0007_attendancetermbitmap'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AttendanceReceipt',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('key', models.CharField(max_length=64, unique=True)),
+                ('device', models.CharField(blank=True, max_length=100)),
+                ('date', models.DateField(blank=True, null=True)),
+                ('result', models.CharField(choices=[('created', 'Created'), ('already', 'Already marked'), ('unknown', 'Unknown student')], max_length=10)),
+                ('captured_at', models.DateTimeField(blank=True, help_text='When the device captured the event', null=True)),
+                ('received_at', models.DateTimeField(auto_now_add=True)),
+                ('student', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='attendance_receipts', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+    ]
@@ -4,6 +4,8 @@ from django.contrib.auth.models import User
 class FaceEncoding(models.Model):
     student = models.OneToOneField(User, on_delete=models.CASCADE, related_name='face_encoding', limit_choices_to={'profile__role': 'student'})
     encoding = models.BinaryField()
+    projection = models.CharField(max_length=64, blank=True, help_text="Version of the PCA/LDA projection the encoding was made with; blank for raw pixels")
+    content_hash = models.CharField(max_length=64, blank=True, help_text="SHA-256 of the enrollment images the encoding was computed from")
     image = models.ImageField(upload_to='face_images/', blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
@@ -25,10 +27,82 @@ class Attendance(models.Model):
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='present')
     marked_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name='marked_attendance')
     notes = models.TextField(blank=True)
+    source = models.CharField(max_length=100, blank=True, help_text="Camera or recording the attendance was recognized from")
     
     class Meta:
         unique_together = ['student', 'date']
         ordering = ['-date']
+        indexes = [
+            # Seek index for keyset pagination and date-range exports,
+            # which order by (date, id) in either direction.
+            models.Index(fields=['date', 'id']),
+        ]
     
     def __str__(self):
         return f"{self.student.username} - {self.date} - {self.status}"
+
+class AttendanceMonthly(models.Model):
+    """
+    Per-student, per-month attendance counts maintained from Attendance by
+    attendance_app.rollup, so percentages are summed over months instead of
+    counted over days.
+    """
+    student = models.ForeignKey(User, on_delete=models.CASCADE, related_name='attendance_months')
+    month = models.DateField(help_text="First day of the month")
+    present = models.PositiveIntegerField(default=0)
+    absent = models.PositiveIntegerField(default=0)
+    late = models.PositiveIntegerField(default=0)
+    excused = models.PositiveIntegerField(default=0)
+    total = models.PositiveIntegerField(default=0)
+    
+    class Meta:
+        unique_together = ['student', 'month']
+        ordering = ['-month']
+    
+    def __str__(self):
+        return f"{self.student.username} - {self.month:%Y-%m} - {self.present}/{self.total}"
+
+class AttendanceTermBitmap(models.Model):
+    """
+    One bit per day of an academic term for each status, maintained from
+    Attendance by attendance_app.attendance_bitmap for cohort-wide queries.
+    Bit i of each field is day start_date + i.
+    """
+    student = models.ForeignKey(User, on_delete=models.CASCADE, related_name='attendance_bitmaps')
+    term = models.CharField(max_length=20, help_text="Term key such as 2025-1, see ATTENDANCE_TERM_START_MONTHS")
+    start_date = models.DateField()
+    days = models.PositiveSmallIntegerField()
+    present = models.BinaryField()
+    absent = models.BinaryField()
+    late = models.BinaryField()
+    excused = models.BinaryField()
+    
+    class Meta:
+        unique_together = ['student', 'term']
+        indexes = [models.Index(fields=['term'])]
+    
+    def __str__(self):
+        return f"{self.student.username} - {self.term}"
+
+class AttendanceReceipt(models.Model):
+    """
+    Idempotency record for an attendance event sent by an offline capture
+    device (see attendance_app.offline_queue). A re-sent event with the
+    same key gets the stored result back instead of being applied again.
+    """
+    RESULT_CHOICES = (
+        ('created', 'Created'),
+        ('already', 'Already marked'),
+        ('unknown', 'Unknown student'),
+    )
+    
+    key = models.CharField(max_length=64, unique=True)
+    device = models.CharField(max_length=100, blank=True)
+    student = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name='attendance_receipts')
+    date = models.DateField(null=True, blank=True)
+    result = models.CharField(max_length=10, choices=RESULT_CHOICES)
+    captured_at = models.DateTimeField(null=True, blank=True, help_text="When the device captured the event")
+    received_at = models.DateTimeField(auto_now_add=True)
+    
+    def __str__(self):
+        return f"{self.key} - {self.result}"
@@ -0,0 +1,291 @@
+import json
+import sqlite3
+import threading
+import urllib.error
+import urllib.request
+import uuid
+from datetime import date, datetime, timezone
+
+
+class OfflineQueue:
+    """
+    Durable attendance events on a capture device, kept in a local SQLite
+    file so marks survive the server being locked or unreachable and the
+    device restarting. Appends are a single local insert (WAL journal,
+    synchronous=NORMAL), so capture never waits on the network. Every event
+    gets an idempotency key when it is appended; the key stays with the
+    event until the server has acknowledged it. Events the server refuses
+    (e.g. an earlier day sent without a device token) are parked in a
+    separate table so they do not hold up the rest of the queue; unpark()
+    puts them back once the device can send them.
+    """
+
+    def __init__(self, path, timeout=30.0):
+        self.path = str(path)
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(self.path, timeout=timeout, check_same_thread=False, isolation_level=None)
+        self._db.execute('PRAGMA journal_mode=WAL')
+        self._db.execute('PRAGMA synchronous=NORMAL')
+        for table in ('events', 'parked'):
+            self._db.execute(
+                f'CREATE TABLE IF NOT EXISTS {table} ('
+                'id INTEGER PRIMARY KEY AUTOINCREMENT, '
+                'key TEXT NOT NULL UNIQUE, '
+                'event TEXT NOT NULL)'
+            )
+
+    def append(self, **event):
+        """
+        Queue one event (username or roll_number, and optionally date,
+        status and source) and return its key.
+        """
+        return self.extend([event])[0]
+
+    def extend(self, events):
+        rows = []
+        captured_at = datetime.now(timezone.utc).isoformat()
+        for event in events:
+            event = {'captured_at': captured_at, **event}
+            event.setdefault('key', uuid.uuid4().hex)
+            if isinstance(event.get('date'), date):
+                event['date'] = event['date'].isoformat()
+            rows.append((event['key'], json.dumps(event)))
+        with self._lock:
+            self._db.executemany('INSERT OR IGNORE INTO events (key, event) VALUES (?, ?)', rows)
+        return [key for key, _ in rows]
+
+    def peek(self, limit=200):
+        """
+        The oldest `limit` events, without removing them.
+        """
+        with self._lock:
+            rows = self._db.execute('SELECT event FROM events ORDER BY id LIMIT ?', (limit,)).fetchall()
+        return [json.loads(event) for event, in rows]
+
+    def ack(self, keys):
+        """
+        Remove events the server has answered.
+        """
+        self._move(keys, park=False)
+
+    def park(self, keys):
+        """
+        Set aside events the server refused, keeping them for unpark().
+        """
+        self._move(keys, park=True)
+
+    def _move(self, keys, park):
+        keys = list(keys)
+        with self._lock:
+            self._db.execute('BEGIN')
+            # Stay under SQLite's bound-parameter limit.
+            for start in range(0, len(keys), 500):
+                chunk = keys[start:start + 500]
+                placeholders = ', '.join('?' * len(chunk))
+                if park:
+                    self._db.execute(
+                        f'INSERT OR IGNORE INTO parked (key, event) '
+                        f'SELECT key, event FROM events WHERE key IN ({placeholders}) ORDER BY id', chunk
+                    )
+                self._db.execute(f'DELETE FROM events WHERE key IN ({placeholders})', chunk)
+            self._db.execute('COMMIT')
+
+    def unpark(self):
+        """
+        Queue every parked event again. Returns how many were moved back.
+        """
+        with self._lock:
+            self._db.execute('BEGIN')
+            count = self._db.execute(
+                'INSERT OR IGNORE INTO events (key, event) SELECT key, event FROM parked ORDER BY id'
+            ).rowcount
+            self._db.execute('DELETE FROM parked')
+            self._db.execute('COMMIT')
+        return count
+
+    def parked(self):
+        with self._lock:
+            return self._db.execute('SELECT COUNT(*) FROM parked').fetchone()[0]
+
+    def __len__(self):
+        with self._lock:
+            return self._db.execute('SELECT COUNT(*) FROM events').fetchone()[0]
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+
+def is_transient(error):
+    """
+    True for HTTP errors worth retrying: server errors, timeouts and rate
+    limits. Any other 4xx means the request itself was refused.
+    """
+    return error.code >= 500 or error.code in (408, 429)
+
+
+class QueueFlusher:
+    """
+    Drains an OfflineQueue to the server's attendance/api/sync/ endpoint
+    in batches of `batch_size`. An event is removed from the queue only once
+    the server has returned a result for its key; when the server cannot be
+    reached the batch stays queued and the flusher backs off, doubling the
+    wait up to `max_backoff` seconds. on_results is called with the
+    server's per-event results of each batch. `token` is sent as a bearer
+    token; the server needs one to accept events for other days or
+    statuses than present today, and answers "forbidden" for those
+    without it. Forbidden events are parked in the queue, and a request the
+    server rejects as a whole (a 4xx other than 408/429) stops the
+    background thread, since sending it again cannot succeed.
+    """
+
+    def __init__(self, queue, url, device='', token='', batch_size=200, interval=1.0, timeout=10.0,
+                 max_backoff=60.0, on_results=None):
+        self.queue = queue
+        self.url = url
+        self.device = device
+        self.token = token
+        self.batch_size = batch_size
+        self.interval = interval
+        self.timeout = timeout
+        self.max_backoff = max_backoff
+        self.on_results = on_results
+        self.sent = 0
+        self.parked = 0
+        self._stop_event = threading.Event()
+        self._thread = None
+
+    def _post(self, events):
+        headers = {'Content-Type': 'application/json'}
+        if self.token:
+            headers['Authorization'] = f'Bearer {self.token}'
+        request = urllib.request.Request(
+            self.url,
+            data=json.dumps({'device': self.device, 'events': events}).encode(),
+            headers=headers,
+            method='POST',
+        )
+        with urllib.request.urlopen(request, timeout=self.timeout) as response:
+            return json.loads(response.read())['results']
+
+    def flush_once(self):
+        """
+        Send the oldest batch and return how many events were acknowledged.
+        Raises OSError (including URLError/HTTPError) or ValueError when the
+        server could not take the batch.
+        """
+        events = self.queue.peek(self.batch_size)
+        if not events:
+            return 0
+        results = self._post(events)
+        forbidden = [result['key'] for result in results if result.get('result') == 'forbidden']
+        self.queue.park(forbidden)
+        self.queue.ack(result['key'] for result in results if result.get('key'))
+        self.sent += len(results) - len(forbidden)
+        self.parked += len(forbidden)
+        if self.on_results:
+            self.on_results(results)
+        return len(results)
+
+    def drain(self):
+        """
+        Send batches until the queue is empty. Returns the number of events
+        acknowledged.
+        """
+        sent = 0
+        while True:
+            count = self.flush_once()
+            if not count:
+                return sent
+            sent += count
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name='attendance-queue-flusher', daemon=True)
+        self._thread.start()
+        return self
+
+    def running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def close(self):
+        """
+        Stop the background thread (if any) and try once more to send what
+        is left. Events the server did not take stay in the queue.
+        """
+        if self._thread is not None:
+            self._stop_event.set()
+            self._thread.join()
+            self._thread = None
+        try:
+            self.drain()
+        except (OSError, ValueError) as e:
+            print(f"Could not reach {self.url}: {e}; {len(self.queue)} events left queued")
+
+    def _run(self):
+        wait = self.interval
+        while not self._stop_event.wait(wait):
+            try:
+                self.drain()
+                wait = self.interval
+            except (OSError, ValueError) as e:
+                if isinstance(e, urllib.error.HTTPError) and not is_transient(e):
+                    print(f"{self.url} refused the queued events: {e}; {len(self.queue)} events left queued")
+                    return
+                wait = min(max(wait * 2, self.interval), self.max_backoff)
+                print(f"Could not reach {self.url}: {e}; retrying in {wait:.0f}s")
+
+
+class QueuedAttendanceWriter:
+    """
+    Stands in for AttendanceWriter on capture devices: add() appends to an
+    OfflineQueue instead of writing to the database, and a QueueFlusher
+    sends the queue to the server. `created` and on_created report the
+    usernames the server newly marked.
+    """
+
+    def __init__(self, queue, url, device='', token='', status='present', attendance_date=None, source='',
+                 on_created=None, **flusher_options):
+        self.queue = queue
+        self.status = status
+        self.attendance_date = attendance_date
+        self.source = source
+        self.on_created = on_created
+        self.queued = set()
+        self.created = set()
+        self._day = None
+        self._lock = threading.Lock()
+        self.flusher = QueueFlusher(queue, url, device=device, token=token, on_results=self._record, **flusher_options)
+
+    def add(self, student_id, username=None, source=None):
+        day = self.attendance_date or date.today()
+        with self._lock:
+            if day != self._day:
+                # Queue each student once per day, not once per run.
+                self._day = day
+                self.queued.clear()
+            if student_id in self.queued:
+                return
+            self.queued.add(student_id)
+        self.queue.append(
+            username=username or str(student_id),
+            date=day,
+            status=self.status,
+            source=self.source if source is None else source,
+        )
+
+    def _record(self, results):
+        created = [result['username'] for result in results if result['result'] == 'created']
+        with self._lock:
+            self.created.update(created)
+        if created and self.on_created:
+            self.on_created(created)
+
+    def flush(self):
+        return self.flusher.drain()
+
+    def start(self):
+        self.flusher.start()
+        return self
+
+    def close(self):
+        self.flusher.close()
@@ -0,0 +1,233 @@
+import queue
+import threading
+import time
+from datetime import date
+
+import cv2
+from django.db import connection
+
+from .face_embedding import encode_faces
+from .face_tracking import detect_faces
+
+
+class StageCounter:
+    """
+    Thread-safe throughput counter for one pipeline stage.
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self.processed = 0
+        self.dropped = 0
+        self.busy_seconds = 0.0
+        self._lock = threading.Lock()
+
+    def record(self, seconds):
+        with self._lock:
+            self.processed += 1
+            self.busy_seconds += seconds
+
+    def drop(self):
+        with self._lock:
+            self.dropped += 1
+
+    def snapshot(self, elapsed):
+        with self._lock:
+            return {
+                'processed': self.processed,
+                'dropped': self.dropped,
+                'per_second': self.processed / elapsed if elapsed > 0 else 0.0,
+                'busy_seconds': round(self.busy_seconds, 3),
+            }
+
+
+def offer(target, item, counter):
+    """
+    Put without blocking; when the queue is full the oldest item is dropped
+    so downstream stages always work on the freshest frames.
+    """
+    while True:
+        try:
+            target.put_nowait(item)
+            return
+        except queue.Full:
+            try:
+                target.get_nowait()
+                counter.drop()
+            except queue.Empty:
+                pass
+
+
+class RecognitionPipeline:
+    """
+    Staged recognizer: a capture thread feeds a bounded queue drained by a
+    pool of Haar detector threads (OpenCV releases the GIL), a matcher
+    thread scores the faces and a writer thread records attendance, so a
+    slow database write never stalls the camera.
+
+    Frames are dropped when the bounded queues are full; recognitions are
+    never dropped. Annotated results for display are read with
+    next_result() on the caller's thread.
+    """
+
+    def __init__(self, capture, matcher, threshold, on_recognized, projection=None,
+                 detector_workers=2, queue_size=4, detect_scale=1.0):
+        self.capture = capture
+        self.matcher = matcher
+        self.threshold = threshold
+        self.on_recognized = on_recognized
+        self.projection = projection
+        self.detector_workers = detector_workers
+        self.detect_scale = detect_scale
+
+        self.frames = queue.Queue(maxsize=queue_size)
+        self.faces = queue.Queue(maxsize=queue_size)
+        self.results = queue.Queue(maxsize=queue_size)
+        self.writes = queue.Queue()
+
+        self.counters = {name: StageCounter(name) for name in ('capture', 'detect', 'match', 'write')}
+        self.recognized = set()
+        self._recognized_day = date.today()
+        self.stop_event = threading.Event()
+        self._capture_done = threading.Event()
+        self._detect_done = threading.Event()
+        self._match_done = threading.Event()
+        self._detectors_left = detector_workers
+        self._lock = threading.Lock()
+        self._threads = []
+        self.started_at = None
+
+    def start(self):
+        self.started_at = time.perf_counter()
+        self._spawn(self._capture_loop, 'capture')
+        for n in range(self.detector_workers):
+            self._spawn(self._detect_loop, f'detect-{n}')
+        self._spawn(self._match_loop, 'match')
+        self._spawn(self._write_loop, 'write')
+
+    def _spawn(self, target, name):
+        thread = threading.Thread(target=target, name=f'recognizer-{name}', daemon=True)
+        thread.start()
+        self._threads.append(thread)
+
+    def stop(self):
+        """
+        Stop capturing and matching; attendance already recognized is still
+        written before the writer thread exits.
+        """
+        self.stop_event.set()
+        for thread in self._threads:
+            thread.join()
+
+    def is_running(self):
+        return any(thread.is_alive() for thread in self._threads)
+
+    def next_result(self, timeout=0.1):
+        """
+        Return the next (frame, faces, matches, labels) tuple, or None.
+        """
+        try:
+            return self.results.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+    def stats(self):
+        elapsed = time.perf_counter() - self.started_at if self.started_at else 0.0
+        return {name: counter.snapshot(elapsed) for name, counter in self.counters.items()}
+
+    def _drain(self, source, done):
+        """
+        Next item from `source`, or None once the upstream stage is done (or
+        the pipeline stopped) and the queue is empty.
+        """
+        while True:
+            try:
+                return source.get(timeout=0.1)
+            except queue.Empty:
+                if done.is_set() or self.stop_event.is_set():
+                    return None
+
+    def _capture_loop(self):
+        counter = self.counters['capture']
+        frame_number = 0
+        try:
+            while not self.stop_event.is_set():
+                started = time.perf_counter()
+                ret, frame = self.capture.read()
+                if not ret:
+                    break
+                counter.record(time.perf_counter() - started)
+                offer(self.frames, (frame_number, frame), counter)
+                frame_number += 1
+        finally:
+            self._capture_done.set()
+
+    def _detect_loop(self):
+        counter = self.counters['detect']
+        try:
+            face_cascade = cv2.CascadeClassifier(cv2.data.haarcascades + 'haarcascade_frontalface_default.xml')
+            while not self.stop_event.is_set():
+                item = self._drain(self.frames, self._capture_done)
+                if item is None:
+                    break
+                frame_number, frame = item
+                started = time.perf_counter()
+                gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+                faces = detect_faces(face_cascade, gray, self.detect_scale)
+                encodings = encode_faces(gray, faces)
+                if self.projection is not None and len(faces) > 0:
+                    encodings = self.projection.project(encodings)
+                counter.record(time.perf_counter() - started)
+                offer(self.faces, (frame_number, frame, faces, encodings), counter)
+        finally:
+            with self._lock:
+                self._detectors_left -= 1
+                if self._detectors_left == 0:
+                    self._detect_done.set()
+
+    def _match_loop(self):
+        counter = self.counters['match']
+        try:
+            while not self.stop_event.is_set():
+                item = self._drain(self.faces, self._detect_done)
+                if item is None:
+                    break
+                frame_number, frame, faces, encodings = item
+                started = time.perf_counter()
+                matches = self.matcher.match(encodings) if len(faces) > 0 else []
+                if date.today() != self._recognized_day:
+                    # Students are written once per day, not once per run.
+                    self._recognized_day = date.today()
+                    self.recognized.clear()
+                labels = []
+                for match in matches:
+                    if match.distance < self.threshold:
+                        labels.append(match.label)
+                        if match.label not in self.recognized:
+                            self.recognized.add(match.label)
+                            self.writes.put(match)
+                    else:
+                        labels.append(None)
+                counter.record(time.perf_counter() - started)
+                offer(self.results, (frame, faces, matches, labels), counter)
+        finally:
+            self._match_done.set()
+
+    def _write_loop(self):
+        counter = self.counters['write']
+        try:
+            while True:
+                try:
+                    match = self.writes.get(timeout=0.1)
+                except queue.Empty:
+                    if self._match_done.is_set():
+                        break
+                    continue
+                started = time.perf_counter()
+                try:
+                    self.on_recognized(match)
+                except Exception as e:
+                    print(f"Could not record attendance for {match.label}: {e}")
+                counter.record(time.perf_counter() - started)
+        finally:
+            connection.close()
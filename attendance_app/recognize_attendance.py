@@ -1,47 +1,96 @@
 import os
+import argparse
 import cv2
-import numpy as np
 import django
 from pathlib import Path
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'SmartCollege.settings')
 django.setup()
 
-from django.contrib.auth.models import User
-from attendance_app.models import Attendance, FaceEncoding
-from datetime import date
+from attendance_app.attendance_writer import AttendanceWriter
+from attendance_app.face_gallery import LiveGallery
+from attendance_app.face_embedding import encode_faces, match_threshold, projection_for_gallery
+from attendance_app.face_tracking import FaceTracker, detect_faces
+from attendance_app.recognition_pipeline import RecognitionPipeline
 
-def recognize_and_mark_attendance():
+def print_marked(usernames):
+    for username in usernames:
+        print(f"Attendance marked for {username}")
+
+def match_faces(gray, faces, matcher, projection):
+    if len(faces) == 0:
+        return []
+    face_batch = encode_faces(gray, faces)
+    if projection is not None:
+        face_batch = projection.project(face_batch)
+    return matcher.match(face_batch)
+
+def draw_faces(frame, faces, labels):
+    for (x, y, w, h), label in zip(faces, labels):
+        color = (0, 255, 0) if label else (0, 0, 255)
+        cv2.rectangle(frame, (x, y), (x+w, y+h), color, 2)
+        cv2.putText(frame, label or "Unknown", (x, y-10), cv2.FONT_HERSHEY_SIMPLEX, 0.9, color, 2)
+
+def print_pipeline_stats(stats):
+    for stage, counts in stats.items():
+        print(f"  {stage:<8} {counts['processed']:>7} done {counts['dropped']:>6} dropped "
+              f"{counts['per_second']:>7.1f}/s")
+
+def recognize_and_mark_attendance(source=0, pipeline=False, detector_workers=2, detect_every=1, detect_scale=1.0):
     """
     Use webcam to recognize faces and mark attendance.
-    Loads face encodings from the database (FaceEncoding model).
+    Memory-maps the precompiled face gallery, rebuilding it from the
+    FaceEncoding model only when its stamp is out of date, and picks up
+    students enrolled or retrained while it runs (see LiveGallery).
+    With pipeline=True capture, detection, matching and database writes run
+    on separate threads (see RecognitionPipeline).
+    With detect_every > 1 faces are detected every N frames and tracked in
+    between, and each tracked face is matched once (see FaceTracker).
+    detect_scale < 1 runs detection on a downscaled frame.
     Press 'q' to quit.
     """
     
-    face_encodings_db = FaceEncoding.objects.all()
+    gallery = LiveGallery()
     
-    if not face_encodings_db.exists():
+    if len(gallery) == 0:
         print("Error: No face encodings found in database!")
         print("Please run train_faces.py first to generate face encodings.")
         return
     
-    known_encodings = {}
-    for face_enc in face_encodings_db:
-        encoding_array = np.frombuffer(face_enc.encoding, dtype=np.float32)
-        known_encodings[face_enc.student.username] = encoding_array
-    
-    print(f"Loaded {len(known_encodings)} known faces from database")
+    projection = projection_for_gallery(gallery.gallery)
+    threshold = match_threshold(projection)
     
-    face_cascade = cv2.CascadeClassifier(cv2.data.haarcascades + 'haarcascade_frontalface_default.xml')
+    print(f"Loaded {len(gallery)} known faces from database")
     
-    cap = cv2.VideoCapture(0)
+    cap = cv2.VideoCapture(source)
     
     if not cap.isOpened():
         print("Error: Could not open webcam")
         return
     
     print("Webcam started. Press 'q' to quit.")
-    marked_today = set()
+    
+    writer = AttendanceWriter(on_created=print_marked).start()
+    gallery.start()
+    
+    try:
+        if pipeline:
+            run_pipeline(cap, gallery, threshold, projection, writer, detector_workers, detect_scale)
+        else:
+            run_serial(cap, gallery, threshold, projection, writer, detect_every, detect_scale)
+    finally:
+        gallery.stop()
+        writer.close()
+    
+    cap.release()
+    cv2.destroyAllWindows()
+    print(f"\nAttendance marked for {len(writer.created)} students today")
+
+def run_serial(cap, matcher, threshold, projection, writer, detect_every=1, detect_scale=1.0):
+    face_cascade = cv2.CascadeClassifier(cv2.data.haarcascades + 'haarcascade_frontalface_default.xml')
+    tracker = None
+    if detect_every > 1:
+        tracker = FaceTracker(face_cascade, detect_every=detect_every, detect_scale=detect_scale)
     
     while True:
         ret, frame = cap.read()
@@ -51,58 +100,72 @@ def recognize_and_mark_attendance():
         
         gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
         
-        faces = face_cascade.detectMultiScale(gray, 1.3, 5)
+        if tracker is not None:
+            tracks = tracker.update(gray)
+            pending = tracker.pending()
+            for track, match in zip(pending, match_faces(gray, [t.box for t in pending], matcher, projection)):
+                tracker.assign(track, match, threshold)
+            faces = [track.box for track in tracks]
+            matches = [track.match for track in tracks]
+        else:
+            faces = detect_faces(face_cascade, gray, detect_scale)
+            matches = match_faces(gray, faces, matcher, projection)
         
-        for (x, y, w, h) in faces:
-            face_roi = gray[y:y+h, x:x+w]
-            face_resized = cv2.resize(face_roi, (100, 100))
-            face_encoding = face_resized.flatten().astype(np.float32)
-            
-            min_distance = float('inf')
-            recognized_user = None
-            
-            for username, known_encoding in known_encodings.items():
-                distance = np.linalg.norm(face_encoding - known_encoding)
-                if distance < min_distance:
-                    min_distance = distance
-                    recognized_user = username
-            
-            threshold = 3000
-            if min_distance < threshold and recognized_user:
-                label = f"{recognized_user}"
-                color = (0, 255, 0)
-                
-                if recognized_user not in marked_today:
-                    try:
-                        user = User.objects.get(username=recognized_user)
-                        attendance, created = Attendance.objects.get_or_create(
-                            student=user,
-                            date=date.today(),
-                            defaults={
-                                'status': 'present',
-                                'marked_by': None
-                            }
-                        )
-                        if created:
-                            marked_today.add(recognized_user)
-                            print(f"Attendance marked for {recognized_user}")
-                    except User.DoesNotExist:
-                        print(f"User {recognized_user} not found in database")
+        labels = []
+        for match in matches:
+            if match is not None and match.distance < threshold:
+                labels.append(match.label)
+                writer.add(match.student_id, match.label)
             else:
-                label = "Unknown"
-                color = (0, 0, 255)
-            
-            cv2.rectangle(frame, (x, y), (x+w, y+h), color, 2)
-            cv2.putText(frame, label, (x, y-10), cv2.FONT_HERSHEY_SIMPLEX, 0.9, color, 2)
+                labels.append(None)
         
+        draw_faces(frame, faces, labels)
         cv2.imshow('Face Recognition Attendance', frame)
         
         if cv2.waitKey(1) & 0xFF == ord('q'):
             break
+
+def run_pipeline(cap, matcher, threshold, projection, writer, detector_workers, detect_scale=1.0):
+    def on_recognized(match):
+        writer.add(match.student_id, match.label)
     
-    cap.release()
-    cv2.destroyAllWindows()
-    print(f"\nAttendance marked for {len(marked_today)} students today")
+    recognizer = RecognitionPipeline(
+        cap, matcher, threshold, on_recognized,
+        projection=projection, detector_workers=detector_workers, detect_scale=detect_scale,
+    )
+    recognizer.start()
+    
+    try:
+        while recognizer.is_running():
+            result = recognizer.next_result()
+            if result is not None:
+                frame, faces, matches, labels = result
+                draw_faces(frame, faces, labels)
+                cv2.imshow('Face Recognition Attendance', frame)
+            
+            if cv2.waitKey(1) & 0xFF == ord('q'):
+                break
+    finally:
+        recognizer.stop()
+    
+    print("Pipeline throughput:")
+    print_pipeline_stats(recognizer.stats())
 
 if __name__ == '__main__':
-    recognize_and_mark_attendance()
+    parser = argparse.ArgumentParser(description='Mark attendance from a webcam or video using face recognition')
+    parser.add_argument('--source', default='0', help='Camera index or video file/URL')
+    parser.add_argument('--pipeline', action='store_true',
+                        help='Run capture, detection, matching and DB writes on separate threads')
+    parser.add_argument('--detector-workers', type=int, default=2)
+    parser.add_argument('--detect-every', type=int, default=1,
+                        help='Run face detection every N frames and track faces in between')
+    parser.add_argument('--detect-scale', type=float, default=1.0,
+                        help='Downscale factor applied to frames before face detection, e.g. 0.5')
+    args = parser.parse_args()
+    if args.pipeline and args.detect_every > 1:
+        parser.error('--detect-every applies to the single-threaded loop; use --detect-scale with --pipeline')
+    source = int(args.source) if args.source.isdigit() else args.source
+    recognize_and_mark_attendance(
+        source=source, pipeline=args.pipeline, detector_workers=args.detector_workers,
+        detect_every=args.detect_every, detect_scale=args.detect_scale,
+    )
@@ -0,0 +1,357 @@
+import multiprocessing
+import queue
+import threading
+import time
+from datetime import date
+from multiprocessing import shared_memory
+from pathlib import Path
+
+import cv2
+import numpy as np
+
+from .face_embedding import encode_faces
+from .face_matching import FaceMatcher
+from .face_tracking import detect_faces
+
+# Per-process state set up by _init_worker.
+_worker = {}
+
+
+class SharedGallery:
+    """
+    Face gallery matrix and scales copied once into
+    multiprocessing.shared_memory. descriptor() is a small picklable dict
+    that worker processes pass to attach() to map the same pages instead of
+    each loading its own copy.
+    """
+
+    def __init__(self, gallery):
+        self._blocks = []
+        self.arrays = {
+            'encodings': self._share(np.ascontiguousarray(gallery.encodings)),
+            'scales': self._share(np.ascontiguousarray(gallery.scales)),
+        }
+        self.student_ids = list(gallery.student_ids)
+        self.usernames = list(gallery.usernames)
+
+    def _share(self, array):
+        block = shared_memory.SharedMemory(create=True, size=max(1, array.nbytes))
+        np.ndarray(array.shape, dtype=array.dtype, buffer=block.buf)[...] = array
+        self._blocks.append(block)
+        return block.name, array.shape, array.dtype.str
+
+    def descriptor(self):
+        return {'arrays': self.arrays, 'student_ids': self.student_ids, 'usernames': self.usernames}
+
+    @staticmethod
+    def attach(descriptor):
+        """
+        Return ({name: array}, blocks) for a descriptor; the blocks must be
+        kept alive for as long as the arrays are used.
+        """
+        arrays = {}
+        blocks = []
+        for name, (block_name, shape, dtype) in descriptor['arrays'].items():
+            block = shared_memory.SharedMemory(name=block_name)
+            blocks.append(block)
+            arrays[name] = np.ndarray(shape, dtype=np.dtype(dtype), buffer=block.buf)
+        return arrays, blocks
+
+    def close(self):
+        for block in self._blocks:
+            block.close()
+            block.unlink()
+        self._blocks = []
+
+
+def _attach_gallery(descriptor, backend, index_options):
+    """
+    Map a shared gallery into this worker and build its matcher, releasing
+    the gallery it replaces.
+    """
+    arrays, blocks = SharedGallery.attach(descriptor)
+    old_blocks = _worker.get('blocks', [])
+    _worker.update(
+        blocks=blocks,
+        student_ids=descriptor['student_ids'],
+        matcher=FaceMatcher(
+            arrays['encodings'], descriptor['usernames'], backend,
+            scales=arrays['scales'], **index_options
+        ),
+    )
+    for block in old_blocks:
+        block.close()
+
+
+def _init_worker(descriptor, projection, threshold, backend, index_options, detect_scale):
+    cv2.setNumThreads(1)
+    _attach_gallery(descriptor, backend, index_options)
+    _worker.update(
+        projection=projection,
+        threshold=threshold,
+        detect_scale=detect_scale,
+        face_cascade=cv2.CascadeClassifier(cv2.data.haarcascades + 'haarcascade_frontalface_default.xml'),
+        seen=set(),
+        day=date.today(),
+    )
+
+
+def _check_reload(number, control, results, backend, index_options):
+    """
+    Switch to the newest gallery the parent has shared, if any, and tell it
+    which generation this worker now uses so older ones can be freed.
+    """
+    latest = None
+    while True:
+        try:
+            latest = control.get_nowait()
+        except queue.Empty:
+            break
+    if latest is not None:
+        generation, descriptor = latest
+        _attach_gallery(descriptor, backend, index_options)
+        results.put(('reloaded', number, generation))
+
+
+def _worker_loop(number, frames, control, results, descriptor, projection, threshold, backend, index_options,
+                 detect_scale):
+    """
+    Detect and match grayscale frames until a None sentinel arrives. Only
+    the first recognition of a student per source and day is sent back;
+    workers never touch the database. New galleries arrive on `control`
+    and are picked up before the next frame.
+    """
+    processed = 0
+    busy = 0.0
+    try:
+        _init_worker(descriptor, projection, threshold, backend, index_options, detect_scale)
+        seen = _worker['seen']
+        while True:
+            item = frames.get()
+            if item is None:
+                break
+            _check_reload(number, control, results, backend, index_options)
+            source, frame_number, gray = item
+            started = time.perf_counter()
+            if date.today() != _worker['day']:
+                # Report each student once per day, not once per run.
+                _worker['day'] = date.today()
+                seen.clear()
+            faces = detect_faces(_worker['face_cascade'], gray, _worker['detect_scale'])
+            if len(faces) > 0:
+                encodings = encode_faces(gray, faces)
+                if _worker['projection'] is not None:
+                    encodings = _worker['projection'].project(encodings)
+                for match in _worker['matcher'].match(encodings):
+                    if match.distance >= _worker['threshold']:
+                        continue
+                    student_id = _worker['student_ids'][match.index]
+                    if (source, student_id) not in seen:
+                        seen.add((source, student_id))
+                        results.put(('match', source, student_id, match.label, frame_number))
+            processed += 1
+            busy += time.perf_counter() - started
+    finally:
+        results.put(('done', processed, busy))
+        for block in _worker.get('blocks', []):
+            block.close()
+
+
+def is_live(source):
+    """
+    Camera indexes and stream URLs drop frames under load; video files are
+    replayed in full so they can stand in for cameras in tests.
+    """
+    return isinstance(source, int) or not Path(source).is_file()
+
+
+class RecognizerService:
+    """
+    One recognizer for many cameras. A capture thread per source converts
+    frames to grayscale and feeds a bounded queue read by `workers`
+    processes, which share a single gallery through shared memory. Workers
+    never touch the database: recognitions come back to the parent and go
+    through one AttendanceWriter, tagged with the source they came from.
+
+    `gallery` is a FaceGallery, or a LiveGallery to follow enrollments: the
+    parent checks it every `reload_interval` seconds and, when it changed,
+    shares the new gallery and hands it to every worker, freeing the old
+    shared memory once all workers have switched.
+    """
+
+    def __init__(self, sources, gallery, writer, projection=None, threshold=3000,
+                 workers=None, queue_size=16, detect_scale=1.0, backend='brute', index_options=None,
+                 reload_interval=1.0):
+        self.sources = dict(sources)
+        self.gallery = gallery
+        self.live = gallery if hasattr(gallery, 'check') else None
+        self._projection_version = self.live.projection if self.live else None
+        self.reload_interval = reload_interval
+        self.reloads = 0
+        self.writer = writer
+        self.projection = projection
+        self.threshold = threshold
+        self.workers = workers or multiprocessing.cpu_count()
+        self.queue_size = queue_size
+        self.detect_scale = detect_scale
+        self.backend = backend
+        self.index_options = index_options or {}
+        self.stop_event = threading.Event()
+        self.stats = {name: {'frames': 0, 'dropped': 0, 'recognized': 0} for name in self.sources}
+        self.recognized = set()
+        self.summary = {}
+        self._stats_lock = threading.Lock()
+
+    def run(self, duration=None):
+        """
+        Run until every source ends, `duration` seconds pass or stop() is
+        called. Returns the per-source stats.
+        """
+        context = multiprocessing.get_context()
+        # Shared galleries by generation; a generation is freed once every
+        # worker has moved past it.
+        generation = 0
+        shared = {generation: SharedGallery(self.live.gallery if self.live else self.gallery)}
+        worker_generations = [generation] * self.workers
+        next_check = time.monotonic() + self.reload_interval
+        frames = context.Queue(maxsize=self.queue_size)
+        results = context.Queue()
+        controls = [context.Queue() for _ in range(self.workers)]
+        processes = [
+            context.Process(
+                target=_worker_loop, name=f'recognizer-worker-{n}', daemon=True,
+                args=(n, frames, controls[n], results, shared[generation].descriptor(), self.projection,
+                      self.threshold, self.backend, self.index_options, self.detect_scale),
+            )
+            for n in range(self.workers)
+        ]
+        captures = [
+            threading.Thread(target=self._capture_loop, args=(name, source, frames),
+                             name=f'recognizer-capture-{name}', daemon=True)
+            for name, source in self.sources.items()
+        ]
+        started = time.perf_counter()
+        try:
+            for process in processes:
+                process.start()
+            for thread in captures:
+                thread.start()
+
+            workers_left = self.workers
+            sentinels_sent = False
+            processed = 0
+            busy = 0.0
+            while workers_left:
+                if duration is not None and time.perf_counter() - started >= duration:
+                    self.stop_event.set()
+                if self.live is not None and not sentinels_sent and time.monotonic() >= next_check:
+                    next_check = time.monotonic() + self.reload_interval
+                    if self._check_gallery():
+                        generation += 1
+                        shared[generation] = SharedGallery(self.live.gallery)
+                        for control in controls:
+                            control.put((generation, shared[generation].descriptor()))
+                if not sentinels_sent and not any(thread.is_alive() for thread in captures):
+                    for _ in processes:
+                        frames.put(None)
+                    sentinels_sent = True
+                try:
+                    message = results.get(timeout=0.1)
+                except queue.Empty:
+                    if not any(process.is_alive() for process in processes):
+                        break
+                    continue
+                if message[0] == 'done':
+                    workers_left -= 1
+                    processed += message[1]
+                    busy += message[2]
+                    continue
+                if message[0] == 'reloaded':
+                    worker_generations[message[1]] = message[2]
+                    for old in [old for old in shared if old < min(worker_generations)]:
+                        shared.pop(old).close()
+                    continue
+                _, source, student_id, username, frame_number = message
+                key = (source, student_id, date.today())
+                if key in self.recognized:
+                    continue
+                self.recognized.add(key)
+                self.writer.add(student_id, username, source=source)
+                with self._stats_lock:
+                    self.stats[source]['recognized'] += 1
+        finally:
+            self.stop_event.set()
+            for thread in captures:
+                thread.join()
+            for process in processes:
+                process.join(timeout=5)
+                if process.is_alive():
+                    process.terminate()
+            for gallery in shared.values():
+                gallery.close()
+
+        elapsed = time.perf_counter() - started
+        self.summary = {
+            'seconds': round(elapsed, 3),
+            'frames_processed': processed,
+            'fps': processed / elapsed if elapsed > 0 else 0.0,
+            'worker_fps': processed / busy if busy > 0 else 0.0,
+        }
+        return self.stats
+
+    def stop(self):
+        self.stop_event.set()
+
+    def _check_gallery(self):
+        """
+        True when the LiveGallery picked up a change the workers can use.
+        """
+        try:
+            changed = self.live.check()
+        except Exception as e:
+            # Database locked or unreachable: keep recognizing with the
+            # gallery the workers already have.
+            print(f"Could not refresh face gallery: {e}")
+            return False
+        if changed and self.live.projection != self._projection_version:
+            # Workers project faces with the projection they started with.
+            print("Face encodings now use a different projection; restart the recognizer to load them.")
+            return False
+        if changed:
+            self.reloads += 1
+            print(f"Face gallery updated: {len(self.live)} known faces")
+        return changed
+
+    def _capture_loop(self, name, source, frames):
+        cap = cv2.VideoCapture(source)
+        if not cap.isOpened():
+            print(f"Could not open source {name} ({source})")
+            return
+        live = is_live(source)
+        counts = self.stats[name]
+        frame_number = 0
+        try:
+            while not self.stop_event.is_set():
+                ret, frame = cap.read()
+                if not ret:
+                    break
+                item = (name, frame_number, cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY))
+                frame_number += 1
+                if live:
+                    try:
+                        frames.put_nowait(item)
+                    except queue.Full:
+                        with self._stats_lock:
+                            counts['dropped'] += 1
+                        continue
+                else:
+                    while not self.stop_event.is_set():
+                        try:
+                            frames.put(item, timeout=0.1)
+                            break
+                        except queue.Full:
+                            continue
+                with self._stats_lock:
+                    counts['frames'] += 1
+        finally:
+            cap.release()
@@ -0,0 +1,126 @@
+from datetime import date
+
+from django.db.models import Count, Q, Sum
+from django.db.models.functions import TruncMonth
+
+from .models import Attendance, AttendanceMonthly
+
+COUNTED_STATUSES = ('present', 'absent', 'late', 'excused')
+COUNT_FIELDS = COUNTED_STATUSES + ('total',)
+
+
+def month_start(value):
+    if isinstance(value, str):
+        value = date.fromisoformat(value)
+    return value.replace(day=1)
+
+
+def _next_month(month):
+    return month.replace(year=month.year + 1, month=1) if month.month == 12 else month.replace(month=month.month + 1)
+
+
+def _monthly_counts(queryset):
+    """
+    {(student_id, month): {status: count, ..., 'total': count}} for the
+    attendance rows in `queryset`, computed in one grouped query.
+    """
+    rows = (
+        queryset.annotate(month=TruncMonth('date'))
+        .values('student_id', 'month')
+        .annotate(
+            total=Count('id'),
+            **{status: Count('id', filter=Q(status=status)) for status in COUNTED_STATUSES},
+        )
+        .order_by()
+    )
+    return {
+        (row['student_id'], row['month']): {field: row[field] for field in COUNT_FIELDS}
+        for row in rows
+    }
+
+
+def refresh_rollup(keys):
+    """
+    Recompute the AttendanceMonthly rows for the given (student_id, date or
+    month) pairs from Attendance. Bulk writes that bypass model signals
+    (bulk_create, update()) call this with the rows they touched.
+    """
+    keys = {(student_id, month_start(day)) for student_id, day in keys}
+    if not keys:
+        return
+    student_ids = {student_id for student_id, _ in keys}
+    months = {month for _, month in keys}
+    counts = _monthly_counts(Attendance.objects.filter(
+        student_id__in=student_ids,
+        date__gte=min(months),
+        date__lt=_next_month(max(months)),
+    ))
+
+    AttendanceMonthly.objects.bulk_create(
+        [
+            AttendanceMonthly(student_id=student_id, month=month, **counts[(student_id, month)])
+            for student_id, month in keys if (student_id, month) in counts
+        ],
+        update_conflicts=True,
+        unique_fields=['student', 'month'],
+        update_fields=list(COUNT_FIELDS),
+    )
+    emptied = Q()
+    for student_id, month in keys - set(counts):
+        emptied |= Q(student_id=student_id, month=month)
+    if emptied:
+        AttendanceMonthly.objects.filter(emptied).delete()
+
+
+def rebuild_rollup(batch_size=1000):
+    """
+    Replace every AttendanceMonthly row with counts recomputed from
+    Attendance. Returns the number of rows written.
+    """
+    counts = _monthly_counts(Attendance.objects.all())
+    AttendanceMonthly.objects.all().delete()
+    AttendanceMonthly.objects.bulk_create(
+        [AttendanceMonthly(student_id=student_id, month=month, **values) for (student_id, month), values in counts.items()],
+        batch_size=batch_size,
+    )
+    return len(counts)
+
+
+def check_rollup():
+    """
+    Compare AttendanceMonthly with Attendance. Returns a list of
+    (student_id, month, expected, stored) for every cell that differs;
+    missing cells have None on the missing side.
+    """
+    expected = _monthly_counts(Attendance.objects.all())
+    stored = {
+        (row['student_id'], row['month']): {field: row[field] for field in COUNT_FIELDS}
+        for row in AttendanceMonthly.objects.values('student_id', 'month', *COUNT_FIELDS)
+    }
+    return [
+        (student_id, month, expected.get((student_id, month)), stored.get((student_id, month)))
+        for student_id, month in sorted(set(expected) | set(stored))
+        if expected.get((student_id, month)) != stored.get((student_id, month))
+    ]
+
+
+def attendance_totals(student_id):
+    """
+    Attendance counts for one student summed over their monthly rollup rows.
+    """
+    totals = AttendanceMonthly.objects.filter(student_id=student_id).aggregate(
+        **{field: Sum(field) for field in COUNT_FIELDS}
+    )
+    return {field: value or 0 for field, value in totals.items()}
+
+
+def refresh_attendance_summaries(keys):
+    """
+    Refresh every structure derived from Attendance (the monthly rollup and
+    the term bitmaps) for the given (student_id, date) pairs.
+    """
+    from .attendance_bitmap import refresh_bitmaps
+
+    keys = set(keys)
+    refresh_rollup(keys)
+    refresh_bitmaps(keys)
@@ -0,0 +1,41 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from .face_gallery import bump_version
+from .models import Attendance, FaceEncoding
+from .rollup import refresh_attendance_summaries
+
+
+def _bump_gallery_version():
+    try:
+        bump_version()
+    except OSError as e:
+        # Recognizers still pick the change up by polling the table.
+        print(f"Could not update face gallery version: {e}")
+
+
+@receiver(post_save, sender=FaceEncoding)
+@receiver(post_delete, sender=FaceEncoding)
+def face_encoding_changed(sender, **kwargs):
+    transaction.on_commit(_bump_gallery_version)
+
+
+@receiver(pre_save, sender=Attendance)
+def remember_attendance_key(sender, instance, **kwargs):
+    # An edit can move a record to another student or month; both cells
+    # need refreshing.
+    instance._rollup_previous = None
+    if instance.pk:
+        instance._rollup_previous = (
+            Attendance.objects.filter(pk=instance.pk).values_list('student_id', 'date').first()
+        )
+
+
+@receiver(post_save, sender=Attendance)
+@receiver(post_delete, sender=Attendance)
+def attendance_changed(sender, instance, **kwargs):
+    keys = {(instance.student_id, instance.date)}
+    if getattr(instance, '_rollup_previous', None):
+        keys.add(instance._rollup_previous)
+    refresh_attendance_summaries(keys)
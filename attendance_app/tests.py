@@ -1,3 +1,160 @@
-from django.test import TestCase
+import json
+from datetime import date, timedelta
 
-# Create your tests here.
+from django.contrib.auth.models import User
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from college_app.models import Profile
+from .attendance_queries import keyset_page
+from .attendance_sync import apply_events
+from .attendance_writer import AttendanceWriter
+from .models import Attendance, AttendanceReceipt
+from .rollup import attendance_totals, check_rollup
+
+
+def make_user(username, role='student', **profile):
+    user = User.objects.create_user(username=username)
+    Profile.objects.create(user=user, role=role, **profile)
+    return user
+
+
+class RollupConsistencyTests(TestCase):
+    """
+    The bulk write paths bypass model signals and refresh the monthly
+    rollup themselves; it must always agree with Attendance.
+    """
+
+    def setUp(self):
+        self.teacher = make_user('teacher', role='teacher')
+        self.students = [
+            make_user(f'student{n}', course='BCA', semester=3, roll_number=f'BCA-{n}') for n in range(4)
+        ]
+
+    def test_manual_bulk_upsert(self):
+        self.client.force_login(self.teacher)
+        day = date.today() - timedelta(days=3)
+        for statuses in (('present', 'absent', 'late', 'present'), ('absent', 'absent', 'excused', 'late')):
+            data = {'course': 'BCA', 'semester': '3', 'date': day.isoformat()}
+            data.update({f'status_{student.id}': status for student, status in zip(self.students, statuses)})
+            response = self.client.post(reverse('mark_attendance_manual'), data)
+            self.assertEqual(response.status_code, 302)
+            self.assertEqual(check_rollup(), [])
+
+        self.assertEqual(Attendance.objects.filter(date=day).count(), 4)
+        self.assertEqual(attendance_totals(self.students[0].id)['absent'], 1)
+        self.assertEqual(attendance_totals(self.students[0].id)['total'], 1)
+
+    def post_batch(self, payload, **headers):
+        return self.client.post(
+            reverse('mark_attendance_batch_api'), json.dumps(payload), content_type='application/json', **headers
+        )
+
+    @override_settings(ATTENDANCE_DEVICE_TOKENS=['gate-token'])
+    def test_batch_api(self):
+        response = self.post_batch({'usernames': ['student0', 'student1', 'nobody']})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['created'], 2)
+        self.assertEqual(check_rollup(), [])
+
+        earlier = (date.today() - timedelta(days=40)).isoformat()
+        payload = {'roll_numbers': ['BCA-2', 'BCA-3'], 'date': earlier, 'status': 'late'}
+        self.assertEqual(self.post_batch(payload).status_code, 403)
+        response = self.post_batch(payload, HTTP_AUTHORIZATION='Bearer gate-token')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['created'], 2)
+        self.assertEqual(check_rollup(), [])
+
+    def test_batch_api_rejects_non_object_body(self):
+        self.assertEqual(self.post_batch([1]).status_code, 400)
+
+    def test_writer_flush(self):
+        writer = AttendanceWriter()
+        for student in self.students[:3]:
+            writer.add(student.id, student.username)
+        writer.add(self.students[0].id, self.students[0].username)
+        self.assertEqual(sorted(writer.flush()), ['student0', 'student1', 'student2'])
+
+        earlier = AttendanceWriter(attendance_date=date.today() - timedelta(days=35), status='late')
+        for student in self.students:
+            earlier.add(student.id, student.username)
+        self.assertEqual(len(earlier.flush()), 4)
+        self.assertEqual(writer.flush(), [])
+        self.assertEqual(Attendance.objects.count(), 7)
+        self.assertEqual(check_rollup(), [])
+
+
+class KeysetPageTests(TestCase):
+    def setUp(self):
+        students = [make_user(f'student{n}') for n in range(3)]
+        start = date(2025, 1, 1)
+        Attendance.objects.bulk_create([
+            Attendance(student=student, date=start + timedelta(days=day))
+            for day in range(25) for student in students
+        ])
+        self.expected = list(Attendance.objects.order_by('-date', '-pk'))
+
+    def test_round_trip(self):
+        pages = []
+        records, older, newer = keyset_page(Attendance.objects.all(), page_size=10)
+        self.assertIsNone(newer)
+        pages.append((records, older, newer))
+        while older:
+            records, older, newer = keyset_page(Attendance.objects.all(), after=older, page_size=10)
+            self.assertIsNotNone(newer)
+            pages.append((records, older, newer))
+
+        walked = [record for records, _, _ in pages for record in records]
+        self.assertEqual(walked, self.expected)
+        self.assertEqual([len(records) for records, _, _ in pages], [10] * 7 + [5])
+
+        # Walking back with the newer cursors returns the same pages.
+        for (records, _, newer), (previous, _, _) in zip(reversed(pages), list(reversed(pages))[1:]):
+            back, _, _ = keyset_page(Attendance.objects.all(), before=newer, page_size=10)
+            self.assertEqual(back, previous)
+
+    def test_bad_cursor_starts_over(self):
+        records, _, newer = keyset_page(Attendance.objects.all(), after='not-a-cursor', page_size=10)
+        self.assertEqual(records, self.expected[:10])
+        self.assertIsNone(newer)
+
+
+class ApplyEventsTests(TestCase):
+    def setUp(self):
+        self.student = make_user('student0', roll_number='BCA-0')
+        self.day = date.today() - timedelta(days=2)
+
+    def test_replayed_keys_mark_once(self):
+        events = [
+            {'key': 'k1', 'username': 'student0', 'date': self.day.isoformat()},
+            {'key': 'k2', 'roll_number': 'BCA-0', 'date': self.day.isoformat()},
+            {'key': 'k3', 'username': 'nobody'},
+            {'username': 'student0'},
+        ]
+        first = apply_events(events, device='gate-1')
+        self.assertEqual([result['result'] for result in first], ['created', 'already', 'unknown', 'invalid'])
+
+        second = apply_events(events, device='gate-1')
+        self.assertEqual(second, first)
+        self.assertEqual(Attendance.objects.filter(student=self.student).count(), 1)
+        self.assertEqual(AttendanceReceipt.objects.count(), 3)
+        self.assertEqual(check_rollup(), [])
+
+    def test_duplicate_key_in_one_batch(self):
+        event = {'key': 'k1', 'username': 'student0', 'date': self.day.isoformat(), 'status': 'late'}
+        results = apply_events([event, dict(event)])
+        self.assertEqual([result['result'] for result in results], ['created', 'created'])
+        self.assertEqual(Attendance.objects.get(student=self.student).status, 'late')
+        self.assertEqual(AttendanceReceipt.objects.count(), 1)
+
+    def test_sync_api_without_token_refuses_other_days(self):
+        events = [
+            {'key': 'k1', 'username': 'student0', 'date': self.day.isoformat()},
+            {'key': 'k2', 'username': 'student0'},
+        ]
+        response = self.client.post(
+            reverse('sync_attendance_api'), json.dumps({'events': events}), content_type='application/json'
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([result['result'] for result in response.json()['results']], ['forbidden', 'created'])
+        self.assertEqual(list(Attendance.objects.values_list('date', flat=True)), [date.today()])
@@ -1,5 +1,5 @@
 import os
-import cv2
+import argparse
 import numpy as np
 import django
 from pathlib import Path
@@ -7,18 +7,30 @@ from pathlib import Path
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'SmartCollege.settings')
 django.setup()
 
+from django.conf import settings
 from django.contrib.auth.models import User
+from django.utils import timezone
 from attendance_app.models import FaceEncoding
+from attendance_app.face_codec import encode_encoding
+from attendance_app.face_embedding import FaceProjection, collect_student_images, fit_projection
+from attendance_app.face_enrollment import encode_students
+from attendance_app.face_gallery import bump_version
 
-def train_faces():
+def train_faces(mode='raw', n_components=128, workers=None, reuse_projection=False, force=False):
     """
     Train face encodings from student images and save to database.
     Place student images in 'student_images/' folder with naming convention: username.jpg
+    (or several images in student_images/username/).
+    mode='raw' stores 100x100 pixel vectors; mode='pca' or 'lda' fits a projection over
+    all enrolled images, saves it to settings.FACE_PROJECTION_PATH and stores
+    n_components-dim embeddings instead. With reuse_projection=True the saved
+    projection is applied as-is, so enrollment stays incremental.
+    Images are hashed and encoded on a process pool of `workers`; students whose
+    images (and projection) are unchanged since the last run are skipped unless
+    force=True.
     This script will generate face encodings and save them to the FaceEncoding model
     """
     
-    face_cascade = cv2.CascadeClassifier(cv2.data.haarcascades + 'haarcascade_frontalface_default.xml')
-    
     student_images_dir = Path('student_images')
     if not student_images_dir.exists():
         print(f"Creating {student_images_dir} directory...")
@@ -26,56 +38,119 @@ def train_faces():
         print(f"Please add student images to {student_images_dir}/ with format: username.jpg")
         return
     
-    encoded_count = 0
+    projection = None
+    if mode != 'raw' and reuse_projection:
+        projection = FaceProjection.load()
+        print(f"Reusing {projection.method.upper()} projection {projection.version}")
+    # A fresh fit changes every encoding, so nothing can be skipped.
+    incremental = not force and (mode == 'raw' or projection is not None)
+    target_projection = projection.version if projection is not None else ''
+    storage = settings.FACE_ENCODING_STORAGE
     
-    for image_file in student_images_dir.glob('*.jpg'):
-        username = image_file.stem
-        print(f"Processing {username}...")
-        
-        try:
-            user = User.objects.get(username=username, profile__role='student')
-        except User.DoesNotExist:
-            print(f"Student user {username} not found in database. Skipping...")
-            continue
-        
-        img = cv2.imread(str(image_file))
-        if img is None:
-            print(f"Could not read image: {image_file}")
-            continue
-        
-        gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
-        
-        faces = face_cascade.detectMultiScale(gray, 1.3, 5)
-        
-        if len(faces) == 0:
-            print(f"No face detected in {image_file}")
+    student_images = collect_student_images(student_images_dir)
+    users = dict(
+        User.objects.filter(username__in=student_images, profile__role='student')
+        .values_list('username', 'id')
+    )
+    for username in sorted(set(student_images) - set(users)):
+        print(f"Student user {username} not found in database. Skipping...")
+    
+    existing = {
+        student_id: (encoding_id, content_hash, projection_version)
+        for encoding_id, student_id, content_hash, projection_version in FaceEncoding.objects
+        .filter(student_id__in=users.values())
+        .values_list('id', 'student_id', 'content_hash', 'projection')
+    }
+    
+    tasks = []
+    for username, image_files in student_images.items():
+        if username not in users:
             continue
-        
-        for (x, y, w, h) in faces:
-            face_roi = gray[y:y+h, x:x+w]
-            face_resized = cv2.resize(face_roi, (100, 100))
-            
-            encoding = face_resized.flatten().astype(np.float32)
-            encoding_bytes = encoding.tobytes()
-            
-            face_encoding, created = FaceEncoding.objects.update_or_create(
-                student=user,
-                defaults={'encoding': encoding_bytes}
-            )
-            
-            if created:
-                print(f"Created face encoding for {username}")
-            else:
-                print(f"Updated face encoding for {username}")
-            
-            encoded_count += 1
-            break
+        known_hash = None
+        row = existing.get(users[username])
+        if incremental and row is not None and row[2] == target_projection:
+            known_hash = row[1]
+        tasks.append((username, image_files, known_hash, storage))
+    
+    print(f"Encoding images for {len(tasks)} students...")
+    hashes = {}
+    student_vectors = {}
+    unchanged = 0
+    for username, content_hash, vectors, messages in encode_students(tasks, workers):
+        for message in messages:
+            print(message)
+        if vectors is None:
+            unchanged += 1
+        elif len(vectors):
+            hashes[username] = content_hash
+            student_vectors[username] = vectors
+    
+    if unchanged:
+        print(f"Skipped {unchanged} students whose images are unchanged")
+    if not student_vectors:
+        if not unchanged:
+            print("No faces were encoded. Please check your images and ensure student users exist in the database.")
+        return
+    
+    if mode != 'raw' and projection is None:
+        vectors = np.concatenate(list(student_vectors.values()))
+        labels = np.concatenate([[username] * len(v) for username, v in student_vectors.items()])
+        try:
+            projection = fit_projection(vectors, labels, n_components=n_components, lda=(mode == 'lda'))
+        except ValueError as e:
+            print(f"Error: {e}. Train with --mode raw instead.")
+            return
+        path = projection.save()
+        print(f"Fitted {projection.method.upper()} projection {vectors.shape[1]} -> {projection.dims} dims, saved to {path}")
+    projection_version = projection.version if projection is not None else ''
+    
+    now = timezone.now()
+    to_create = []
+    to_update = []
+    for username, vectors in student_vectors.items():
+        if projection is not None:
+            vectors = projection.project(vectors)
+        encoding = vectors.mean(axis=0).astype(np.float32)
+        face_encoding = FaceEncoding(
+            student_id=users[username],
+            encoding=encode_encoding(encoding, storage),
+            projection=projection_version,
+            content_hash=hashes[username],
+            updated_at=now,
+        )
+        row = existing.get(users[username])
+        if row is None:
+            to_create.append(face_encoding)
+        else:
+            face_encoding.id = row[0]
+            to_update.append(face_encoding)
+    
+    FaceEncoding.objects.bulk_create(to_create, batch_size=500)
+    FaceEncoding.objects.bulk_update(
+        to_update, ['encoding', 'projection', 'content_hash', 'updated_at'], batch_size=500
+    )
+    # Bulk writes send no signals, so tell running recognizers directly.
+    bump_version()
+    
+    print(f"\nSuccessfully trained {len(student_vectors)} faces! "
+          f"({len(to_create)} created, {len(to_update)} updated)")
+    print("Encodings saved to database (FaceEncoding model)")
     
-    if encoded_count > 0:
-        print(f"\nSuccessfully trained {encoded_count} faces!")
-        print("Encodings saved to database (FaceEncoding model)")
-    else:
-        print("No faces were encoded. Please check your images and ensure student users exist in the database.")
+    stale_count = FaceEncoding.objects.exclude(projection=projection_version).count()
+    if stale_count:
+        print(f"Warning: {stale_count} other face encodings were made with a different projection "
+              "and must be retrained before recognition can use the gallery.")
 
 if __name__ == '__main__':
-    train_faces()
+    parser = argparse.ArgumentParser(description='Train face encodings from student_images/')
+    parser.add_argument('--mode', choices=['raw', 'pca', 'lda'], default='raw',
+                        help='raw pixel vectors, PCA eigenfaces, or PCA followed by LDA')
+    parser.add_argument('--components', type=int, default=128,
+                        help='Embedding size for pca/lda (64-256 recommended)')
+    parser.add_argument('--workers', type=int, help='Encoder processes (defaults to the CPU count)')
+    parser.add_argument('--reuse-projection', action='store_true',
+                        help='Project with the saved pca/lda projection instead of refitting it')
+    parser.add_argument('--force', action='store_true', help='Re-encode students whose images are unchanged')
+    args = parser.parse_args()
+    train_faces(mode=args.mode, n_components=args.components, workers=args.workers,
+                reuse_projection=args.reuse_projection, force=args.force)
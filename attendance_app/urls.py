@@ -4,6 +4,10 @@ from . import views
 urlpatterns = [
     path('view/', views.view_attendance, name='view_attendance'),
     path('report/', views.attendance_report, name='attendance_report'),
+    path('report/export/', views.export_attendance, name='export_attendance'),
     path('mark/', views.mark_attendance_manual, name='mark_attendance_manual'),
     path('api/mark/', views.mark_attendance_api, name='mark_attendance_api'),
+    path('api/mark/batch/', views.mark_attendance_batch_api, name='mark_attendance_batch_api'),
+    path('api/sync/', views.sync_attendance_api, name='sync_attendance_api'),
+    path('api/recognize/', views.recognize_attendance_api, name='recognize_attendance_api'),
 ]
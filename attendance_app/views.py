@@ -1,63 +1,94 @@
 from django.shortcuts import render, redirect
+from django.urls import reverse
 from django.contrib.auth.decorators import login_required
 from django.contrib.auth.models import User
-from django.http import JsonResponse
+from django.middleware.csrf import CsrfViewMiddleware
+from django.http import FileResponse, JsonResponse, StreamingHttpResponse
 from django.views.decorators.csrf import csrf_exempt
 from django.views.decorators.http import require_http_methods
 from django.contrib import messages
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
+from django.core.paginator import Paginator
+from asgiref.sync import sync_to_async
 from .models import Attendance
+from .attendance_writer import AttendanceWriter
+from .face_service import get_face_service
+from .rollup import attendance_totals, refresh_attendance_summaries
+from .attendance_sync import apply_events
+from .attendance_queries import (
+    EXPORT_COLUMNS, approximate_count, export_rows, filter_attendance, keyset_page, parse_filters,
+    parse_roster_scope, roster_query, roster_students, timetable_entries_for,
+)
+from college_app.models import Profile
 from datetime import date, timedelta
+from urllib.parse import urlencode
+import asyncio
+import csv
+import hmac
+import itertools
 import json
+import tempfile
+import numpy as np
+import openpyxl
 
 @login_required
 def view_attendance(request):
     profile = request.user.profile
     
     if profile.role == 'student':
-        all_records = list(Attendance.objects.filter(student=request.user).order_by('-date', '-time'))
+        records = Attendance.objects.filter(student=request.user)
         
-        status_priority = {'absent': 3, 'late': 2, 'present': 1}
-        date_status = {}
-        for record in all_records:
-            if record.date not in date_status:
-                date_status[record.date] = record.status
-            else:
-                current_priority = status_priority.get(date_status[record.date], 0)
-                new_priority = status_priority.get(record.status, 0)
-                if new_priority > current_priority:
-                    date_status[record.date] = record.status
-        
-        total_present = sum(1 for status in date_status.values() if status == 'present')
-        total_absent = sum(1 for status in date_status.values() if status == 'absent')
-        total_late = sum(1 for status in date_status.values() if status == 'late')
-        total_days = len(date_status)
-        
-        attendance_percentage = (total_present / total_days * 100) if total_days > 0 else 0
+        # Summed over the monthly rollup; (student, date) is unique, so each
+        # record counts as one attendance day.
+        totals = attendance_totals(request.user.id)
+        total_days = totals['total']
+        attendance_percentage = (totals['present'] / total_days * 100) if total_days > 0 else 0
         
         last_30_days = date.today() - timedelta(days=30)
-        recent_dates = sorted([d for d in date_status.keys() if d >= last_30_days])
+        recent_days = (
+            records.filter(date__gte=last_30_days)
+            .order_by('date')
+            .values_list('date', 'status')
+        )
         
         chart_labels = []
         chart_data = []
-        for att_date in recent_dates:
+        for att_date, status in recent_days:
             chart_labels.append(att_date.strftime('%b %d'))
-            chart_data.append(1 if date_status[att_date] == 'present' else 0)
+            chart_data.append(1 if status == 'present' else 0)
         
-        attendance_records = all_records
+        attendance_records = records.select_related('student').order_by('-date', '-time')
         
         context = {
-            'attendance_records': attendance_records,
-            'total_present': total_present,
-            'total_absent': total_absent,
-            'total_late': total_late,
+            'total_present': totals['present'],
+            'total_absent': totals['absent'],
+            'total_late': totals['late'],
             'total_days': total_days,
             'attendance_percentage': round(attendance_percentage, 1),
             'chart_labels': json.dumps(chart_labels),
             'chart_data': json.dumps(chart_data),
         }
+        page_obj = Paginator(attendance_records, 50).get_page(request.GET.get('page'))
+        context['page_obj'] = page_obj
+        context['attendance_records'] = page_obj.object_list
     else:
-        attendance_records = Attendance.objects.all().order_by('-date')
-        context = {'attendance_records': attendance_records}
+        filters = parse_filters(request.GET)
+        records = filter_attendance(Attendance.objects.select_related('student', 'marked_by'), filters)
+        attendance_records, older_cursor, newer_cursor = keyset_page(
+            records, after=request.GET.get('after'), before=request.GET.get('before'),
+        )
+        context = {
+            'attendance_records': attendance_records,
+            'older_cursor': older_cursor,
+            'newer_cursor': newer_cursor,
+            'filters': filters,
+            'filter_query': urlencode({field: filters[field] for field in filters}),
+            'approximate_total': approximate_count(filters),
+            'status_choices': Attendance.STATUS_CHOICES,
+            'semester_choices': Profile.SEMESTER_CHOICES,
+        }
     
     return render(request, 'attendance_app/view_attendance.html', context)
 
@@ -73,6 +104,52 @@ def attendance_report(request):
     
     return render(request, 'attendance_app/report.html', {'attendance_records': recent_attendance})
 
+class Echo:
+    """
+    File-like object whose write() returns the value, so csv.writer rows
+    can be yielded straight into a StreamingHttpResponse.
+    """
+    def write(self, value):
+        return value
+
+@login_required
+def export_attendance(request):
+    """
+    Export attendance for a date range (default: the last 7 days) as CSV or
+    XLSX. Accepts the same filters as the staff attendance view plus
+    format=csv|xlsx.
+    """
+    if request.user.profile.role not in ['admin', 'teacher']:
+        return render(request, 'attendance_app/unauthorized.html')
+    
+    filters = parse_filters(request.GET)
+    if 'date_from' not in filters and 'date_to' not in filters:
+        filters['date_from'] = date.today() - timedelta(days=7)
+    
+    date_from = filters.get('date_from', 'start')
+    date_to = filters.get('date_to', date.today())
+    filename = f"attendance_{date_from}_{date_to}"
+    headers = [title for title, _ in EXPORT_COLUMNS]
+    
+    if request.GET.get('format') == 'xlsx':
+        # Write-only workbooks stream rows to a temporary file instead of
+        # building the sheet in memory; the file is sent from disk.
+        workbook = openpyxl.Workbook(write_only=True)
+        sheet = workbook.create_sheet('Attendance')
+        sheet.append(headers)
+        for row in export_rows(filters):
+            sheet.append(row)
+        output = tempfile.TemporaryFile()
+        workbook.save(output)
+        output.seek(0)
+        return FileResponse(output, as_attachment=True, filename=f'{filename}.xlsx')
+    
+    writer = csv.writer(Echo())
+    rows = itertools.chain([headers], export_rows(filters))
+    response = StreamingHttpResponse((writer.writerow(row) for row in rows), content_type='text/csv')
+    response['Content-Disposition'] = f'attachment; filename="{filename}.csv"'
+    return response
+
 @csrf_exempt
 @require_http_methods(["POST"])
 def mark_attendance_api(request):
@@ -122,52 +199,274 @@ def mark_attendance_api(request):
         return JsonResponse({'error': str(e)}, status=500)
 
 
+def is_trusted_caller(request):
+    """
+    True for a teacher or admin session (with a valid CSRF token, since the
+    APIs are csrf_exempt for devices) or a request carrying one of
+    ATTENDANCE_DEVICE_TOKENS as "Authorization: Bearer <token>". Anyone
+    else may only mark students present for today.
+    """
+    scheme, _, token = request.headers.get('Authorization', '').partition(' ')
+    if scheme.lower() == 'bearer' and token:
+        return any(
+            hmac.compare_digest(token.encode(), trusted.encode())
+            for trusted in settings.ATTENDANCE_DEVICE_TOKENS
+        )
+    user = request.user
+    if not user.is_authenticated or not hasattr(user, 'profile') or user.profile.role not in ['teacher', 'admin']:
+        return False
+    return CsrfViewMiddleware(lambda request: None).process_view(request, None, (), {}) is None
+
+
+@csrf_exempt
+@require_http_methods(["POST"])
+def mark_attendance_batch_api(request):
+    """
+    REST API endpoint to mark attendance for many students at once.
+    POST data: {"usernames": [...], "roll_numbers": [...],
+                "date": "YYYY-MM-DD" (optional, defaults to today),
+                "status": "present" (optional)}
+    Other dates and statuses need a staff session or a device token (see
+    is_trusted_caller).
+    Returns: JSON with a "created", "already" or "unknown" result per item
+    """
+    try:
+        data = json.loads(request.body)
+    except json.JSONDecodeError:
+        return JsonResponse({'error': 'Invalid JSON'}, status=400)
+    if not isinstance(data, dict):
+        return JsonResponse({'error': 'Request body must be a JSON object'}, status=400)
+    
+    usernames = data.get('usernames') or []
+    roll_numbers = data.get('roll_numbers') or []
+    if not isinstance(usernames, list) or not isinstance(roll_numbers, list) or not all(
+        isinstance(value, str) for value in usernames + roll_numbers
+    ):
+        return JsonResponse({'error': 'usernames and roll_numbers must be lists of strings'}, status=400)
+    if not usernames and not roll_numbers:
+        return JsonResponse({'error': 'usernames or roll_numbers is required'}, status=400)
+    
+    status = data.get('status', 'present')
+    if status not in dict(Attendance.STATUS_CHOICES):
+        return JsonResponse({'error': f'Invalid status: {status}'}, status=400)
+    try:
+        attendance_date = date.fromisoformat(data['date']) if data.get('date') else date.today()
+    except (TypeError, ValueError):
+        return JsonResponse({'error': 'date must be YYYY-MM-DD'}, status=400)
+    if (status != 'present' or attendance_date != date.today()) and not is_trusted_caller(request):
+        return JsonResponse({'error': 'Only staff or devices with a token may mark other dates or statuses'}, status=403)
+    
+    try:
+        students = (
+            User.objects.filter(profile__role='student')
+            .filter(Q(username__in=usernames) | Q(profile__roll_number__in=roll_numbers))
+            .values_list('id', 'username', 'profile__roll_number')
+        )
+        by_username = {}
+        by_roll_number = {}
+        for student_id, username, roll_number in students:
+            by_username[username] = (student_id, username)
+            if roll_number:
+                by_roll_number[roll_number] = (student_id, username)
+        
+        writer = AttendanceWriter(attendance_date=attendance_date, status=status, source='api')
+        for student_id, username in set(by_username.values()):
+            writer.add(student_id, username)
+        created = set(writer.flush())
+    except Exception as e:
+        return JsonResponse({'error': str(e)}, status=500)
+    
+    def result(key, value, student):
+        if student is None:
+            return {key: value, 'result': 'unknown'}
+        return {key: value, 'username': student[1], 'result': 'created' if student[1] in created else 'already'}
+    
+    results = [result('username', value, by_username.get(value)) for value in usernames]
+    results += [result('roll_number', value, by_roll_number.get(value)) for value in roll_numbers]
+    return JsonResponse({
+        'success': True,
+        'date': str(attendance_date),
+        'status': status,
+        'created': len(created),
+        'results': results,
+    })
+
+
+@csrf_exempt
+@require_http_methods(["POST"])
+def sync_attendance_api(request):
+    """
+    REST API endpoint that capture devices drain their offline queue into.
+    POST data: {"device": "gate-1" (optional),
+                "events": [{"key": "...", "username": "..." or "roll_number": "...",
+                            "date": "YYYY-MM-DD", "status": "present",
+                            "source": "...", "captured_at": "ISO timestamp"}, ...]}
+    Every event needs a unique idempotency key; re-sent keys are answered
+    from their receipt without marking attendance again. Events for other
+    days or statuses than present today need a device token (see
+    is_trusted_caller); without one they are answered "forbidden" and the
+    rest of the batch is still applied.
+    Returns: JSON with a "created", "already", "unknown", "invalid" or
+    "forbidden" result per event
+    """
+    try:
+        data = json.loads(request.body)
+    except json.JSONDecodeError:
+        return JsonResponse({'error': 'Invalid JSON'}, status=400)
+    if not isinstance(data, dict):
+        return JsonResponse({'error': 'Request body must be a JSON object'}, status=400)
+    
+    events = data.get('events')
+    if not isinstance(events, list) or not events:
+        return JsonResponse({'error': 'events must be a non-empty list'}, status=400)
+    if len(events) > settings.ATTENDANCE_SYNC_MAX_EVENTS:
+        return JsonResponse({'error': f'At most {settings.ATTENDANCE_SYNC_MAX_EVENTS} events per request'}, status=400)
+    trusted = is_trusted_caller(request)
+    today = date.today().isoformat()
+    
+    def allowed(event):
+        # Malformed events are left to apply_events, which answers "invalid".
+        return trusted or not isinstance(event, dict) or (
+            (event.get('status') or 'present') == 'present' and (event.get('date') or today) == today
+        )
+    
+    try:
+        accepted = [event for event in events if allowed(event)]
+        applied = iter(apply_events(accepted, device=str(data.get('device') or '')[:100]) if accepted else [])
+    except Exception as e:
+        return JsonResponse({'error': str(e)}, status=500)
+    results = [
+        next(applied) if allowed(event) else {
+            'key': event.get('key'), 'result': 'forbidden',
+            'error': 'Only devices with a token may sync other dates or statuses',
+        }
+        for event in events
+    ]
+    return JsonResponse({'success': True, 'results': results})
+
+
+@csrf_exempt
+@require_http_methods(["POST"])
+async def recognize_attendance_api(request):
+    """
+    Recognize faces in uploaded JPEGs and mark attendance for every
+    recognized student in one batch.
+    POST multipart data: "frames" (camera frames, faces are detected) and/or
+    "faces" (already cropped faces), any number of files each.
+    Returns: JSON with one result per face and the students newly marked
+    """
+    uploads = [(upload, False) for upload in request.FILES.getlist('frames')]
+    uploads += [(upload, True) for upload in request.FILES.getlist('faces')]
+    if not uploads:
+        return JsonResponse({'error': 'Upload JPEG files as "frames" or "faces"'}, status=400)
+    if len(uploads) > settings.FACE_API_MAX_IMAGES:
+        return JsonResponse({'error': f'At most {settings.FACE_API_MAX_IMAGES} images per request'}, status=400)
+    
+    try:
+        service = await sync_to_async(get_face_service)()
+    except ValueError as e:
+        return JsonResponse({'error': str(e)}, status=503)
+    if len(service.gallery) == 0:
+        return JsonResponse({'error': 'No face encodings have been trained'}, status=503)
+    
+    loop = asyncio.get_running_loop()
+    decoded = await asyncio.gather(*[
+        loop.run_in_executor(service.executor, service.encode_image, upload.read(), is_face)
+        for upload, is_face in uploads
+    ])
+    
+    results = []
+    boxes = []  # results that hold a face, in encoding order
+    encodings = []
+    for (upload, _), image in zip(uploads, decoded):
+        if image is None:
+            results.append({'image': upload.name, 'error': 'Could not decode image'})
+            continue
+        for box, encoding in zip(*image):
+            results.append({'image': upload.name, 'box': [int(v) for v in box]})
+            boxes.append(results[-1])
+            encodings.append(encoding)
+    
+    writer = AttendanceWriter(source='api')
+    if encodings:
+        try:
+            matches, threshold = await loop.run_in_executor(service.executor, service.match, np.stack(encodings))
+        except ValueError as e:
+            return JsonResponse({'error': str(e)}, status=503)
+        for result, match in zip(boxes, matches):
+            recognized = match.distance < threshold
+            result.update({
+                'recognized': recognized,
+                'username': match.label if recognized else None,
+                'distance': round(match.distance, 2),
+            })
+            if recognized:
+                writer.add(match.student_id, match.label)
+    
+    marked = await sync_to_async(writer.flush)()
+    return JsonResponse({
+        'success': True,
+        'date': str(date.today()),
+        'faces': results,
+        'marked': marked,
+        'already_marked': sorted({result['username'] for result in boxes if result['recognized']} - set(marked)),
+    })
+
+
 @login_required
 def mark_attendance_manual(request):
     if request.user.profile.role not in ['teacher', 'admin']:
         messages.error(request, 'Only teachers and admins can mark attendance')
         return redirect('dashboard')
     
-    students = User.objects.filter(profile__role='student').order_by('username')
+    params = request.POST if request.method == 'POST' else request.GET
+    scope = parse_roster_scope(params, request.user)
+    # Only the chosen section is loaded and posted, never the whole college.
+    students = roster_students(scope) if scope else User.objects.none()
     selected_date = request.GET.get('date', str(date.today()))
     
     if request.method == 'POST':
         selected_date = request.POST.get('date', str(date.today()))
         
-        for student in students:
-            status_key = f'status_{student.id}'
-            notes_key = f'notes_{student.id}'
-            status = request.POST.get(status_key)
-            notes = request.POST.get(notes_key, '')
-            
+        records = []
+        for student_id in students.values_list('id', flat=True):
+            status = request.POST.get(f'status_{student_id}')
             if status:
-                Attendance.objects.update_or_create(
-                    student=student,
+                records.append(Attendance(
+                    student_id=student_id,
                     date=selected_date,
-                    defaults={
-                        'status': status,
-                        'marked_by': request.user,
-                        'notes': notes
-                    }
-                )
+                    status=status,
+                    marked_by=request.user,
+                    notes=request.POST.get(f'notes_{student_id}', ''),
+                ))
+        
+        with transaction.atomic():
+            Attendance.objects.bulk_create(
+                records,
+                update_conflicts=True,
+                unique_fields=['student', 'date'],
+                update_fields=['status', 'marked_by', 'notes'],
+            )
+            refresh_attendance_summaries((record.student_id, record.date) for record in records)
         
         messages.success(request, f'Attendance marked successfully for {selected_date}')
-        return redirect('mark_attendance_manual')
+        return redirect(f"{reverse('mark_attendance_manual')}?{roster_query(scope, date=selected_date)}")
     
-    existing_attendance = {}
-    for att in Attendance.objects.filter(date=selected_date):
-        existing_attendance[att.student.id] = {
-            'status': att.status,
-            'notes': att.notes
-        }
+    roster = list(students.values('id', 'username', 'first_name', 'last_name'))
+    existing_attendance = {
+        att['student_id']: att
+        for att in Attendance.objects.filter(
+            date=selected_date, student_id__in=[student['id'] for student in roster]
+        ).values('student_id', 'status', 'notes')
+    }
     
     students_data = []
-    for student in students:
-        full_name = f"{student.first_name} {student.last_name}".strip() or student.username
-        attendance_info = existing_attendance.get(student.id, {})
+    for student in roster:
+        full_name = f"{student['first_name']} {student['last_name']}".strip() or student['username']
+        attendance_info = existing_attendance.get(student['id'], {})
         students_data.append({
-            'id': student.id,
-            'username': student.username,
+            'id': student['id'],
+            'username': student['username'],
             'full_name': full_name,
             'current_status': attendance_info.get('status', 'present'),
             'current_notes': attendance_info.get('notes', '')
@@ -177,5 +476,8 @@ def mark_attendance_manual(request):
         'students_data': students_data,
         'selected_date': selected_date,
         'status_choices': Attendance.STATUS_CHOICES,
+        'scope': scope,
+        'timetable_entries': timetable_entries_for(request.user),
+        'semester_choices': Profile.SEMESTER_CHOICES,
     }
     return render(request, 'attendance_app/mark_attendance.html', context)
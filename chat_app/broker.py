@@ -0,0 +1,135 @@
+import asyncio
+
+
+def _bulk(value):
+    if isinstance(value, str):
+        value = value.encode()
+    return b'$%d\r\n%s\r\n' % (len(value), value)
+
+
+def _push(kind, channel, value, protocol=2):
+    """
+    A pub/sub push frame: [kind, channel, value] where value is a bulk
+    string (messages) or an integer (subscription counts). RESP3 clients
+    get it as a push type, RESP2 clients as a plain array.
+    """
+    tail = b':%d\r\n' % value if isinstance(value, int) else _bulk(value)
+    return (b'>3\r\n' if protocol == 3 else b'*3\r\n') + _bulk(kind) + _bulk(channel) + tail
+
+
+def _hello(protocol, client_id):
+    fields = [(b'server', _bulk('redis')), (b'version', _bulk('7.0.0')), (b'proto', b':%d\r\n' % protocol),
+              (b'id', b':%d\r\n' % client_id), (b'mode', _bulk('standalone')), (b'role', _bulk('master')),
+              (b'modules', b'*0\r\n')]
+    header = b'%%%d\r\n' % len(fields) if protocol == 3 else b'*%d\r\n' % (2 * len(fields))
+    return header + b''.join(_bulk(key) + value for key, value in fields)
+
+
+class PubSubBroker:
+    """
+    Stand-in for Redis that speaks just enough of its protocol (PUBLISH,
+    SUBSCRIBE, UNSUBSCRIBE, PING and the HELLO/CLIENT handshake, over RESP2
+    or RESP3) for channels_redis' RedisPubSubChannelLayer. It lets chat fan
+    out across several Daphne processes on one machine without a Redis
+    server, for development and benchmarks. It keeps nothing on disk and
+    has no authentication; use Redis in production.
+    """
+
+    def __init__(self, host='127.0.0.1', port=6390):
+        self.host = host
+        self.port = port
+        self.subscribers = {}  # channel -> {StreamWriter: protocol}
+        self.published = 0
+        self.clients = 0
+        self.server = None
+
+    async def start(self):
+        self.server = await asyncio.start_server(self._handle, self.host, self.port)
+        self.port = self.server.sockets[0].getsockname()[1]
+        return self
+
+    async def serve_forever(self):
+        if self.server is None:
+            await self.start()
+        async with self.server:
+            await self.server.serve_forever()
+
+    async def close(self):
+        if self.server is not None:
+            self.server.close()
+            await self.server.wait_closed()
+
+    async def _read_command(self, reader):
+        line = await reader.readline()
+        if not line:
+            return None
+        if not line.startswith(b'*'):
+            return line.split()
+        args = []
+        for _ in range(int(line[1:])):
+            length = int((await reader.readline())[1:])
+            args.append((await reader.readexactly(length + 2))[:-2])
+        return args
+
+    async def _handle(self, reader, writer):
+        subscribed = set()
+        protocol = 2
+        self.clients += 1
+        client_id = self.clients
+        try:
+            while True:
+                try:
+                    args = await self._read_command(reader)
+                except (asyncio.IncompleteReadError, ConnectionError, ValueError):
+                    break
+                if args is None:
+                    break
+                if not args:
+                    continue
+                command = args[0].upper()
+                if command == b'PUBLISH' and len(args) == 3:
+                    frames = {}
+                    receivers = self.subscribers.get(args[1], {})
+                    for receiver, receiver_protocol in receivers.items():
+                        if receiver_protocol not in frames:
+                            frames[receiver_protocol] = _push(b'message', args[1], args[2], receiver_protocol)
+                        receiver.write(frames[receiver_protocol])
+                    self.published += 1
+                    writer.write(b':%d\r\n' % len(receivers))
+                elif command == b'SUBSCRIBE':
+                    for channel in args[1:]:
+                        subscribed.add(channel)
+                        self.subscribers.setdefault(channel, {})[writer] = protocol
+                        writer.write(_push(b'subscribe', channel, len(subscribed), protocol))
+                elif command == b'UNSUBSCRIBE':
+                    for channel in args[1:] or list(subscribed):
+                        subscribed.discard(channel)
+                        self._unsubscribe(channel, writer)
+                        writer.write(_push(b'unsubscribe', channel, len(subscribed), protocol))
+                elif command == b'HELLO':
+                    if len(args) > 1 and args[1] not in (b'2', b'3'):
+                        writer.write(b'-NOPROTO unsupported protocol version\r\n')
+                    else:
+                        protocol = int(args[1]) if len(args) > 1 else protocol
+                        writer.write(_hello(protocol, client_id))
+                elif command == b'PING':
+                    writer.write(b'+PONG\r\n' if len(args) == 1 else _bulk(args[1]))
+                elif command in (b'CLIENT', b'SELECT', b'FLUSHDB', b'FLUSHALL'):
+                    writer.write(b'+OK\r\n')
+                elif command == b'QUIT':
+                    writer.write(b'+OK\r\n')
+                    break
+                else:
+                    writer.write(b'-ERR unknown command \'%s\'\r\n' % args[0])
+                await writer.drain()
+        finally:
+            for channel in subscribed:
+                self._unsubscribe(channel, writer)
+            writer.close()
+
+    def _unsubscribe(self, channel, writer):
+        receivers = self.subscribers.get(channel)
+        if receivers is not None:
+            receivers.pop(writer, None)
+            if not receivers:
+                del self.subscribers[channel]
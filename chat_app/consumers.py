@@ -2,12 +2,24 @@ import json
 from channels.generic.websocket import AsyncWebsocketConsumer
 from channels.db import database_sync_to_async
 from django.contrib.auth.models import User
+from .message_buffer import get_message_buffer
 from .models import ChatMessage
 
 class ChatConsumer(AsyncWebsocketConsumer):
     async def connect(self):
+        user = self.scope['user']
+        if not user.is_authenticated:
+            await self.close()
+            return
+
+        # The sender is whoever the session belongs to, resolved once per
+        # connection; receivers are looked up once and cached.
+        self.sender_id = user.id
+        self.sender_username = user.username
         self.room_name = self.scope['url_route']['kwargs']['room_name']
         self.room_group_name = f'chat_{self.room_name}'
+        found = await self.lookup_receivers([self.room_name])
+        self.receiver_ids = {self.room_name: found.get(self.room_name)}
 
         await self.channel_layer.group_add(
             self.room_group_name,
@@ -17,25 +29,37 @@ class ChatConsumer(AsyncWebsocketConsumer):
         await self.accept()
 
     async def disconnect(self, close_code):
+        if not hasattr(self, 'room_group_name'):
+            return
         await self.channel_layer.group_discard(
             self.room_group_name,
             self.channel_name
         )
+        await get_message_buffer().flush()
 
     async def receive(self, text_data):
         data = json.loads(text_data)
         message = data['message']
-        sender_username = data['sender']
-        receiver_username = data['receiver']
+        receiver_username = data.get('receiver') or self.room_name
+
+        if receiver_username not in self.receiver_ids:
+            found = await self.lookup_receivers([receiver_username])
+            self.receiver_ids[receiver_username] = found.get(receiver_username)
+        receiver_id = self.receiver_ids[receiver_username]
+        if receiver_id is None:
+            await self.send(text_data=json.dumps({'error': f'Unknown receiver: {receiver_username}'}))
+            return
 
-        await self.save_message(sender_username, receiver_username, message)
+        get_message_buffer().add(
+            ChatMessage(sender_id=self.sender_id, receiver_id=receiver_id, message=message)
+        )
 
         await self.channel_layer.group_send(
             self.room_group_name,
             {
                 'type': 'chat_message',
                 'message': message,
-                'sender': sender_username,
+                'sender': self.sender_username,
                 'receiver': receiver_username
             }
         )
@@ -52,7 +76,5 @@ class ChatConsumer(AsyncWebsocketConsumer):
         }))
 
     @database_sync_to_async
-    def save_message(self, sender_username, receiver_username, message):
-        sender = User.objects.get(username=sender_username)
-        receiver = User.objects.get(username=receiver_username)
-        ChatMessage.objects.create(sender=sender, receiver=receiver, message=message)
+    def lookup_receivers(self, usernames):
+        return dict(User.objects.filter(username__in=usernames).values_list('username', 'id'))
@@ -0,0 +1,134 @@
+import asyncio
+import multiprocessing
+import time
+
+from django.utils.module_loading import import_string
+
+GROUP = 'chat_benchmark'
+
+
+def make_layer(config):
+    return import_string(config['BACKEND'])(**config.get('CONFIG', {}))
+
+
+async def _receive(layer, consumers, messages, ready):
+    """
+    Subscribe `consumers` channels to the benchmark group, set `ready`, and
+    return the time the last of them received its last message.
+    """
+    channels = [await layer.new_channel() for _ in range(consumers)]
+    for channel in channels:
+        await layer.group_add(GROUP, channel)
+    ready.set()
+
+    async def drain(channel):
+        for _ in range(messages):
+            await layer.receive(channel)
+        return time.perf_counter()
+
+    last = max(await asyncio.gather(*[drain(channel) for channel in channels]))
+    for channel in channels:
+        await layer.group_discard(GROUP, channel)
+    return last
+
+
+def _receiver_process(config, consumers, messages, ready, results):
+    async def run():
+        layer = make_layer(config)
+        try:
+            return await _receive(layer, consumers, messages, ready)
+        finally:
+            await layer.flush()
+
+    try:
+        results.put(('ok', asyncio.run(run())))
+    except Exception as e:
+        ready.set()
+        results.put(('error', repr(e)))
+
+
+async def _send(layer, messages, payload):
+    message = {'type': 'chat_message', 'message': 'x' * payload, 'sender': 'alice', 'receiver': 'bob'}
+    started = time.perf_counter()
+    for _ in range(messages):
+        await layer.group_send(GROUP, message)
+    return time.perf_counter() - started
+
+
+def fanout_in_process(config, consumers=4, messages=1000, payload=100):
+    """
+    Group fan-out with the sender and every consumer in one process, the
+    only arrangement InMemoryChannelLayer supports.
+    """
+
+    async def run():
+        ready = asyncio.Event()
+        layer = make_layer(config)
+        receiving = asyncio.ensure_future(_receive(layer, consumers, messages, ready))
+        await ready.wait()
+        started = time.perf_counter()
+        send_seconds = await _send(layer, messages, payload)
+        last = await receiving
+        await layer.flush()
+        return send_seconds, last - started
+
+    send_seconds, total_seconds = asyncio.run(run())
+    return _report(config, 1, consumers, messages, payload, send_seconds, total_seconds)
+
+
+def fanout_across_processes(config, processes=2, consumers=4, messages=1000, payload=100, timeout=60.0):
+    """
+    Group fan-out from this process to `consumers` channels in each of
+    `processes` receiver processes, as with several Daphne workers serving
+    one chat room. Needs a layer that works across processes.
+    """
+    context = multiprocessing.get_context('spawn')
+    results = context.Queue()
+    events = [context.Event() for _ in range(processes)]
+    workers = [
+        context.Process(target=_receiver_process, args=(config, consumers, messages, ready, results), daemon=True)
+        for ready in events
+    ]
+    for worker in workers:
+        worker.start()
+    try:
+        for ready in events:
+            if not ready.wait(timeout):
+                raise TimeoutError('Receiver processes did not subscribe in time')
+
+        async def send():
+            layer = make_layer(config)
+            started = time.perf_counter()
+            seconds = await _send(layer, messages, payload)
+            await layer.flush()
+            return started, seconds
+
+        started, send_seconds = asyncio.run(send())
+        lasts = []
+        for _ in workers:
+            result = results.get(timeout=timeout)
+            if result[0] == 'error':
+                raise RuntimeError(f'Receiver failed: {result[1]}')
+            lasts.append(result[1])
+    finally:
+        for worker in workers:
+            worker.join(timeout=5)
+            if worker.is_alive():
+                worker.terminate()
+    # perf_counter is CLOCK_MONOTONIC on Linux and macOS, shared by every
+    # process on the machine, so receiver timestamps compare with ours.
+    return _report(config, processes, consumers, messages, payload, send_seconds, max(lasts) - started)
+
+
+def _report(config, processes, consumers, messages, payload, send_seconds, total_seconds):
+    delivered = processes * consumers * messages
+    return {
+        'backend': config['BACKEND'].rsplit('.', 1)[-1],
+        'processes': processes,
+        'consumers': processes * consumers,
+        'messages': messages,
+        'payload_bytes': payload,
+        'send_per_second': messages / send_seconds if send_seconds else 0.0,
+        'delivered_per_second': delivered / total_seconds if total_seconds else 0.0,
+        'seconds': round(total_seconds, 3),
+    }
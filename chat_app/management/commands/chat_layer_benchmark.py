@@ -0,0 +1,84 @@
+import asyncio
+import json
+import threading
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from chat_app.broker import PubSubBroker
+from chat_app.layer_benchmark import fanout_across_processes, fanout_in_process
+
+
+class Command(BaseCommand):
+    help = 'Compare chat group fan-out throughput of the channel layer backends'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--layers', nargs='+', default=['memory', 'redis-pubsub'],
+                            choices=list(settings.CHANNEL_LAYER_BACKENDS), help='Layers to compare')
+        parser.add_argument('--url', help='Redis URL for the redis layers; defaults to a local stand-in broker '
+                                          '(redis-pubsub only)')
+        parser.add_argument('--processes', type=int, nargs='+', default=[1, 2, 4], help='Receiver process counts')
+        parser.add_argument('--consumers', type=int, default=4, help='Websocket consumers per process')
+        parser.add_argument('--messages', type=int, default=1000, help='Messages sent to the group')
+        parser.add_argument('--payload', type=int, default=100, help='Message text length')
+        parser.add_argument('--output', help='Write the results as JSON to this file')
+
+    def handle(self, *args, **options):
+        if 'redis' in options['layers'] and not options['url']:
+            raise CommandError('The redis layer needs a Redis server: pass --url')
+
+        broker = None
+        url = options['url']
+        if not url and 'redis-pubsub' in options['layers']:
+            broker = self._start_broker()
+            url = f'redis://127.0.0.1:{broker.port}/0'
+            self.stdout.write(f'Using the stand-in broker at {url}')
+
+        results = []
+        for name in options['layers']:
+            config = {'BACKEND': settings.CHANNEL_LAYER_BACKENDS[name]}
+            if name == 'memory':
+                # Room for every message so the benchmark measures delivery,
+                # not drops at the default capacity.
+                config['CONFIG'] = {'capacity': options['messages'] + 1}
+                runs = [fanout_in_process(
+                    config, consumers=options['consumers'],
+                    messages=options['messages'], payload=options['payload'],
+                )]
+            else:
+                config['CONFIG'] = {'hosts': [url]}
+                if name == 'redis':
+                    config['CONFIG']['capacity'] = options['messages'] + 1
+                runs = [
+                    fanout_across_processes(
+                        config, processes=processes, consumers=options['consumers'],
+                        messages=options['messages'], payload=options['payload'],
+                    )
+                    for processes in options['processes']
+                ]
+            for run in runs:
+                run['layer'] = name
+                results.append(run)
+                self.stdout.write(
+                    f"{name:<13} {run['processes']:>2} processes {run['consumers']:>4} consumers  "
+                    f"send {run['send_per_second']:>9.0f} msg/s  delivered {run['delivered_per_second']:>9.0f} msg/s"
+                )
+
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                json.dump(results, f, indent=2)
+            self.stdout.write(self.style.SUCCESS(f"Wrote {options['output']}"))
+
+    def _start_broker(self):
+        broker = PubSubBroker(port=0)
+        started = threading.Event()
+
+        def serve():
+            loop = asyncio.new_event_loop()
+            loop.run_until_complete(broker.start())
+            started.set()
+            loop.run_forever()
+
+        threading.Thread(target=serve, name='chat-broker', daemon=True).start()
+        started.wait()
+        return broker
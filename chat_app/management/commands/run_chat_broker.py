@@ -0,0 +1,30 @@
+import asyncio
+
+from django.core.management.base import BaseCommand
+
+from chat_app.broker import PubSubBroker
+
+
+class Command(BaseCommand):
+    help = 'Run a local Redis-protocol pub/sub broker for CHAT_CHANNEL_LAYER=redis-pubsub (development only)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--host', default='127.0.0.1', help='Address to listen on')
+        parser.add_argument('--port', type=int, default=6390, help='Port to listen on')
+
+    def handle(self, *args, **options):
+        broker = PubSubBroker(options['host'], options['port'])
+
+        async def serve():
+            await broker.start()
+            self.stdout.write(
+                f'Chat broker listening on redis://{broker.host}:{broker.port}/0. Set CHAT_CHANNEL_LAYER=redis-pubsub '
+                f'and CHANNEL_REDIS_URL to it. Press Ctrl+C to stop.'
+            )
+            await broker.serve_forever()
+
+        try:
+            asyncio.run(serve())
+        except KeyboardInterrupt:
+            pass
+        self.stdout.write(self.style.SUCCESS(f'Broker stopped after {broker.published} messages'))
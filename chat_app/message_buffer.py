@@ -0,0 +1,102 @@
+import asyncio
+import logging
+import weakref
+
+from channels.db import database_sync_to_async
+from django.conf import settings
+from django.db import IntegrityError, OperationalError
+
+from .models import ChatMessage
+
+logger = logging.getLogger(__name__)
+
+_buffers = weakref.WeakKeyDictionary()
+
+
+class MessageBuffer:
+    """
+    Write-behind buffer for chat messages, shared by every consumer on an
+    event loop. add() only appends to memory; the buffer is written with a
+    single bulk_create `flush_interval` seconds after its first message, or
+    as soon as it holds `batch_size` messages. Messages still buffered when
+    the process dies are lost, so the interval is kept to milliseconds.
+    """
+
+    def __init__(self, flush_interval=0.05, batch_size=100):
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+        self.pending = []
+        self._timer = None
+        self._writes = set()
+
+    def add(self, message):
+        self.pending.append(message)
+        if len(self.pending) >= self.batch_size:
+            self._start_write()
+        elif self._timer is None:
+            self._timer = asyncio.get_running_loop().call_later(self.flush_interval, self._start_write)
+
+    async def flush(self):
+        """
+        Write everything buffered so far and wait for writes in progress.
+        """
+        self._start_write()
+        if self._writes:
+            await asyncio.gather(*self._writes)
+
+    def _start_write(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        batch, self.pending = self.pending, []
+        if batch:
+            task = asyncio.ensure_future(self._write(batch))
+            self._writes.add(task)
+            task.add_done_callback(self._writes.discard)
+
+    async def _write(self, batch):
+        try:
+            await database_sync_to_async(ChatMessage.objects.bulk_create)(batch)
+        except OperationalError as e:
+            self._retry_later(batch, e)
+        except IntegrityError:
+            # One bad row (e.g. a receiver deleted since it was cached) fails
+            # the whole insert; save the rest one by one.
+            unsaved = await database_sync_to_async(_save_each)(batch)
+            if unsaved:
+                self._retry_later(unsaved, 'database unavailable')
+
+    def _retry_later(self, batch, error):
+        # Database locked or unreachable: keep the messages for the next
+        # write rather than losing them.
+        logger.warning('Could not save %d chat messages: %s', len(batch), error)
+        self.pending[:0] = batch
+        if self._timer is None:
+            self._timer = asyncio.get_running_loop().call_later(self.flush_interval, self._start_write)
+
+
+def _save_each(batch):
+    """
+    Save messages one at a time, dropping those the database rejects.
+    Returns the messages left unsaved when the database becomes unavailable.
+    """
+    for number, message in enumerate(batch):
+        try:
+            ChatMessage.objects.bulk_create([message])
+        except IntegrityError as e:
+            logger.warning(
+                'Dropped chat message from user %s to user %s: %s', message.sender_id, message.receiver_id, e
+            )
+        except OperationalError:
+            return batch[number:]
+    return []
+
+
+def get_message_buffer():
+    """
+    The MessageBuffer of the running event loop.
+    """
+    loop = asyncio.get_running_loop()
+    if loop not in _buffers:
+        _buffers[loop] = MessageBuffer(settings.CHAT_FLUSH_INTERVAL, settings.CHAT_FLUSH_BATCH)
+    return _buffers[loop]
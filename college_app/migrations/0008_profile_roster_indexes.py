@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-18 12:03
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('college_app', '0007_payment_razorpay_order_id_and_more'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='profile',
+            index=models.Index(fields=['role', 'course', 'semester'], name='college_app_role_c9bf1b_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='profile',
+            index=models.Index(fields=['role', 'semester'], name='college_app_role_cd044b_idx'),
+        ),
+    ]
@@ -31,6 +31,13 @@ class Profile(models.Model):
     course = models.CharField(max_length=100, blank=True)
     semester = models.IntegerField(choices=SEMESTER_CHOICES, null=True, blank=True)
     
+    class Meta:
+        indexes = [
+            # Section rosters: students by course and semester.
+            models.Index(fields=['role', 'course', 'semester']),
+            models.Index(fields=['role', 'semester']),
+        ]
+    
     def __str__(self):
         return f"{self.user.username} - {self.role}"
 